@@ -0,0 +1,146 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+POOL_HEARTBEAT_SECONDS = 15.0
+POOL_PING_TIMEOUT = 5.0
+POOL_MAX_AGE_SECONDS = 10 * 60   # realtime sessions have a server-side lifetime; recycle well before it
+POOL_RETRY_BACKOFF_MAX = 60.0
+
+
+class _WarmSession:
+    def __init__(self, ws: Any):
+        self.ws = ws
+        self.created_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+class RealtimeSessionPool:
+    """Keeps `size` pre-connected, pre-configured realtime sessions ready for checkout.
+
+    `connect` opens a socket and returns once the session is configured. A
+    background task heartbeats idle sessions, recycles them past max_age, and
+    refills the pool after checkouts, backing off while connects fail.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[Any]],
+        size: int,
+        max_age: float = POOL_MAX_AGE_SECONDS,
+        heartbeat: float = POOL_HEARTBEAT_SECONDS,
+    ):
+        self._connect = connect
+        self.size = size
+        self.max_age = max_age
+        self.heartbeat = heartbeat
+        self._idle: List[_WarmSession] = []
+        self._connecting = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.connect_failures = 0
+
+    def start(self) -> None:
+        if self.size > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._maintain())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(s.ws.close() for s in idle), return_exceptions=True)
+
+    async def checkout(self) -> Any:
+        """Return a warm session if one is ready, otherwise connect one now."""
+        self.start()
+        while self._idle:
+            session = self._idle.pop()
+            if session.age < self.max_age and _is_open(session.ws):
+                self.hits += 1
+                self._wakeup.set()
+                return session.ws
+            self.recycled += 1
+            asyncio.create_task(session.ws.close())
+        self.misses += 1
+        self._wakeup.set()
+        return await self._connect()
+
+    def stats(self) -> dict:
+        checkouts = self.hits + self.misses
+        return {
+            "target_size": self.size,
+            "idle": len(self._idle),
+            "connecting": self._connecting,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / checkouts if checkouts else 0.0,
+            "recycled": self.recycled,
+            "connect_failures": self.connect_failures,
+        }
+
+    async def _fill(self) -> bool:
+        """Top the pool up to size. Returns False if any connect failed."""
+        missing = self.size - len(self._idle) - self._connecting
+        if missing <= 0:
+            return True
+        self._connecting += missing
+        try:
+            results = await asyncio.gather(*(self._connect() for _ in range(missing)), return_exceptions=True)
+        finally:
+            self._connecting -= missing
+        ok = True
+        for result in results:
+            if isinstance(result, BaseException):
+                self.connect_failures += 1
+                ok = False
+            else:
+                self._idle.append(_WarmSession(result))
+        return ok
+
+    async def _check(self, session: _WarmSession) -> bool:
+        if session.age >= self.max_age or not _is_open(session.ws):
+            return False
+        try:
+            pong = await session.ws.ping()
+            await asyncio.wait_for(pong, timeout=POOL_PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _maintain(self) -> None:
+        backoff = 1.0
+        while True:
+            # Heartbeat idle sessions; drop dead or aged ones
+            sessions = list(self._idle)
+            healthy = await asyncio.gather(*(self._check(s) for s in sessions))
+            for session, ok in zip(sessions, healthy):
+                if not ok and session in self._idle:
+                    self._idle.remove(session)
+                    self.recycled += 1
+                    asyncio.create_task(session.ws.close())
+
+            if await self._fill():
+                backoff = 1.0
+                wait = self.heartbeat
+            else:
+                wait = backoff
+                backoff = min(backoff * 2, POOL_RETRY_BACKOFF_MAX)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _is_open(ws: Any) -> bool:
+    return getattr(ws, "close_code", None) is None
@@ -0,0 +1,236 @@
+from __future__ import annotations
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from .shared_state import state_path
+
+# Without SHARED_STATE_DIR the registry is in memory and each worker places agents on itself
+REGISTRY_PATH = state_path("voice_agents.sqlite3")
+WORKER_CAPACITY = int(os.getenv("VOICE_AGENT_CAPACITY", "20"))
+LEASE_SECONDS = 15.0          # an agent row survives this long without its worker renewing it
+WORKER_TIMEOUT_SECONDS = 10.0  # a worker that misses heartbeats this long is considered dead
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agents (
+    channel_id TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    user_id TEXT,
+    state TEXT NOT NULL,              -- pending | starting | running
+    stop_requested INTEGER NOT NULL DEFAULT 0,
+    started_at REAL NOT NULL,
+    lease_expires_at REAL NOT NULL,
+    stats TEXT                        -- JSON snapshot published by the owning worker
+);
+CREATE INDEX IF NOT EXISTS agents_worker_idx ON agents(worker_id);
+"""
+
+
+class AgentRegistry:
+    """Voice agent placement shared by every worker on this host.
+
+    Backed by a SQLite database in WAL mode so all uvicorn workers see the same
+    agents. Workers heartbeat and renew leases on the agents they own. New
+    agents go to the least-loaded live worker with spare capacity, and rows held
+    by workers that stop heartbeating are reaped once their lease expires.
+
+    Calls block on SQLite locks held by other workers (up to the 5s busy
+    timeout), so async code runs them with asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH, capacity: int = WORKER_CAPACITY, worker_id: Optional[str] = None):
+        self.path = path
+        self.capacity = capacity
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._conn: Optional[sqlite3.Connection] = None
+        # One connection used from worker threads; RLock because _db() heartbeats
+        self._lock = threading.RLock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.execute("ALTER TABLE agents ADD COLUMN stats TEXT")
+            except sqlite3.OperationalError:
+                pass  # created with the column, or already migrated
+            self._conn = conn
+            self.heartbeat()
+        return self._conn
+
+    def _write(self):
+        """BEGIN IMMEDIATE so concurrent placements serialize across workers."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        return db
+
+    def heartbeat(self) -> None:
+        with self._lock:
+            now = time.time()
+            db = self._db()
+            db.execute(
+                "INSERT INTO workers (worker_id, pid, capacity, heartbeat_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET capacity = excluded.capacity, heartbeat_at = excluded.heartbeat_at",
+                (self.worker_id, os.getpid(), self.capacity, now),
+            )
+            db.execute(
+                "UPDATE agents SET lease_expires_at = ? WHERE worker_id = ?",
+                (now + LEASE_SECONDS, self.worker_id),
+            )
+
+    def reap(self) -> List[str]:
+        """Drop dead workers and agents whose lease ran out. Returns reaped channel ids."""
+        with self._lock:
+            now = time.time()
+            db = self._write()
+            try:
+                db.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - WORKER_TIMEOUT_SECONDS,))
+                rows = db.execute("SELECT channel_id FROM agents WHERE lease_expires_at < ?", (now,)).fetchall()
+                db.execute("DELETE FROM agents WHERE lease_expires_at < ?", (now,))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return [r["channel_id"] for r in rows]
+
+    def place(self, channel_id: str, user_id: Optional[str]) -> Tuple[str, Optional[str]]:
+        """Reserve channel_id on the least-loaded worker.
+
+        Returns ("exists", owner), ("placed", worker_id) or ("full", None).
+        An agent placed on this worker starts in state "starting" (the caller
+        launches it); one placed elsewhere is "pending" until its worker claims it.
+        """
+        with self._lock:
+            now = time.time()
+            db = self._write()
+            try:
+                existing = db.execute(
+                    "SELECT worker_id FROM agents WHERE channel_id = ? AND lease_expires_at >= ?",
+                    (channel_id, now),
+                ).fetchone()
+                if existing:
+                    db.execute("COMMIT")
+                    return "exists", existing["worker_id"]
+                db.execute("DELETE FROM agents WHERE channel_id = ?", (channel_id,))
+
+                candidates = db.execute(
+                    """
+                    SELECT w.worker_id, w.capacity, COUNT(a.channel_id) AS load
+                    FROM workers w LEFT JOIN agents a ON a.worker_id = w.worker_id
+                    WHERE w.heartbeat_at >= ?
+                    GROUP BY w.worker_id
+                    HAVING COUNT(a.channel_id) < w.capacity
+                    ORDER BY CAST(COUNT(a.channel_id) AS REAL) / w.capacity, w.worker_id = ? DESC
+                    LIMIT 1
+                    """,
+                    (now - WORKER_TIMEOUT_SECONDS, self.worker_id),
+                ).fetchone()
+                if not candidates:
+                    db.execute("COMMIT")
+                    return "full", None
+
+                worker_id = candidates["worker_id"]
+                state = "starting" if worker_id == self.worker_id else "pending"
+                db.execute(
+                    "INSERT INTO agents (channel_id, worker_id, user_id, state, started_at, lease_expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (channel_id, worker_id, user_id, state, now, now + LEASE_SECONDS),
+                )
+                db.execute("COMMIT")
+                return "placed", worker_id
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def claim_pending(self) -> List[Tuple[str, Optional[str]]]:
+        """Agents another worker placed on this one: (channel_id, user_id)."""
+        with self._lock:
+            db = self._write()
+            try:
+                rows = db.execute(
+                    "SELECT channel_id, user_id FROM agents WHERE worker_id = ? AND state = 'pending'",
+                    (self.worker_id,),
+                ).fetchall()
+                db.execute(
+                    "UPDATE agents SET state = 'starting' WHERE worker_id = ? AND state = 'pending'",
+                    (self.worker_id,),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return [(r["channel_id"], r["user_id"]) for r in rows]
+
+    def mark_running(self, channel_id: str) -> None:
+        with self._lock:
+            self._db().execute(
+                "UPDATE agents SET state = 'running' WHERE channel_id = ? AND worker_id = ?",
+                (channel_id, self.worker_id),
+            )
+
+    def release(self, channel_id: str) -> None:
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM agents WHERE channel_id = ? AND worker_id = ?",
+                (channel_id, self.worker_id),
+            )
+
+    def publish_stats(self, channel_id: str, stats: str) -> None:
+        """Store a JSON stats snapshot so other workers can serve it."""
+        with self._lock:
+            self._db().execute(
+                "UPDATE agents SET stats = ? WHERE channel_id = ? AND worker_id = ?",
+                (stats, channel_id, self.worker_id),
+            )
+
+    def request_stop(self, channel_id: str) -> bool:
+        """Ask the owning worker to stop an agent. Returns False if there is none."""
+        with self._lock:
+            cur = self._db().execute(
+                "UPDATE agents SET stop_requested = 1 WHERE channel_id = ? AND lease_expires_at >= ?",
+                (channel_id, time.time()),
+            )
+            return cur.rowcount > 0
+
+    def owned(self) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db().execute(
+                "SELECT channel_id, state, stop_requested FROM agents WHERE worker_id = ?",
+                (self.worker_id,),
+            ).fetchall()
+
+    def get(self, channel_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT * FROM agents WHERE channel_id = ? AND lease_expires_at >= ?",
+                (channel_id, time.time()),
+            ).fetchone()
+            return dict(row) if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db().execute(
+                "SELECT COUNT(*) FROM agents WHERE lease_expires_at >= ?", (time.time(),)
+            ).fetchone()[0]
+
+    def unregister(self) -> None:
+        """Leave the registry on clean shutdown so our agents are reaped immediately."""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM agents WHERE worker_id = ?", (self.worker_id,))
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+            self._conn.close()
+            self._conn = None
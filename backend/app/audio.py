@@ -0,0 +1,77 @@
+from __future__ import annotations
+import base64
+from typing import Union
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class PCM16RingBuffer:
+    """Preallocated byte ring that collects PCM16 frames without per-frame allocations.
+
+    Frames are copied in once through a memoryview. drain_base64() encodes
+    everything buffered in one pass and empties the ring. When the ring is full,
+    the oldest audio is dropped, because late audio is no use to a realtime session.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0 or capacity % 2:
+            raise ValueError("capacity must be a positive, even number of bytes")
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._scratch = bytearray(capacity)
+        self._start = 0
+        self._size = 0
+        self.bytes_written = 0
+        self.bytes_copied = 0
+        self.bytes_dropped = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def write(self, data: Buffer) -> None:
+        src = memoryview(data).cast("B")
+        n = len(src)
+        if n >= self.capacity:
+            # Larger than the whole ring: keep only the newest audio
+            self.bytes_dropped += self._size + n - self.capacity
+            src = src[n - self.capacity:]
+            n = self.capacity
+            self._start = 0
+            self._size = 0
+        overflow = self._size + n - self.capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % self.capacity
+            self._size -= overflow
+            self.bytes_dropped += overflow
+
+        end = (self._start + self._size) % self.capacity
+        first = min(n, self.capacity - end)
+        self._view[end:end + first] = src[:first]
+        if first < n:
+            self._view[:n - first] = src[first:]
+        self._size += n
+        self.bytes_written += n
+        self.bytes_copied += n
+
+    def _contiguous(self) -> memoryview:
+        end = self._start + self._size
+        if end <= self.capacity:
+            return self._view[self._start:end]
+        # Wrapped: stitch both halves into the scratch buffer (only after an overflow)
+        head = self.capacity - self._start
+        scratch = memoryview(self._scratch)
+        scratch[:head] = self._view[self._start:]
+        scratch[head:self._size] = self._view[:end - self.capacity]
+        self.bytes_copied += self._size
+        return scratch[:self._size]
+
+    def drain_base64(self) -> str:
+        """Return everything buffered as one base64 string and empty the ring."""
+        if not self._size:
+            return ""
+        encoded = base64.b64encode(self._contiguous()).decode("ascii")
+        # Empty ring restarts at offset 0 so the next flush is contiguous again
+        self._start = 0
+        self._size = 0
+        return encoded
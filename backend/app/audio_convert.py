@@ -0,0 +1,120 @@
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Daily rooms deliver and expect 48kHz audio; the realtime API speaks 24kHz mono PCM16.
+ROOM_SAMPLE_RATE = 48_000
+REALTIME_SAMPLE_RATE = 24_000
+
+HALFBAND_TAPS = 47
+
+
+def _halfband_filter(taps: int = HALFBAND_TAPS) -> np.ndarray:
+    """Windowed-sinc low-pass at a quarter of the input rate, for 2x resampling."""
+    n = np.arange(taps) - (taps - 1) / 2
+    h = 0.5 * np.sinc(0.5 * n) * np.blackman(taps)
+    return (h / h.sum()).astype(np.float32)
+
+
+def to_mono(samples: np.ndarray, channels: int) -> np.ndarray:
+    """Downmix interleaved (n*channels,) or shaped (n, channels) float audio to mono."""
+    if channels == 1:
+        return samples.reshape(-1)
+    return samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+
+def to_float32(samples: np.ndarray) -> np.ndarray:
+    """int16 PCM -> float32 in [-1, 1). Float input is passed through."""
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) * (1.0 / 32768.0)
+    return samples.astype(np.float32, copy=False)
+
+
+def to_int16(samples: np.ndarray) -> np.ndarray:
+    """float32 in [-1, 1] -> int16 PCM with clipping. int16 input is passed through."""
+    if samples.dtype == np.int16:
+        return samples
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+
+def apply_gain(samples: np.ndarray, gain_db: float) -> np.ndarray:
+    """Scale float audio by gain_db (no clipping; to_int16 clips)."""
+    if not gain_db:
+        return samples
+    return samples * np.float32(10.0 ** (gain_db / 20.0))
+
+
+class Resampler2x:
+    """Streaming 2x down- or up-sampler that keeps filter history across batches."""
+
+    def __init__(self, up: bool, taps: int = HALFBAND_TAPS):
+        h = _halfband_filter(taps)
+        self.up = up
+        if up:
+            # Polyphase branches of the zero-stuffed filter, reversed and left-padded
+            # to equal length so each output is a dot with the window ending at x[i]
+            width = (taps + 1) // 2
+            self._branches = np.stack([
+                np.pad(h[0::2][::-1], (width - len(h[0::2]), 0)),
+                np.pad(h[1::2][::-1], (width - len(h[1::2]), 0)),
+            ], axis=1) * np.float32(2.0)
+            self._width = width
+        else:
+            self._h = h
+            self._width = taps
+        self._history = np.zeros(self._width - 1, dtype=np.float32)
+        self._phase = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        x = samples.astype(np.float32, copy=False)
+        if not len(x):
+            return x
+        buf = np.concatenate((self._history, x))
+        windows = sliding_window_view(buf, self._width)
+        self._history = buf[len(buf) - (self._width - 1):]
+        if self.up:
+            # (n, 2) even/odd outputs interleaved into 2n samples
+            return (windows @ self._branches).reshape(-1)
+        out = windows[self._phase::2] @ self._h
+        self._phase = (self._phase - len(windows)) % 2
+        return out
+
+
+class AudioConverter:
+    """Convert batches between a room format and a target rate as mono int16.
+
+    Handles stereo->mono downmix, float32/int16 input, gain, and 48k<->24k
+    resampling, all vectorized over the whole batch.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, channels: int = 1, gain_db: float = 0.0):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        self.gain_db = gain_db
+        if in_rate == out_rate:
+            self._resampler: Optional[Resampler2x] = None
+        elif in_rate == 2 * out_rate:
+            self._resampler = Resampler2x(up=False)
+        elif out_rate == 2 * in_rate:
+            self._resampler = Resampler2x(up=True)
+        else:
+            raise ValueError(f"Unsupported resample {in_rate} -> {out_rate}")
+
+    def convert(self, samples: np.ndarray) -> np.ndarray:
+        if self.channels == 1 and self._resampler is None and not self.gain_db and samples.dtype == np.int16:
+            return samples.reshape(-1)
+        x = apply_gain(to_mono(to_float32(samples), self.channels), self.gain_db)
+        if self._resampler is not None:
+            x = self._resampler.process(x)
+        return to_int16(x)
+
+
+def room_to_realtime(channels: int = 1, gain_db: float = 0.0) -> AudioConverter:
+    return AudioConverter(ROOM_SAMPLE_RATE, REALTIME_SAMPLE_RATE, channels, gain_db)
+
+
+def realtime_to_room(gain_db: float = 0.0) -> AudioConverter:
+    return AudioConverter(REALTIME_SAMPLE_RATE, ROOM_SAMPLE_RATE, 1, gain_db)
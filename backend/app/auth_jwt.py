@@ -1,11 +1,19 @@
 from __future__ import annotations
 import base64
+import hashlib
 import json, time, urllib.request, urllib.error
 from jose import jwt
-from functools import lru_cache
 import os
+from .cache import Cache
+from .metrics import timed
 
 JWKS_CACHE_SECONDS = 300
+# Verified claims are reused until the token expires, but never longer than this
+CLAIMS_CACHE_SECONDS = 60
+
+# Per process: anything that could write a shared tier could plant keys or claims
+_jwks_cache = Cache("jwks", ttl=JWKS_CACHE_SECONDS, max_entries=4, shared=False)
+_claims_cache = Cache("jwt_claims", ttl=CLAIMS_CACHE_SECONDS, max_entries=4096, shared=False)
 
 def _derive_supabase_url_from_anon(anon_key: str) -> str | None:
     try:
@@ -23,8 +31,7 @@ def _derive_supabase_url_from_anon(anon_key: str) -> str | None:
     except Exception:
         return None
 
-@lru_cache(maxsize=1)
-def _jwks_cached(ts: int) -> dict:
+def _fetch_jwks() -> dict:
     supabase_url = os.getenv('SUPABASE_URL')
     anon = os.getenv('SUPABASE_ANON_KEY', '')
     if not supabase_url and anon:
@@ -49,7 +56,11 @@ def _jwks_cached(ts: int) -> dict:
         raise ValueError(f'Failed to reach JWKS endpoint {url}: {e.reason}')
 
 def get_jwks() -> dict:
-    return _jwks_cached(int(time.time()/JWKS_CACHE_SECONDS))
+    jwks = _jwks_cache.get("jwks")
+    if jwks is None:
+        jwks = _fetch_jwks()
+        _jwks_cache.set("jwks", jwks)
+    return jwks
 
 def _validate_via_user_endpoint(token: str) -> dict:
     """Fallback validation for projects without public JWKS (HS256 setups).
@@ -83,7 +94,23 @@ def _validate_via_user_endpoint(token: str) -> dict:
     except urllib.error.URLError as e:
         raise ValueError(f'Fallback user validation failed: {e.reason}')
 
+def admin_user_ids() -> set:
+    return {u.strip() for u in os.getenv('ADMIN_USER_IDS', '').split(',') if u.strip()}
+
+@timed("auth_jwt")
 def verify_supabase_jwt(token: str) -> dict:
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    claims = _claims_cache.get(cache_key)
+    if claims is None:
+        claims = _verify_supabase_jwt(token)
+        ttl = CLAIMS_CACHE_SECONDS
+        if isinstance(claims.get('exp'), (int, float)):
+            ttl = min(ttl, claims['exp'] - time.time())
+        if ttl > 0:
+            _claims_cache.set(cache_key, claims, ttl=ttl)
+    return claims
+
+def _verify_supabase_jwt(token: str) -> dict:
     jwks = get_jwks()
     keys = jwks.get('keys', [])
     if not keys:
@@ -0,0 +1,345 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .metrics import register_collector
+from .shared_state import IN_MEMORY, state_path
+
+CACHE_PATH = state_path("cache.sqlite3")
+# "sqlite" shares entries between workers on this host (needs SHARED_STATE_DIR);
+# "memory" keeps them per process
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite").lower()
+GENERATION_CHECK_SECONDS = 1.0  # how stale a local tier may be after invalidate() elsewhere
+PRUNE_EVERY_SETS = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_age_idx ON entries(namespace, stored_at);
+CREATE TABLE IF NOT EXISTS generations (
+    namespace TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+"""
+
+
+class SqliteTier:
+    """Cache entries in a SQLite WAL file that every worker on the host opens."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._sets = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, namespace: str, key: str, value: str, expires_at: float, max_bytes: int) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, stored_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, len(value), time.time(), expires_at),
+            )
+            self._sets += 1
+            if self._sets % PRUNE_EVERY_SETS == 0:
+                self._prune(db, namespace, max_bytes)
+
+    def _prune(self, db: sqlite3.Connection, namespace: str, max_bytes: int) -> None:
+        """Drop expired entries, then the oldest ones until the namespace fits max_bytes."""
+        db.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?", (namespace,)).fetchone()[0]
+        if total <= max_bytes:
+            return
+        excess = total - max_bytes
+        freed = 0
+        cutoff = None
+        for stored_at, size in db.execute(
+            "SELECT stored_at, size FROM entries WHERE namespace = ? ORDER BY stored_at", (namespace,)
+        ):
+            freed += size
+            cutoff = stored_at
+            if freed >= excess:
+                break
+        if cutoff is not None:
+            db.execute("DELETE FROM entries WHERE namespace = ? AND stored_at <= ?", (namespace, cutoff))
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def generation(self, namespace: str) -> int:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT generation FROM generations WHERE namespace = ?", (namespace,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, namespace: str) -> int:
+        """Invalidate a namespace for every worker. Returns the new generation."""
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT INTO generations (namespace, generation) VALUES (?, 1) "
+                    "ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1",
+                    (namespace,),
+                )
+                db.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+                generation = db.execute(
+                    "SELECT generation FROM generations WHERE namespace = ?", (namespace,)
+                ).fetchone()[0]
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return generation
+
+
+_shared_tiers: Dict[str, SqliteTier] = {}
+
+
+def shared_tier(path: str = CACHE_PATH) -> Optional[SqliteTier]:
+    if CACHE_BACKEND != "sqlite" or path == IN_MEMORY:
+        return None
+    tier = _shared_tiers.get(path)
+    if tier is None:
+        tier = _shared_tiers[path] = SqliteTier(path)
+    return tier
+
+
+_caches: List["Cache"] = []
+_MISS = object()
+
+
+def _collect_cache_metrics() -> list:
+    lookups: Dict[tuple, int] = {}
+    for cache in _caches:
+        name = cache.namespace
+        lookups[(name, "local_hit")] = cache.local_hits
+        lookups[(name, "shared_hit")] = cache.shared_hits
+        lookups[(name, "miss")] = cache.misses
+    return [("app_cache_lookups_total", "counter", "Cache lookups by tier that answered", ("cache", "result"), lookups)]
+
+
+register_collector(_collect_cache_metrics)
+
+
+class Cache:
+    """Two-tier cache: an in-process LRU in front of a tier shared by all workers.
+
+    Values must be JSON-serializable. Entries expire after ttl seconds, and both
+    tiers evict the oldest entries once they exceed their size limits. The
+    namespace includes `version`, so bumping it in code orphans entries in an
+    old format. invalidate() drops a namespace in every worker. The local
+    tiers notice within GENERATION_CHECK_SECONDS. If the shared tier is
+    unavailable, the cache keeps working per process.
+
+    The shared tier is SQLite and can wait on another worker's lock, so async
+    code uses aget()/aset(): local hits are answered inline, anything that
+    touches the shared tier runs in a worker thread.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        version: int = 1,
+        ttl: float = 300.0,
+        max_entries: int = 256,
+        max_bytes: int = 16 * 1024 * 1024,
+        shared_max_bytes: int = 256 * 1024 * 1024,
+        shared: Union[SqliteTier, bool] = True,
+    ):
+        self.namespace = f"{namespace}:v{version}"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared_max_bytes = shared_max_bytes
+        # True: the host-wide tier (unless CACHE_BACKEND=memory); False: this process only
+        self._shared = shared_tier() if shared is True else (shared or None)
+        # key -> (value, expires_at, size)
+        self._local: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._local_bytes = 0
+        self._generation = 0
+        self._generation_checked = 0.0
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.shared_errors = 0
+        _caches.append(self)
+
+    def _generation_due(self) -> bool:
+        now = time.monotonic()
+        if self._shared is None or now - self._generation_checked < GENERATION_CHECK_SECONDS:
+            return False
+        self._generation_checked = now
+        return True
+
+    def _check_generation(self) -> None:
+        if self._generation_due():
+            self._read_generation()
+
+    def _read_generation(self) -> None:
+        try:
+            generation = self._shared.generation(self.namespace)
+        except sqlite3.Error:
+            self.shared_errors += 1
+            return
+        if generation != self._generation:
+            self._generation = generation
+            self._clear_local()
+
+    def _clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+            self._local_bytes = 0
+
+    def _store_local(self, key: str, value: Any, expires_at: float, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._local.pop(key, None)
+            if old is not None:
+                self._local_bytes -= old[2]
+            self._local[key] = (value, expires_at, size)
+            self._local_bytes += size
+            while self._local and (len(self._local) > self.max_entries or self._local_bytes > self.max_bytes):
+                _key, (_value, _exp, evicted) = self._local.popitem(last=False)
+                self._local_bytes -= evicted
+
+    def _get_local(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._local.move_to_end(key)
+                    self.local_hits += 1
+                    return entry[0]
+                self._local.pop(key)
+                self._local_bytes -= entry[2]
+        return _MISS
+
+    def _get_shared(self, key: str) -> Any:
+        try:
+            found = self._shared.get(self.namespace, key)
+        except sqlite3.Error:
+            self.shared_errors += 1
+            return _MISS
+        if found is None:
+            return _MISS
+        raw, expires_at = found
+        value = json.loads(raw)
+        self._store_local(key, value, expires_at, len(raw))
+        self.shared_hits += 1
+        return value
+
+    def _found(self, value: Any) -> Optional[Any]:
+        if value is _MISS:
+            self.misses += 1
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        self._check_generation()
+        value = self._get_local(key)
+        if value is _MISS and self._shared is not None:
+            value = self._get_shared(key)
+        return self._found(value)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        if self._generation_due():
+            await asyncio.to_thread(self._read_generation)
+        value = self._get_local(key)
+        if value is _MISS and self._shared is not None:
+            value = await asyncio.to_thread(self._get_shared, key)
+        return self._found(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._check_generation()
+        self._set(key, value, ttl)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if self._shared is None:
+            self._set(key, value, ttl)
+            return
+        if self._generation_due():
+            await asyncio.to_thread(self._read_generation)
+        # Encoding a large value and the shared write (with its pruning) both stay off the loop
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        raw = json.dumps(value)
+        self._store_local(key, value, expires_at, len(raw))
+        if self._shared is not None:
+            try:
+                self._shared.set(self.namespace, key, raw, expires_at, self.shared_max_bytes)
+            except sqlite3.Error:
+                self.shared_errors += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._local.pop(key, None)
+            if entry is not None:
+                self._local_bytes -= entry[2]
+        if self._shared is not None:
+            try:
+                self._shared.delete(self.namespace, key)
+            except sqlite3.Error:
+                self.shared_errors += 1
+
+    def invalidate(self) -> None:
+        """Drop every entry in this namespace, in this worker and all others."""
+        self._clear_local()
+        if self._shared is not None:
+            try:
+                self._generation = self._shared.bump(self.namespace)
+                self._generation_checked = time.monotonic()
+            except sqlite3.Error:
+                self.shared_errors += 1
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "backend": "sqlite" if self._shared is not None else "memory",
+            "local_entries": len(self._local),
+            "local_bytes": self._local_bytes,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.shared_hits) / lookups if lookups else 0.0,
+            "shared_errors": self.shared_errors,
+        }
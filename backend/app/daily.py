@@ -0,0 +1,194 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from jose import jwt
+
+from .cache import Cache
+from .metrics import timed, count_response
+from .tracing import HTTPX_EVENT_HOOKS
+
+DAILY_API_URL = os.getenv("DAILY_API_URL", "https://api.daily.co/v1")
+ROOM_TTL_SECONDS = 60 * 60 * 24
+TOKEN_TTL_SECONDS = 60 * 60
+# Stop handing out a cached room or token this close to its expiry
+EXPIRY_MARGIN_SECONDS = 5 * 60
+
+_client: Optional[httpx.AsyncClient] = None
+# room name -> [room_name, room_url, exp], shared so workers don't each re-check Daily
+_rooms = Cache("daily_rooms", ttl=ROOM_TTL_SECONDS, max_entries=1024)
+# (room_name, user_name, is_owner, enable_screenshare) -> [token, exp]; bounded LRU,
+# and kept in this process because the tokens are credentials
+_tokens = Cache("daily_tokens", ttl=TOKEN_TTL_SECONDS, max_entries=4096, shared=False)
+_inflight: Dict[tuple, asyncio.Task] = {}
+
+# Meeting-token properties -> claim names Daily expects in a self-signed token
+SELF_SIGNED_CLAIMS = {
+    "room_name": "r",
+    "user_name": "u",
+    "is_owner": "o",
+    "enable_screenshare": "ss",
+    "exp": "exp",
+}
+
+
+async def _count_response(response: httpx.Response) -> None:
+    count_response("daily", response.status_code)
+
+
+def _http() -> httpx.AsyncClient:
+    """Shared client so joins reuse one keep-alive connection to Daily."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(base_url=DAILY_API_URL, timeout=30, event_hooks={
+            "request": HTTPX_EVENT_HOOKS["request"],
+            "response": [_count_response] + HTTPX_EVENT_HOOKS["response"],
+        })
+    return _client
+
+
+async def _single_flight(key: tuple, factory: Callable[[], Awaitable]):
+    """Run factory() once per key; concurrent callers await the same upstream call."""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    # shield so one cancelled caller does not cancel the shared call for everyone
+    return await asyncio.shield(task)
+
+
+def _fresh(exp: int) -> bool:
+    return exp - EXPIRY_MARGIN_SECONDS > time.time()
+
+
+async def _resolve_room(room_name: str, api_key: str, properties: dict) -> Tuple[str, str, int]:
+    headers = {"Authorization": f"Bearer {api_key}"}
+    client = _http()
+    exp = int(time.time()) + ROOM_TTL_SECONDS
+
+    # Try fetching by name first
+    r = await client.get(f"/rooms/{room_name}", headers=headers)
+    if r.status_code == 200:
+        data = r.json()
+        room_exp = int((data.get("config") or {}).get("exp") or exp)
+        if _fresh(room_exp):
+            return data["name"], data["url"], room_exp
+        # Room exists but is about to expire: extend it instead of handing out a dead room
+        r = await client.post(f"/rooms/{room_name}", headers=headers, json={"properties": {"exp": exp}})
+        if r.status_code in (200, 201):
+            data = r.json()
+            return data["name"], data["url"], exp
+
+    # Create the room
+    payload = {
+        "name": room_name,
+        "privacy": "private",
+        "properties": {**properties, "exp": exp},
+    }
+    r = await client.post("/rooms", headers=headers, json=payload)
+    if r.status_code not in (200, 201):
+        # Another worker may have created it between our GET and POST
+        retry = await client.get(f"/rooms/{room_name}", headers=headers)
+        if retry.status_code == 200:
+            data = retry.json()
+            return data["name"], data["url"], int((data.get("config") or {}).get("exp") or exp)
+        raise HTTPException(status_code=502, detail=f"Failed to create room: {r.text}")
+    data = r.json()
+    return data["name"], data["url"], exp
+
+
+@timed("daily")
+async def get_or_create_room(room_name: str, api_key: str, properties: dict) -> Tuple[str, str]:
+    """Create a private Daily room if it doesn't exist.
+    Returns (room_name, room_url). Rooms are cached until shortly before their exp.
+    """
+    cached = await _rooms.aget(room_name)
+    if cached and _fresh(cached[2]):
+        return cached[0], cached[1]
+
+    async def resolve():
+        room = await _resolve_room(room_name, api_key, properties)
+        await _rooms.aset(room_name, list(room), ttl=room[2] - EXPIRY_MARGIN_SECONDS - time.time())
+        return room
+
+    name, url, _exp = await _single_flight(("room", room_name), resolve)
+    return name, url
+
+
+def _self_signing_domain() -> Optional[str]:
+    """Domain id to sign tokens for, or None when tokens are minted by Daily's API."""
+    if os.getenv("DAILY_SELF_SIGNED_TOKENS", "").lower() not in ("1", "true", "yes"):
+        return None
+    return os.getenv("DAILY_DOMAIN_ID") or None
+
+
+def sign_meeting_token(api_key: str, domain_id: str, properties: dict, now: Optional[int] = None) -> str:
+    """Sign a Daily meeting token locally as an HS256 JWT keyed by the API key."""
+    issued_at = int(time.time()) if now is None else now
+    claims = {"d": domain_id, "iat": issued_at}
+    for prop, claim in SELF_SIGNED_CLAIMS.items():
+        if prop in properties:
+            claims[claim] = properties[prop]
+    return jwt.encode(claims, api_key, algorithm="HS256")
+
+
+def verify_meeting_token(token: str, api_key: str) -> dict:
+    """Verify a self-signed token and map its claims back to meeting-token properties."""
+    claims = jwt.decode(token, api_key, algorithms=["HS256"])
+    properties = {prop: claims[claim] for prop, claim in SELF_SIGNED_CLAIMS.items() if claim in claims}
+    properties["domain_id"] = claims.get("d")
+    return properties
+
+
+async def _mint_meeting_token(api_key: str, properties: dict) -> Tuple[str, int]:
+    headers = {"Authorization": f"Bearer {api_key}"}
+    exp = int(time.time()) + TOKEN_TTL_SECONDS
+    r = await _http().post("/meeting-tokens", headers=headers, json={"properties": {**properties, "exp": exp}})
+    if r.status_code not in (200, 201):
+        raise HTTPException(status_code=502, detail=f"Failed to create meeting token: {r.text}")
+    return r.json().get("token", ""), exp
+
+
+@timed("daily")
+async def create_meeting_token(
+    room_name: str,
+    api_key: str,
+    user_name: str,
+    is_owner: bool = False,
+    enable_screenshare: Optional[bool] = None,
+) -> str:
+    """Mint a meeting token for room_name. Identical requests share a cached token.
+
+    With DAILY_SELF_SIGNED_TOKENS=1 and DAILY_DOMAIN_ID set, tokens are signed
+    locally instead, so minting is CPU-only and never leaves the process.
+    """
+    properties: dict = {"room_name": room_name, "user_name": user_name}
+    if is_owner:
+        properties["is_owner"] = True
+    if enable_screenshare is not None:
+        properties["enable_screenshare"] = enable_screenshare
+
+    domain_id = _self_signing_domain()
+    if domain_id:
+        properties["exp"] = int(time.time()) + TOKEN_TTL_SECONDS
+        return sign_meeting_token(api_key, domain_id, properties)
+
+    key = (room_name, user_name, is_owner, enable_screenshare)
+    cache_key = json.dumps(key)
+    cached = _tokens.get(cache_key)
+    if cached and _fresh(cached[1]):
+        return cached[0]
+
+    async def mint():
+        token = await _mint_meeting_token(api_key, properties)
+        _tokens.set(cache_key, list(token), ttl=token[1] - EXPIRY_MARGIN_SECONDS - time.time())
+        return token
+
+    token, _exp = await _single_flight(("token",) + key, mint)
+    return token
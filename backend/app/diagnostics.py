@@ -0,0 +1,107 @@
+from __future__ import annotations
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import PlainTextResponse
+
+from .auth_jwt import admin_user_ids, verify_supabase_jwt
+from . import text_store, tracing
+
+router = APIRouter(prefix="/debug", tags=["diagnostics"])
+
+PROFILE_MAX_SECONDS = 60.0
+PROFILE_DEFAULT_INTERVAL_MS = 10.0
+MAX_STACK_DEPTH = 128
+
+# One profile per worker at a time; overlapping samplers would double the overhead
+_profile_lock = threading.Lock()
+
+
+def _require_admin(authorization: Optional[str]) -> dict:
+    if not authorization or not authorization.lower().startswith('bearer '):
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    token = authorization.split(' ', 1)[1]
+    try:
+        claims = verify_supabase_jwt(token)
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    if claims.get("sub") not in admin_user_ids():
+        raise HTTPException(status_code=403, detail="Admin only")
+    return claims
+
+
+def _frame_name(code) -> str:
+    # Last two path parts (app/vault_ai.py, httpx/_client.py) so stacks from different hosts collapse together
+    filename = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float) -> Dict[str, int]:
+    """Sample every thread's Python stack; returns {"thread;outer;...;inner": samples}.
+
+    Runs in its own thread, so it sees the event loop thread and the worker
+    threads while they serve traffic. Cost is one sys._current_frames() walk
+    per interval.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames = []
+            while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                frames.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            thread = names.get(ident) or f"thread-{ident}"
+            stacks[";".join([thread] + frames[::-1])] += 1
+        time.sleep(interval)
+    return stacks
+
+
+@router.get("/traces")
+async def get_traces(limit: int = 50, min_duration_ms: float = 0, authorization: str = Header(default=None)):
+    """Most recent traced requests on this worker, newest first."""
+    _require_admin(authorization)
+    traces = [t.to_dict() for t in reversed(tracing.recent) if (t.duration_ms or 0) >= min_duration_ms]
+    return {"pid": os.getpid(), "traces": traces[:max(0, limit)]}
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = 10.0, interval_ms: float = PROFILE_DEFAULT_INTERVAL_MS,
+                  authorization: str = Header(default=None)):
+    """Sample the worker that answers for `seconds`; collapsed stacks for flamegraph.pl or speedscope."""
+    _require_admin(authorization)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    if not _profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    try:
+        stacks = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000)
+    finally:
+        _profile_lock.release()
+    body = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    return PlainTextResponse(body, headers={"X-Profile-Pid": str(os.getpid())})
+
+
+@router.get("/text-store")
+async def text_store_footprint(authorization: str = Header(default=None)):
+    """Storage and extraction CPU of deduplicated text, against what per-file copies would cost."""
+    _require_admin(authorization)
+    try:
+        footprint = await text_store.footprint()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if footprint is None:
+        raise HTTPException(status_code=503, detail="SUPABASE_SERVICE_ROLE_KEY is not configured")
+    return footprint
@@ -0,0 +1,139 @@
+"""Text extraction from stored files, shared by the vault and server chat routes.
+
+PyPDF2 and python-docx are imported on first use. PDF and DOCX parsing is CPU
+bound, so extract_text_async runs it in a small process pool instead of on the
+event loop; plain text is decoded inline. Keep this module free of app imports:
+pool workers are spawned and import only this file.
+"""
+from __future__ import annotations
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+# 0 parses in a thread of the calling process instead
+EXTRACTION_PROCESSES = int(os.getenv("EXTRACTION_PROCESSES", "2"))
+# Stored with every deduplicated text; bump when extract_text output changes so old entries are redone
+EXTRACTOR_VERSION = 1
+
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _kind(content_type: str, filename: str) -> str:
+    if content_type == PDF_MIME or filename.lower().endswith('.pdf'):
+        return "pdf"
+    if content_type == DOCX_MIME or filename.lower().endswith('.docx'):
+        return "docx"
+    return "text"
+
+
+def load_parsers() -> bool:
+    """Import the PDF and DOCX parsers; False if they are not installed."""
+    try:
+        import PyPDF2  # noqa: F401
+        import docx  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def extract_text(data: bytes, content_type: str, filename: str) -> Optional[str]:
+    """Extract text from file content based on MIME type and filename"""
+    kind = _kind(content_type, filename)
+    try:
+        if kind == "pdf":
+            try:
+                import PyPDF2
+            except Exception:
+                return None
+            try:
+                reader = PyPDF2.PdfReader(io.BytesIO(data))
+                return "\n".join(page.extract_text() for page in reader.pages)
+            except Exception:
+                return None
+
+        if kind == "docx":
+            try:
+                from docx import Document
+            except Exception:
+                return None
+            try:
+                doc = Document(io.BytesIO(data))
+                return "\n".join(paragraph.text for paragraph in doc.paragraphs)
+            except Exception:
+                return None
+
+        # Plain text and other text formats; anything else is tried as UTF-8 too
+        return data.decode("utf-8", errors="ignore")
+    except Exception:
+        return None
+
+
+def extract_text_measured(data: bytes, content_type: str, filename: str) -> Tuple[Optional[str], float]:
+    """extract_text plus the CPU seconds it took in the process that ran it."""
+    started = time.process_time()
+    text = extract_text(data, content_type, filename)
+    return text, time.process_time() - started
+
+
+def _exit_with_parent(parent_pid: int) -> None:
+    """Pool worker initializer: exit if the API process is killed without shutting the pool down."""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def _executor() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _pool is None and EXTRACTION_PROCESSES > 0:
+        # spawn, not fork: the parent has event-loop, SQLite and HTTP client threads
+        _pool = ProcessPoolExecutor(
+            EXTRACTION_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_exit_with_parent,
+            initargs=(os.getpid(),),
+        )
+    return _pool
+
+
+async def extract_text_async(data: bytes, content_type: str, filename: str) -> Tuple[Optional[str], float]:
+    """extract_text_measured off the event loop; PDF and DOCX go to the process pool."""
+    global _pool
+    if _kind(content_type, filename) == "text":
+        return extract_text_measured(data, content_type, filename)
+    pool = _executor()
+    if pool is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, extract_text_measured, data, content_type, filename)
+        except BrokenProcessPool:
+            # A worker died (OOM on a huge file); start a fresh pool next time, parse this one in a thread
+            print("Extraction pool broke; recreating it")
+            _pool = None
+    return await asyncio.to_thread(extract_text_measured, data, content_type, filename)
+
+
+async def warm_pool() -> bool:
+    """Start every pool worker and load the parsers in it, so the first upload is not slow."""
+    pool = _executor()
+    if pool is None:
+        return await asyncio.to_thread(load_parsers)
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(loop.run_in_executor(pool, load_parsers) for _ in range(EXTRACTION_PROCESSES)))
+    return all(results)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
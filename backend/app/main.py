@@ -1,17 +1,59 @@
-from fastapi import FastAPI
+# Load environment variables from a .env file if present (local dev). First, because
+# modules read their settings when imported.
+from dotenv import load_dotenv
+load_dotenv()
+
+from . import startup
+import asyncio
+import hmac
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from .auth import router as auth_router
-from .voice import router as voice_router
-from .vault_ai import router as vault_ai_router
-from .server_ai import router as server_ai_router
-from .voice_agent import router as voice_agent_router
+from fastapi.responses import JSONResponse, PlainTextResponse
+# openai, PyPDF2, docx and tiktoken are imported on first use (or by warm-up), not here
+with startup.timed_import("auth"):
+    from .auth import router as auth_router
+    from .auth_jwt import get_jwks
+with startup.timed_import("voice"):
+    from .voice import router as voice_router
+with startup.timed_import("vault_ai"):
+    from .vault_ai import router as vault_ai_router
+with startup.timed_import("server_ai"):
+    from .server_ai import router as server_ai_router
+with startup.timed_import("voice_agent"):
+    from .voice_agent import router as voice_agent_router, check_agent_user, start_voice_agents, stop_voice_agents
+from .diagnostics import router as diagnostics_router
+from . import extraction, metrics, text_store, tokens
+from .tracing import TraceMiddleware
+from .openai_client import openai_client
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from a .env file if present (local dev)
-load_dotenv()
 
-app = FastAPI(title="Collaborative AI Platform API")
+def _warmup_steps() -> list:
+    steps = [("extraction_pool", extraction.warm_pool), ("tokenizer", lambda: asyncio.to_thread(tokens.tokenizer))]
+    if os.getenv("SUPABASE_URL") or os.getenv("SUPABASE_ANON_KEY"):
+        steps.append(("jwks", lambda: asyncio.to_thread(get_jwks)))
+    if os.getenv("OPENAI_API_KEY"):
+        steps.append(("openai", lambda: asyncio.to_thread(openai_client)))
+    if os.getenv("SUPABASE_SERVICE_ROLE_KEY"):
+        steps.append(("text_dictionaries", text_store.load_dictionaries))
+        steps.append(("voice_agent_user", check_agent_user))
+    return steps
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    metrics.start_publisher()
+    await start_voice_agents()
+    warm_up = asyncio.create_task(startup.warm_up(_warmup_steps()))
+    yield
+    warm_up.cancel()
+    await stop_voice_agents()
+    extraction.shutdown_pool()
+    metrics.stop_publisher()
+
+
+app = FastAPI(title="Collaborative AI Platform API", lifespan=lifespan)
 
 # CORS configuration - allows both local development and production
 allowed_origins = [
@@ -38,10 +80,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
+app.add_middleware(TraceMiddleware)
 
 app.include_router(auth_router, prefix="/auth")
 app.include_router(voice_router)
 app.include_router(vault_ai_router)
 app.include_router(server_ai_router)
 app.include_router(voice_agent_router)
+app.include_router(diagnostics_router)
+
+@app.get("/ready")
+async def ready():
+    """503 until startup warm-up has finished; the body is the startup timing report."""
+    return JSONResponse(startup.report(), status_code=200 if startup.is_ready() else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics(authorization: str = Header(default=None)):
+    """Prometheus exposition of pipeline-stage metrics for this host's workers (worker label)."""
+    # Scrapes need METRICS_TOKEN; without one configured the endpoint stays closed
+    expected = os.getenv("METRICS_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Metrics are not enabled")
+    if not hmac.compare_digest(authorization or "", f"Bearer {expected}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,345 @@
+from __future__ import annotations
+import asyncio
+import bisect
+import functools
+import json
+import math
+import os
+import socket
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .shared_state import state_path
+from .tracing import current_trace
+
+# Upper bounds in milliseconds, roughly log-spaced from interactive to slow
+LATENCY_BUCKETS_MS = (
+    5, 10, 25, 50, 75, 100, 150, 200, 300, 400, 500, 750,
+    1_000, 1_500, 2_000, 3_000, 5_000, 10_000, 30_000,
+)
+# Prometheus convention is seconds
+STAGE_BUCKETS_SECONDS = tuple(ms / 1000 for ms in (1, 2.5) + LATENCY_BUCKETS_MS + (60_000,))
+SIZE_BUCKETS = tuple(10 ** e * m for e in range(2, 7) for m in (1, 2.5, 5)) + (10_000_000,)
+
+# Without SHARED_STATE_DIR this is in memory and /metrics covers one worker
+METRICS_PATH = state_path("metrics.sqlite3")
+METRICS_PUBLISH_SECONDS = 5.0
+METRICS_STALE_SECONDS = 30.0  # snapshots older than this belong to workers that are gone
+
+
+class Histogram:
+    """Fixed-bucket histogram; O(log buckets) per observation, no samples kept.
+
+    Percentiles are interpolated inside the bucket they fall in, so they are
+    accurate to the bucket width.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+# Exported metrics. Label values are passed positionally so the hot path is a
+# tuple-keyed dict lookup; families register themselves for /metrics.
+
+_families: Dict[str, "_Family"] = {}
+# Callables returning (name, type, doc, labelnames, {labelvalues: value}) for
+# values that already live elsewhere (cache stats, pool stats); read at scrape time
+_collectors: List[Callable[[], List[tuple]]] = []
+
+
+class _Family:
+    type = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        _families[name] = self
+
+
+class Counter(_Family):
+    type = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+
+class HistogramVec(_Family):
+    type = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS_SECONDS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(buckets)
+        self.series: Dict[tuple, Histogram] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        h = self.series.get(labelvalues)
+        if h is None:
+            h = self.series[labelvalues] = Histogram(self.buckets)
+        h.observe(value)
+
+
+def register_collector(collect: Callable[[], List[tuple]]) -> None:
+    _collectors.append(collect)
+
+
+stage_seconds = HistogramVec("app_stage_seconds", "Time spent in each pipeline stage", ("module", "stage"))
+stage_errors = Counter("app_stage_errors_total", "Pipeline stages that raised", ("module", "stage"))
+upstream_responses = Counter("app_upstream_responses_total", "Upstream HTTP responses by status code", ("upstream", "status"))
+downloaded_bytes = Counter("app_downloaded_bytes_total", "Bytes downloaded from storage", ("module",))
+extracted_chars = Counter("app_extracted_chars_total", "Characters of text extracted from files", ("module",))
+extraction_cpu_seconds = Counter("app_extraction_cpu_seconds_total", "CPU seconds spent extracting text from files", ("module",))
+text_store_lookups = Counter("app_text_store_lookups_total", "Deduplicated text lookups by where the text was found", ("module", "result"))
+context_chars = HistogramVec("app_context_chars", "Context characters sent to the model per request", ("module",), SIZE_BUCKETS)
+context_tokens = HistogramVec("app_context_tokens", "Context tokens sent to the model per request", ("module",), SIZE_BUCKETS)
+
+
+class stage:
+    """Time a block: `with stage("vault_ai", "llm"): ...`. Works around awaits.
+
+    Also recorded as a span when the request is being traced (see tracing.py).
+    """
+
+    __slots__ = ("labels", "started")
+
+    def __init__(self, module: str, name: str):
+        self.labels = (module, name)
+
+    def __enter__(self) -> "stage":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        ended = time.perf_counter()
+        stage_seconds.observe(ended - self.started, *self.labels)
+        if exc_type is not None:
+            stage_errors.inc(*self.labels)
+        trace = current_trace()
+        if trace is not None:
+            trace.add(".".join(self.labels), self.started, ended, exc_type is not None)
+
+
+def timed(module: str, name: Optional[str] = None):
+    """Decorator form of stage() for sync and async helpers; the stage defaults to the function name."""
+    def decorate(fn):
+        label = name or fn.__name__.lstrip("_")
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(module, label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(module, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_response(upstream: str, status_code: int) -> None:
+    upstream_responses.inc(upstream, str(status_code))
+
+
+# Cross-worker view. Each worker publishes a snapshot of its metrics to a SQLite
+# file every few seconds; /metrics serves the live snapshots of all workers on the
+# host so a scrape does not depend on which worker answers it. Every series carries
+# a worker label rather than being summed: when a worker goes away its series end,
+# where a sum would drop and read as a counter reset. Aggregate with sum() in queries.
+
+_worker_id = f"{socket.gethostname()}:{os.getpid()}"
+_conn: Optional[sqlite3.Connection] = None
+_publisher: Optional[asyncio.Task] = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(METRICS_PATH, timeout=5, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots (worker_id TEXT PRIMARY KEY, updated_at REAL NOT NULL, data TEXT NOT NULL)"
+        )
+    return _conn
+
+
+def snapshot() -> dict:
+    """This worker's metrics as {name: {type, doc, labels, buckets?, series: {json labelvalues: value}}}."""
+    out: Dict[str, dict] = {}
+    for family in list(_families.values()):
+        if isinstance(family, HistogramVec):
+            series = {json.dumps(k): h.counts + [h.sum] for k, h in list(family.series.items())}
+            out[family.name] = {"type": "histogram", "doc": family.doc, "labels": family.labelnames,
+                                "buckets": family.buckets, "series": series}
+        else:
+            series = {json.dumps(k): v for k, v in list(family.values.items())}
+            out[family.name] = {"type": family.type, "doc": family.doc, "labels": family.labelnames, "series": series}
+    for collect in _collectors:
+        try:
+            samples = collect()
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, doc, labelnames, values in samples:
+            entry = out.setdefault(name, {"type": kind, "doc": doc, "labels": tuple(labelnames), "series": {}})
+            for k, v in values.items():
+                key = json.dumps(k)
+                entry["series"][key] = entry["series"].get(key, 0) + v
+    return out
+
+
+def publish() -> None:
+    _db().execute(
+        "INSERT OR REPLACE INTO snapshots (worker_id, updated_at, data) VALUES (?, ?, ?)",
+        (_worker_id, time.time(), json.dumps(snapshot())),
+    )
+
+
+def _merge(into: dict, other: dict) -> None:
+    for name, entry in other.items():
+        target = into.get(name)
+        if target is None:
+            into[name] = entry
+            continue
+        if entry["type"] == "histogram" and list(target.get("buckets", ())) != list(entry.get("buckets", ())):
+            continue  # bucket layout changed between deploys; one family renders with one layout
+        for key, value in entry["series"].items():
+            current = target["series"].get(key)
+            if current is None:
+                target["series"][key] = value
+            elif isinstance(value, list):
+                target["series"][key] = [a + b for a, b in zip(current, value)]
+            else:
+                target["series"][key] = current + value
+
+
+def _with_worker(metrics: dict, worker_id: str) -> dict:
+    """A snapshot with worker_id appended to every series' labels."""
+    out = {}
+    for name, entry in metrics.items():
+        series = {json.dumps(json.loads(key) + [worker_id]): value for key, value in entry["series"].items()}
+        out[name] = {**entry, "labels": list(entry["labels"]) + ["worker"], "series": series}
+    return out
+
+
+def collect_all() -> dict:
+    """This worker's live metrics plus the latest snapshot of every other live worker, labelled by worker."""
+    merged = _with_worker(json.loads(json.dumps(snapshot())), _worker_id)
+    try:
+        rows = _db().execute(
+            "SELECT worker_id, data FROM snapshots WHERE worker_id != ? AND updated_at >= ?",
+            (_worker_id, time.time() - METRICS_STALE_SECONDS),
+        ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Reading worker metrics failed: {e}")
+        rows = []
+    for worker_id, data in rows:
+        _merge(merged, _with_worker(json.loads(data), worker_id))
+    return merged
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def render(metrics: Optional[dict] = None) -> str:
+    """Prometheus text exposition format."""
+    metrics = collect_all() if metrics is None else metrics
+    lines: List[str] = []
+    for name in sorted(metrics):
+        entry = metrics[name]
+        labelnames = entry["labels"]
+        lines.append(f"# HELP {name} {entry['doc']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        for key, value in sorted(entry["series"].items()):
+            labelvalues = json.loads(key)
+            if entry["type"] == "histogram":
+                counts, total = value[:-1], value[-1]
+                cumulative = 0
+                for bound, n in zip(list(entry["buckets"]) + [math.inf], counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(labelnames, labelvalues, ('le', _fmt(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labelnames, labelvalues)} {_fmt(total)}")
+                lines.append(f"{name}_count{_labels(labelnames, labelvalues)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels(labelnames, labelvalues)} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+async def _publish_loop() -> None:
+    while True:
+        try:
+            publish()
+        except Exception as e:
+            print(f"Publishing metrics failed: {e}")
+        await asyncio.sleep(METRICS_PUBLISH_SECONDS)
+
+
+def start_publisher() -> None:
+    global _publisher
+    if _publisher is None or _publisher.done():
+        _publisher = asyncio.create_task(_publish_loop())
+
+
+def stop_publisher() -> None:
+    global _publisher
+    if _publisher is not None:
+        _publisher.cancel()
+        _publisher = None
+    try:
+        _db().execute("DELETE FROM snapshots WHERE worker_id = ?", (_worker_id,))
+    except sqlite3.Error:
+        pass
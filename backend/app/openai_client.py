@@ -0,0 +1,24 @@
+from __future__ import annotations
+import os
+from typing import Any, Optional
+
+from fastapi import HTTPException
+
+# The SDK takes about half a second to import, so it is loaded on first use
+# (or by the startup warm-up), and one client is kept so requests share its
+# connection pool instead of opening a new one each time.
+_client: Optional[Any] = None
+
+
+def openai_client():
+    global _client
+    if _client is None:
+        try:
+            from openai import OpenAI  # type: ignore
+        except Exception:
+            raise HTTPException(status_code=500, detail="OpenAI SDK not installed on server")
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="Missing environment variable: OPENAI_API_KEY")
+        _client = OpenAI(api_key=api_key)
+    return _client
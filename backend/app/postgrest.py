@@ -0,0 +1,66 @@
+from __future__ import annotations
+from typing import AsyncIterator, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from .metrics import count_response, stage
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def _quote(value: str) -> str:
+    # Timestamps contain ':', '.' and '+', which are reserved inside PostgREST logic trees
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _after(sort_column: str, cursor: Tuple[Optional[str], str]) -> dict:
+    """Filter for rows after cursor in `sort_column desc nulls last, id desc` order."""
+    sort_value, row_id = cursor
+    if sort_value is None:
+        return {"and": f"({sort_column}.is.null,id.lt.{_quote(row_id)})"}
+    return {"or": (
+        f"({sort_column}.lt.{_quote(sort_value)},"
+        f"and({sort_column}.eq.{_quote(sort_value)},id.lt.{_quote(row_id)}),"
+        f"{sort_column}.is.null)"
+    )}
+
+
+async def iter_keyset(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict,
+    params: dict,
+    sort_column: str,
+    module: str,
+    what: str = "rows",
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> AsyncIterator[dict]:
+    """Yield rows newest first, one page at a time, with keyset pagination on (sort_column, id).
+
+    Each page is an index range scan from the previous page's last row, so
+    late pages cost the same as the first. `params` must select id and
+    sort_column. Stop iterating (and aclose() the generator) as soon as
+    enough rows have been seen; no further pages are requested.
+    """
+    cursor: Optional[Tuple[Optional[str], str]] = None
+    while True:
+        page_params = {**params, "order": f"{sort_column}.desc.nullslast,id.desc", "limit": str(page_size)}
+        if cursor is not None:
+            page_params.update(_after(sort_column, cursor))
+        with stage(module, "list_page"):
+            r = await client.get(url, headers=headers, params=page_params)
+        count_response("postgrest", r.status_code)
+        if r.status_code != 200:
+            if cursor is None:
+                raise HTTPException(status_code=r.status_code, detail=f"Failed to list {what}: {r.text}")
+            # Later pages only add context; answer with what has been listed so far
+            print(f"Listing {what} stopped after a failed page: HTTP {r.status_code}")
+            return
+        rows = r.json() or []
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+        cursor = (last.get(sort_column), last["id"])
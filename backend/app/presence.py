@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+PRESENCE_TTL_SECONDS = 90
+PRESENCE_REFRESH_SECONDS = 30
+PRESENCE_DEBOUNCE_SECONDS = 1.0
+
+Key = Tuple[str, str]  # (channel_id, user_id)
+
+
+class PresenceService:
+    """Batched, debounced writes to voice_presence.
+
+    Callers only record the desired state. A background task waits out a
+    debounce window and then writes the net change: one upsert batch and one
+    delete batch. A join and leave inside the same window cost no write at
+    all. Rows carry an expires_at that is refreshed while the owner is
+    present, so if this process dies its rows simply expire (see
+    008_voice_presence_ttl.sql).
+    """
+
+    def __init__(
+        self,
+        ttl: float = PRESENCE_TTL_SECONDS,
+        refresh: float = PRESENCE_REFRESH_SECONDS,
+        debounce: float = PRESENCE_DEBOUNCE_SECONDS,
+    ):
+        self.ttl = ttl
+        self.refresh = refresh
+        self.debounce = debounce
+        self._desired: Dict[Key, Optional[str]] = {}   # user_name when present, None when absent
+        self._written: Dict[Key, str] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.changes = 0
+        self.requests = 0
+        self.rows_written = 0
+
+    def _config(self) -> Optional[Tuple[str, str]]:
+        supabase_url = os.getenv("SUPABASE_URL")
+        service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not supabase_url or not service_key:
+            return None
+        return supabase_url.rstrip("/"), service_key
+
+    def set_present(self, channel_id: str, user_id: str, user_name: str) -> None:
+        self.changes += 1
+        self._desired[(channel_id, user_id)] = user_name
+        self.start()
+        self._wakeup.set()
+
+    def set_absent(self, channel_id: str, user_id: str) -> None:
+        self.changes += 1
+        self._desired[(channel_id, user_id)] = None
+        self.start()
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Final flush so a clean shutdown removes our rows right away
+        await self.flush(refresh_all=False)
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "present": len(self._written),
+            "state_changes": self.changes,
+            "requests": self.requests,
+            "rows_written": self.rows_written,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refresh)
+                # Let flaps inside the debounce window settle before writing
+                await asyncio.sleep(self.debounce)
+                refresh_all = False
+            except asyncio.TimeoutError:
+                refresh_all = True
+            self._wakeup.clear()
+            try:
+                await self.flush(refresh_all=refresh_all)
+            except Exception as e:
+                print(f"Presence flush failed: {e}")
+
+    async def flush(self, refresh_all: bool = False) -> None:
+        config = self._config()
+        if config is None:
+            self._desired.clear()
+            return
+        supabase_url, service_key = config
+        headers = {
+            "Authorization": f"Bearer {service_key}",
+            "apikey": service_key,
+            "Content-Type": "application/json",
+        }
+        url = f"{supabase_url}/rest/v1/voice_presence"
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+
+        desired, self._desired = self._desired, {}
+        upserts = {k: name for k, name in desired.items() if name is not None and (refresh_all or self._written.get(k) != name)}
+        if refresh_all:
+            upserts.update({k: name for k, name in self._written.items() if k not in desired})
+        deletes = [k for k, name in desired.items() if name is None and k in self._written]
+
+        try:
+            if upserts:
+                expires_at = (datetime.now(timezone.utc) + timedelta(seconds=self.ttl)).isoformat()
+                rows = [
+                    {"channel_id": c, "user_id": u, "user_name": name, "expires_at": expires_at}
+                    for (c, u), name in upserts.items()
+                ]
+                r = await self._client.post(
+                    url,
+                    headers={**headers, "Prefer": "resolution=merge-duplicates,return=minimal"},
+                    params={"on_conflict": "channel_id,user_id"},
+                    json=rows,
+                )
+                self.requests += 1
+                r.raise_for_status()
+                self._written.update(upserts)
+                self.rows_written += len(rows)
+            if deletes:
+                match = ",".join(f"and(channel_id.eq.{c},user_id.eq.{u})" for c, u in deletes)
+                r = await self._client.delete(url, headers=headers, params={"or": f"({match})"})
+                self.requests += 1
+                r.raise_for_status()
+                for k in deletes:
+                    self._written.pop(k, None)
+                self.rows_written += len(deletes)
+        except Exception:
+            # Retry on the next flush unless a newer state was recorded meanwhile
+            for k, name in desired.items():
+                self._desired.setdefault(k, name)
+            raise
+
+
+presence = PresenceService()
@@ -1,28 +1,33 @@
 from __future__ import annotations
 import os
-import io
-from typing import List, Optional
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional
 
 import httpx
 from fastapi import APIRouter, HTTPException, Header
 from pydantic import BaseModel
 
 from .auth_jwt import verify_supabase_jwt
+from .cache import Cache
+from .openai_client import openai_client
+from .postgrest import iter_keyset
+from . import text_store, tokens
+from .tracing import HTTPX_EVENT_HOOKS
+from .metrics import stage, timed, count_response, context_chars, context_tokens, downloaded_bytes
 
-try:
-    from openai import OpenAI  # type: ignore
-except Exception:  # pragma: no cover
-    OpenAI = None  # type: ignore
 
-try:
-    import PyPDF2
-    from docx import Document
-except Exception:
-    PyPDF2 = None
-    Document = None
+router = APIRouter(prefix="/servers", tags=["server-ai"])
 
+# Content hash by storage path and row version, for rows not yet linked to their text in the store
+_hash_cache = Cache("server_file_hash", ttl=24 * 60 * 60, max_entries=4096)
 
-router = APIRouter(prefix="/servers", tags=["server-ai"])
+ANSWER_MAX_TOKENS = 1000
+
+SYSTEM_PROMPT = (
+    "You are Claude, a helpful AI assistant in a team server. You can see files shared in the server's cloud storage. "
+    "Answer questions based on the provided context from server files. Be conversational and helpful. "
+    "If you don't have enough context, say so clearly."
+)
 
 
 class ServerChatRequest(BaseModel):
@@ -30,12 +35,14 @@ class ServerChatRequest(BaseModel):
     channel_id: str
     model: Optional[str] = None
     max_chars: Optional[int] = 150_000
+    max_tokens: Optional[int] = None  # context token cap; default: what the model's window leaves
     include_filenames: Optional[bool] = True
 
 
 class ServerChatResponse(BaseModel):
     answer: str
     used_chars: int
+    used_tokens: int  # context tokens, in the model's encoding
     included_files: List[str]
 
 
@@ -46,7 +53,8 @@ def _require_env(var: str) -> str:
     return val
 
 
-async def _fetch_server_files(supabase_url: str, user_token: str, server_id: str) -> List[dict]:
+async def _iter_server_files(supabase_url: str, user_token: str, server_id: str) -> AsyncIterator[dict]:
+    """Every file shared in the server, newest first, fetched a page at a time."""
     headers = {
         "Authorization": f"Bearer {user_token}",
         "apikey": _require_env("SUPABASE_ANON_KEY"),
@@ -54,107 +62,58 @@ async def _fetch_server_files(supabase_url: str, user_token: str, server_id: str
     # Get server files from server_files table
     url = f"{supabase_url.rstrip('/')}/rest/v1/server_files"
     params = {
-        "select": "id,name,size,file_path,file_type,created_at,uploaded_by",
+        "select": "id,name,size,file_path,file_type,created_at,updated_at,uploaded_by,content_hash,"
+                  "extracted_texts(token_chunks,tokenizer)",
         "server_id": f"eq.{server_id}",
-        "order": "created_at.desc",
-        "limit": "30",
     }
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(url, headers=headers, params=params)
-        if r.status_code != 200:
-            raise HTTPException(status_code=r.status_code, detail=f"Failed to list server files: {r.text}")
-        return r.json() or []
-
-
-def _extract_text_from_content(data: bytes, content_type: str, filename: str) -> Optional[str]:
-    """Extract text from file content based on MIME type and filename"""
-    try:
-        # PDF files
-        if content_type == "application/pdf" or filename.lower().endswith('.pdf'):
-            if PyPDF2 is None:
-                return None
-            try:
-                reader = PyPDF2.PdfReader(io.BytesIO(data))
-                text_parts = []
-                for page in reader.pages:
-                    text_parts.append(page.extract_text())
-                return "\n".join(text_parts)
-            except Exception:
-                return None
-        
-        # Word documents (.docx)
-        elif (content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" 
-              or filename.lower().endswith('.docx')):
-            if Document is None:
-                return None
-            try:
-                doc = Document(io.BytesIO(data))
-                text_parts = []
-                for paragraph in doc.paragraphs:
-                    text_parts.append(paragraph.text)
-                return "\n".join(text_parts)
-            except Exception:
-                return None
-        
-        # Plain text and other text formats
-        elif content_type.startswith("text/") or content_type in [
-            "application/json", "application/xml", "application/yaml"
-        ]:
-            return data.decode("utf-8", errors="ignore")
-        
-        # Try UTF-8 decode as fallback
-        else:
-            try:
-                return data.decode("utf-8", errors="ignore")
-            except Exception:
-                return None
-                
-    except Exception:
-        return None
-
-
-async def _fetch_server_file_text(supabase_url: str, user_token: str, bucket: str, path: str, content_type: str, filename: str) -> Optional[str]:
+    async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+        async for row in iter_keyset(client, url, headers, params, "created_at", module="server_ai", what="server files"):
+            yield row
+
+
+@timed("server_ai")
+async def _fetch_server_file_text(supabase_url: str, user_token: str, bucket: str, path: str, content_type: str, filename: str, modified_at: str = "", file_id: str = "", content_hash: Optional[str] = None, max_chars: Optional[int] = None) -> tuple[Optional[str], Optional[str]]:
+    """(content_hash, text) of a server file; stored text is only inflated up to max_chars, all the context has room for."""
+    # Only reached for files the caller just listed under RLS, so shared text is safe to reuse.
+    if content_hash:
+        text = await text_store.get_text(content_hash, "server_ai", max_chars)
+        if text is not None:
+            return content_hash, text
+    cache_key = f"{bucket}/{path}@{modified_at}"
+    known_hash = await _hash_cache.aget(cache_key)
+    if known_hash:
+        text = await text_store.get_text(known_hash, "server_ai", max_chars)
+        if text is not None:
+            return known_hash, text
     headers = {
         "Authorization": f"Bearer {user_token}",
         "apikey": _require_env("SUPABASE_ANON_KEY"),
     }
     # Direct object download endpoint for server files
     url = f"{supabase_url.rstrip('/')}/storage/v1/object/{bucket}/{path}"
-    async with httpx.AsyncClient(timeout=30) as client:
+    async with httpx.AsyncClient(timeout=30, event_hooks=HTTPX_EVENT_HOOKS) as client:
         r = await client.get(url, headers=headers)
+        count_response("storage", r.status_code)
         if r.status_code != 200:
-            return None
+            return None, None
         
-        return _extract_text_from_content(r.content, content_type or "", filename)
-
-
-def _build_context(big_chunks: List[tuple[str, str]], max_chars: int, include_filenames: bool) -> tuple[str, List[str], int]:
-    included: List[str] = []
-    pieces: List[str] = []
-    remaining = max_chars
-    for fname, text in big_chunks:
-        if not text:
-            continue
-        header = f"\n\n===== FILE: {fname} =====\n" if include_filenames else "\n\n"
-        need = len(header) + len(text)
-        if need > remaining:
-            # Truncate text to fit
-            take = max(0, remaining - len(header))
-            if take <= 0:
-                break
-            pieces.append(header)
-            pieces.append(text[:take])
-            included.append(fname + " (truncated)")
-            remaining = 0
-            break
-        pieces.append(header)
-        pieces.append(text)
-        included.append(fname)
-        remaining -= need
-        if remaining <= 0:
-            break
-    combined = "".join(pieces).strip()
-    return combined, included, max_chars - remaining
+        downloaded_bytes.inc("server_ai", amount=len(r.content))
+        digest, text = await text_store.extract_once(r.content, content_type or "", filename, "server_ai")
+        if text is not None:
+            await _hash_cache.aset(cache_key, digest)
+            if text and file_id and digest != content_hash:
+                await text_store.link("server_files", file_id, digest, "server_ai")
+        return digest, text
+
+
+def _user_prompt(message: str, context: str) -> str:
+    user_prompt = f"Question: {message}"
+    if context:
+        user_prompt += f"\n\nContext from server files:\n{context}"
+    return user_prompt
+
+
+_build_context = timed("server_ai", "build_context")(tokens.build_context)
 
 
 @router.post("/{server_id}/chat", response_model=ServerChatResponse)
@@ -162,7 +121,8 @@ async def chat_with_server(server_id: str, body: ServerChatRequest, authorizatio
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Missing bearer token")
     token = authorization.split(" ", 1)[1]
-    claims = verify_supabase_jwt(token)
+    with stage("server_ai", "auth"):
+        claims = verify_supabase_jwt(token)
     if not claims.get("sub"):
         raise HTTPException(status_code=401, detail="Invalid token")
 
@@ -180,67 +140,82 @@ async def chat_with_server(server_id: str, body: ServerChatRequest, authorizatio
         "select": "server_id",
         "id": f"eq.{body.channel_id}",
     }
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(channel_check_url, headers=headers, params=channel_params)
+    async with httpx.AsyncClient(timeout=10, event_hooks=HTTPX_EVENT_HOOKS) as client:
+        with stage("server_ai", "channel_check"):
+            r = await client.get(channel_check_url, headers=headers, params=channel_params)
+        count_response("postgrest", r.status_code)
         if r.status_code != 200:
             raise HTTPException(status_code=403, detail="Cannot access channel")
         channels = r.json()
         if not channels or channels[0].get("server_id") != server_id:
             raise HTTPException(status_code=403, detail="Channel not in server")
 
-    # 2) List server files
-    server_files = await _fetch_server_files(supabase_url, token, server_id)
-
-    # 3) Extract text from server files
-    text_chunks: List[tuple[str, str]] = []
-    for f in server_files:
-        file_path = f.get("file_path") or ""
-        name = f.get("name") or file_path.split("/")[-1] if file_path else "unknown"
-        file_type = f.get("file_type") or ""
-        
-        if not file_path:
-            continue
-            
-        # For server files, the path is typically server-files/{server_id}/{filename}
-        text = await _fetch_server_file_text(supabase_url, token, "server-files", file_path, file_type, name)
-        if text and text.strip():
-            text_chunks.append((name, text.strip()))
+    # Token budget: the model's window less the prompts and the answer
+    model = body.model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    # Clean the message of @Claude mentions
+    clean_message = body.message.replace("@Claude", "").replace("@claude", "").strip()
+    prompt_tokens = tokens.count(SYSTEM_PROMPT, model) + tokens.count(_user_prompt(clean_message, ""), model)
+    max_tokens = tokens.context_budget(model, prompt_tokens, ANSWER_MAX_TOKENS, body.max_tokens)
 
+    # 2) List server files page by page and 3) extract their text until the budget is full
     max_chars = int(body.max_chars or 150_000)
-    context, included_files, used_chars = _build_context(text_chunks, max_chars, bool(body.include_filenames))
+    text_chunks: List[tuple[str, str, List[int]]] = []
+    text_chars = text_tokens = 0
+    async with aclosing(_iter_server_files(supabase_url, token, server_id)) as server_files:
+        async for f in server_files:
+            file_path = f.get("file_path") or ""
+            name = f.get("name") or file_path.split("/")[-1] if file_path else "unknown"
+            file_type = f.get("file_type") or ""
+
+            if not file_path:
+                continue
+
+            # For server files, the path is typically server-files/{server_id}/{filename}
+            modified_at = f.get("updated_at") or f.get("created_at") or ""
+            stored = f.get("extracted_texts") if f.get("content_hash") else None
+            limit = max_chars - text_chars
+            if stored and stored.get("token_chunks"):
+                # Cost known before reading: inflate no more than the token budget has room for
+                known = tokens.for_model(stored["token_chunks"], stored.get("tokenizer"), model)
+                limit = min(limit, tokens.prefix_chars(known, max_tokens - text_tokens))
+                if limit <= 0:
+                    break
+            digest, text = await _fetch_server_file_text(supabase_url, token, "server-files", file_path, file_type, name,
+                                                         modified_at, f.get("id") or "", f.get("content_hash"), limit)
+            if text and text.strip():
+                totals, tokenizer = await text_store.token_totals(
+                    digest, text, "server_ai", stored if digest == f.get("content_hash") else None,
+                    complete=len(text) < limit)
+                text_chunks.append((name, text.strip(), tokens.for_model(totals, tokenizer, model)))
+                text_chars += len(text_chunks[-1][1])
+                text_tokens += tokens.total(text_chunks[-1][2])
+                if text_chars >= max_chars or text_tokens >= max_tokens:
+                    # _build_context truncates this last file; older ones could not fit
+                    break
+
+    context, included_files, used_chars, used_tokens = _build_context(
+        text_chunks, max_chars, max_tokens, bool(body.include_filenames), model)
 
     # 4) Build prompt and call OpenAI
-    if OpenAI is None:
-        raise HTTPException(status_code=500, detail="OpenAI SDK not installed on server")
-    api_key = _require_env("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-
-    model = body.model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    system = (
-        "You are Claude, a helpful AI assistant in a team server. You can see files shared in the server's cloud storage. "
-        "Answer questions based on the provided context from server files. Be conversational and helpful. "
-        "If you don't have enough context, say so clearly."
-    )
-    
-    # Clean the message of @Claude mentions
-    clean_message = body.message.replace("@Claude", "").replace("@claude", "").strip()
-    
-    user_prompt = f"Question: {clean_message}"
-    if context:
-        user_prompt += f"\n\nContext from server files:\n{context}"
+    client = openai_client()
+    user_prompt = _user_prompt(clean_message, context)
 
+    context_chars.observe(used_chars, "server_ai")
+    context_tokens.observe(used_tokens, "server_ai")
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.3,
-            max_tokens=1000,
-        )
+        with stage("server_ai", "llm"):
+            resp = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt},
+                ],
+                temperature=0.3,
+                max_tokens=ANSWER_MAX_TOKENS,
+            )
         answer = resp.choices[0].message.content or ""
     except Exception as e:
+        count_response("openai", getattr(e, "status_code", None) or 0)
         raise HTTPException(status_code=500, detail=f"OpenAI error: {e}")
 
-    return ServerChatResponse(answer=answer.strip(), used_chars=used_chars, included_files=included_files)
+    return ServerChatResponse(answer=answer.strip(), used_chars=used_chars, used_tokens=used_tokens, included_files=included_files)
@@ -0,0 +1,37 @@
+"""Where workers on one host keep the SQLite files they share.
+
+Whoever can write these files can change what every worker reads from them, so
+they are only opened in SHARED_STATE_DIR, and only if that directory belongs to
+this user and is closed to everyone else (mode 0700). Without one, each worker
+keeps the state in memory for itself.
+"""
+from __future__ import annotations
+import functools
+import os
+import stat
+from typing import Optional
+
+IN_MEMORY = ":memory:"
+
+
+@functools.lru_cache(maxsize=None)
+def state_dir() -> Optional[str]:
+    path = os.getenv("SHARED_STATE_DIR")
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        print(f"SHARED_STATE_DIR is unusable ({e}); keeping shared state per process")
+        return None
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        print(f"SHARED_STATE_DIR {path} must be a directory owned by this user with mode 0700; "
+              "keeping shared state per process")
+        return None
+    return path
+
+
+def state_path(filename: str) -> str:
+    """Path of a shared SQLite file, or IN_MEMORY when there is no private directory for it."""
+    directory = state_dir()
+    return os.path.join(directory, filename) if directory else IN_MEMORY
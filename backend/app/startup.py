@@ -0,0 +1,62 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Startup report and readiness. main.py times its router imports with
+# timed_import(); the lifespan runs warm_up() in the background so the process
+# accepts connections at once, and /ready answers 503 until warm-up is done.
+# Warm-up steps are best effort: a failing step is recorded, not retried, and
+# the request that needs it pays the cost as before.
+
+WARMUP_STEP_TIMEOUT = float(os.getenv("WARMUP_STEP_TIMEOUT", "15"))
+
+_started = time.perf_counter()
+import_ms: Dict[str, float] = {}
+warmup_ms: Dict[str, float] = {}
+warmup_errors: Dict[str, str] = {}
+_ready_after_ms: Optional[float] = None
+
+
+@contextlib.contextmanager
+def timed_import(name: str):
+    started = time.perf_counter()
+    yield
+    import_ms[name] = (time.perf_counter() - started) * 1000
+
+
+async def _run_step(name: str, step: Callable[[], Awaitable]) -> None:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(step(), WARMUP_STEP_TIMEOUT)
+    except Exception as e:
+        warmup_errors[name] = str(e) or type(e).__name__
+    warmup_ms[name] = (time.perf_counter() - started) * 1000
+
+
+async def warm_up(steps: List[Tuple[str, Callable[[], Awaitable]]]) -> None:
+    """Run the steps concurrently, then mark the process ready and print the report."""
+    global _ready_after_ms
+    await asyncio.gather(*(_run_step(name, step) for name, step in steps))
+    _ready_after_ms = (time.perf_counter() - _started) * 1000
+    imports = ", ".join(f"{k} {v:.0f}ms" for k, v in import_ms.items())
+    warm = ", ".join(f"{k} {v:.0f}ms" + (" (failed)" if k in warmup_errors else "") for k, v in warmup_ms.items())
+    print(f"Ready after {_ready_after_ms:.0f}ms; imports: {imports}; warm-up: {warm}")
+    for name, error in warmup_errors.items():
+        print(f"Warm-up step {name} failed: {error}")
+
+
+def is_ready() -> bool:
+    return _ready_after_ms is not None
+
+
+def report() -> dict:
+    return {
+        "ready": is_ready(),
+        "ready_after_ms": _ready_after_ms,
+        "import_ms": import_ms,
+        "warmup_ms": warmup_ms,
+        "warmup_errors": warmup_errors,
+    }
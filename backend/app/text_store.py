@@ -0,0 +1,286 @@
+"""Content-addressed store of extracted text, shared by vault and server files.
+
+Text is keyed by the SHA-256 of the object bytes, so a document uploaded to many
+vaults and servers is downloaded, parsed and stored once. files.content_hash and
+server_files.content_hash point at the extracted_texts row (migration 010).
+
+Texts are kept packed (textpack.py: deflate with a preset dictionary trained on
+our documents) in the table, on the wire and in the host-wide Cache. A lookup
+reads the raw bytes of text_z as application/octet-stream and only inflates
+the characters the caller asks for.
+
+Each text is tokenized once, when it is stored: token_chunks holds running token
+totals per tokens.CHUNK_CHARS characters (migration 014). The file listings embed
+them, so the chat routes budget in model tokens without tokenizing on the request
+path. Rows stored before then are counted on first use and backfilled.
+
+The table is read and written with the service role key. Its RLS only shows
+users the texts their own files reference, and only the backend writes it.
+Without SUPABASE_SERVICE_ROLE_KEY the store is the host cache alone, and vault
+files keep their per-row extracted_text as before. With it, a vault row that only
+has that per-row text is moved into the store the first time a chat reads it.
+"""
+from __future__ import annotations
+import asyncio
+import base64
+import hashlib
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from . import textpack, tokens
+from .cache import Cache
+from .extraction import EXTRACTOR_VERSION, extract_text_async
+from .metrics import stage, count_response, extracted_chars, extraction_cpu_seconds, text_store_lookups
+from .tracing import HTTPX_EVENT_HOOKS
+
+# Same bytes, same text: entries only go stale when the extractor changes. Values are base64 packed texts
+_texts = Cache("packed_text", version=EXTRACTOR_VERSION, ttl=24 * 60 * 60, max_entries=512, max_bytes=64 * 1024 * 1024)
+# Running token totals by content hash, for texts counted on this host
+_token_totals = Cache("token_totals", version=EXTRACTOR_VERSION, ttl=24 * 60 * 60, max_entries=4096)
+DICTIONARY_RELOAD_SECONDS = 60.0  # how often an unknown dictionary id may trigger a reload
+
+# text_dictionaries rows by id; new texts are packed with the newest
+_dictionaries: Dict[int, bytes] = {}
+_dictionaries_loaded_at = 0.0
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _config() -> Optional[Tuple[str, str]]:
+    supabase_url = os.getenv("SUPABASE_URL")
+    service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not supabase_url or not service_key:
+        return None
+    return supabase_url.rstrip("/"), service_key
+
+
+def enabled() -> bool:
+    """Whether texts are stored and rows linked (needs the service role key)."""
+    return _config() is not None
+
+
+def _headers(service_key: str) -> dict:
+    return {"Authorization": f"Bearer {service_key}", "apikey": service_key, "Content-Type": "application/json"}
+
+
+async def load_dictionaries() -> int:
+    """Fetch the packing dictionaries; returns how many are loaded. Warm-up step, and on an unknown id."""
+    global _dictionaries_loaded_at
+    config = _config()
+    if config is None:
+        return 0
+    supabase_url, service_key = config
+    _dictionaries_loaded_at = time.monotonic()
+    async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+        r = await client.get(f"{supabase_url}/rest/v1/text_dictionaries", headers=_headers(service_key),
+                             params={"select": "id,dictionary", "order": "id"})
+        count_response("postgrest", r.status_code)
+    if r.status_code != 200:
+        raise RuntimeError(f"Loading text dictionaries failed: HTTP {r.status_code}")
+    for row in r.json():
+        # PostgREST returns bytea in JSON as \x-prefixed hex
+        _dictionaries[row["id"]] = bytes.fromhex(row["dictionary"][2:])
+    return len(_dictionaries)
+
+
+def _newest_dictionary() -> Tuple[int, Optional[bytes]]:
+    if not _dictionaries:
+        return 0, None
+    newest = max(_dictionaries)
+    return newest, _dictionaries[newest]
+
+
+async def _unpack(blob: bytes, module: str, max_chars: Optional[int]) -> Optional[str]:
+    try:
+        dict_id = textpack.dictionary_id(blob)
+        if dict_id and dict_id not in _dictionaries and time.monotonic() - _dictionaries_loaded_at > DICTIONARY_RELOAD_SECONDS:
+            # Packed by a worker that loaded a dictionary published after this one started
+            await load_dictionaries()
+        with stage(module, "text_unpack"):
+            return textpack.unpack(blob, _dictionaries, max_chars)
+    except Exception as e:
+        # Unreadable entry: treat it as missing, the caller extracts and stores it again
+        print(f"Unpacking stored text failed: {e!r}")
+        return None
+
+
+async def get_text(digest: str, module: str, max_chars: Optional[int] = None) -> Optional[str]:
+    """Stored text for the content hash (its first max_chars characters if given), or None if not extracted yet."""
+    cached = await _texts.aget(digest)
+    if cached is not None:
+        text = await _unpack(base64.b64decode(cached), module, max_chars)
+        if text is not None:
+            text_store_lookups.inc(module, "cache")
+            return text
+    config = _config()
+    if config is not None:
+        supabase_url, service_key = config
+        params = {
+            "select": "text_z",
+            "content_hash": f"eq.{digest}",
+            "extractor_version": f"eq.{EXTRACTOR_VERSION}",
+            "text_z": "not.is.null",
+        }
+        # A single bytea column as octet-stream comes back as raw bytes, not JSON hex
+        headers = {**_headers(service_key), "Accept": "application/octet-stream"}
+        try:
+            async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+                with stage(module, "text_store_get"):
+                    r = await client.get(f"{supabase_url}/rest/v1/extracted_texts", headers=headers, params=params)
+                count_response("postgrest", r.status_code)
+            blob = r.content if r.status_code == 200 else b""
+        except httpx.HTTPError as e:
+            # The store only saves work; extracting again is always correct
+            print(f"Reading extracted text failed: {e}")
+            blob = b""
+        if blob:
+            text = await _unpack(blob, module, max_chars)
+            if text is not None:
+                await _texts.aset(digest, base64.b64encode(blob).decode("ascii"))
+                text_store_lookups.inc(module, "store")
+                return text
+    text_store_lookups.inc(module, "miss")
+    return None
+
+
+async def _count(text: str, module: str) -> List[int]:
+    with stage(module, "count_tokens"):
+        return await asyncio.to_thread(tokens.chunk_counts, text)
+
+
+async def token_totals(digest: Optional[str], text: str, module: str, stored: Optional[dict] = None,
+                       complete: bool = True) -> Tuple[List[int], str]:
+    """Running token totals for a text and the tokenizer they are in.
+
+    `stored` is the extracted_texts row embedded in the file listing. Texts without
+    stored counts are counted now; when the text is complete (not a prefix read with
+    max_chars) the counts are cached and written back to the row.
+    """
+    if stored and stored.get("token_chunks"):
+        return stored["token_chunks"], stored.get("tokenizer") or tokens.ESTIMATE
+    cached = await _token_totals.aget(digest) if digest else None
+    if cached is not None:
+        return cached["totals"], cached["tokenizer"]
+    totals, tokenizer = await _count(text, module), tokens.tokenizer()
+    if digest and complete:
+        await _token_totals.aset(digest, {"totals": totals, "tokenizer": tokenizer})
+        if stored is not None:
+            await _store_token_totals(digest, totals, tokenizer, module)
+    return totals, tokenizer
+
+
+async def _store_token_totals(digest: str, totals: List[int], tokenizer: str, module: str) -> None:
+    config = _config()
+    if config is None:
+        return
+    supabase_url, service_key = config
+    payload = {"token_count": tokens.total(totals), "token_chunks": totals, "tokenizer": tokenizer}
+    try:
+        async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+            with stage(module, "text_store_tokens"):
+                r = await client.patch(f"{supabase_url}/rest/v1/extracted_texts", headers=_headers(service_key),
+                                       params={"content_hash": f"eq.{digest}"}, json=payload)
+            count_response("postgrest", r.status_code)
+    except httpx.HTTPError as e:
+        print(f"Storing token counts failed: {e}")
+
+
+async def put(digest: str, text: str, byte_size: int, cpu_seconds: float, module: str,
+              totals: Optional[List[int]] = None) -> bool:
+    """Store freshly extracted text and its running token totals; True once the extracted_texts row exists."""
+    blob = textpack.pack(text, *_newest_dictionary())
+    await _texts.aset(digest, base64.b64encode(blob).decode("ascii"))
+    config = _config()
+    if config is None:
+        return False
+    supabase_url, service_key = config
+    payload = {
+        "content_hash": digest,
+        "text": None,
+        "text_z": "\\x" + blob.hex(),
+        "byte_size": byte_size,
+        "char_count": len(text),
+        "text_bytes": len(text.encode("utf-8")),
+        "extractor_version": EXTRACTOR_VERSION,
+        "extract_cpu_ms": round(cpu_seconds * 1000),
+    }
+    if totals is not None:
+        payload.update(token_count=tokens.total(totals), token_chunks=totals, tokenizer=tokens.tokenizer())
+    headers = {**_headers(service_key), "Prefer": "resolution=merge-duplicates,return=minimal"}
+    try:
+        async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+            with stage(module, "text_store_put"):
+                r = await client.post(f"{supabase_url}/rest/v1/extracted_texts", headers=headers,
+                                      params={"on_conflict": "content_hash"}, json=payload)
+            count_response("postgrest", r.status_code)
+    except httpx.HTTPError as e:
+        print(f"Storing extracted text failed: {e}")
+        return False
+    return r.status_code in (200, 201, 204)
+
+
+async def link(table: str, row_id: str, digest: str, module: str, **fields) -> bool:
+    """Point a files or server_files row at its stored text; extra fields are written with it."""
+    config = _config()
+    if config is None:
+        return False
+    supabase_url, service_key = config
+    try:
+        async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+            with stage(module, "text_store_link"):
+                r = await client.patch(f"{supabase_url}/rest/v1/{table}", headers=_headers(service_key),
+                                       params={"id": f"eq.{row_id}"}, json={"content_hash": digest, **fields})
+            count_response("postgrest", r.status_code)
+    except httpx.HTTPError as e:
+        print(f"Linking {table} row to its text failed: {e}")
+        return False
+    return r.status_code in (200, 204)
+
+
+async def extract_once(data: bytes, content_type: str, filename: str, module: str,
+                       known_text: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """(content hash, text) for downloaded bytes: stored text if any, else extracted now, counted and stored.
+
+    known_text is an earlier extraction of the same bytes (a legacy per-row copy);
+    it is stored instead of parsing the bytes again.
+    """
+    digest = content_hash(data)
+    text = await get_text(digest, module)
+    if text is not None:
+        return digest, text
+    if known_text is not None:
+        text, cpu_seconds = known_text, 0.0
+    else:
+        with stage(module, "extract_text_from_content"):
+            text, cpu_seconds = await extract_text_async(data, content_type, filename)
+        extraction_cpu_seconds.inc(module, amount=cpu_seconds)
+    if text:
+        if known_text is None:
+            extracted_chars.inc(module, amount=len(text))
+        totals = await _count(text, module)
+        await _token_totals.aset(digest, {"totals": totals, "tokenizer": tokens.tokenizer()})
+        await put(digest, text, len(data), cpu_seconds, module, totals)
+    elif text is not None:
+        # Nothing to store, but remember it so scanned PDFs are not parsed on every request
+        await _texts.aset(digest, base64.b64encode(textpack.pack(text)).decode("ascii"))
+    return digest, text
+
+
+async def footprint() -> Optional[dict]:
+    """Store-wide dedup report from the extracted_text_footprint() function; None without a service key."""
+    config = _config()
+    if config is None:
+        return None
+    supabase_url, service_key = config
+    async with httpx.AsyncClient(timeout=30, event_hooks=HTTPX_EVENT_HOOKS) as client:
+        r = await client.post(f"{supabase_url}/rest/v1/rpc/extracted_text_footprint", headers=_headers(service_key), json={})
+        count_response("postgrest", r.status_code)
+    if r.status_code != 200:
+        raise RuntimeError(f"extracted_text_footprint failed: HTTP {r.status_code} {r.text}")
+    rows = r.json()
+    return rows[0] if isinstance(rows, list) and rows else rows
@@ -0,0 +1,126 @@
+"""Compact binary form of extracted text, as stored in extracted_texts.text_z.
+
+A packed text is a 10-byte header (b"ZT", dictionary id, character count)
+followed by a raw deflate stream of the UTF-8 text. Dictionary 0 means none.
+Other ids are preset dictionaries trained on our own documents with
+train_dictionary() and kept in the text_dictionaries table. Extracted
+documents repeat the same boilerplate (headers, legal text, common phrases),
+which a 32 KB preset window lets short files compress as well as long ones.
+
+unpack() can stop after the first max_chars characters, so a context that
+only uses the head of a file inflates only that much. The character count in
+the header gives a text's length without inflating anything. Standard library
+only, so benchmarks can import this without the app's settings.
+"""
+from __future__ import annotations
+import codecs
+import struct
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+MAGIC = b"ZT"
+_HEADER = struct.Struct(">2sHIH")  # magic, dictionary id, character count, reserved
+HEADER_SIZE = _HEADER.size
+LEVEL = 6
+WBITS = -15  # raw deflate: no zlib header or checksum, the content hash already covers integrity
+MAX_DICTIONARY_BYTES = 32 * 1024  # deflate only looks back 32 KB
+INFLATE_CHUNK = 4096  # minimum step when inflating a prefix
+
+
+class UnknownDictionary(KeyError):
+    """The text was packed with a dictionary this process has not loaded."""
+
+
+def pack(text: str, dictionary_id: int = 0, dictionary: Optional[bytes] = None) -> bytes:
+    if dictionary_id and not dictionary:
+        raise ValueError("dictionary_id needs its dictionary")
+    if dictionary:
+        compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, WBITS)
+    body = compressor.compress(text.encode("utf-8")) + compressor.flush()
+    return _HEADER.pack(MAGIC, dictionary_id, len(text), 0) + body
+
+
+def char_count(blob: bytes) -> int:
+    magic, _, chars, _ = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("not a packed text")
+    return chars
+
+
+def dictionary_id(blob: bytes) -> int:
+    return _HEADER.unpack_from(blob)[1]
+
+
+def unpack(blob: bytes, dictionaries: Dict[int, bytes], max_chars: Optional[int] = None) -> str:
+    """The text, or only its first max_chars characters (inflating no more than needed)."""
+    magic, dict_id, chars, _ = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("not a packed text")
+    if dict_id and dict_id not in dictionaries:
+        raise UnknownDictionary(dict_id)
+    if dict_id:
+        inflater = zlib.decompressobj(WBITS, zdict=dictionaries[dict_id])
+    else:
+        inflater = zlib.decompressobj(WBITS)
+    body = memoryview(blob)[HEADER_SIZE:]
+    if max_chars is None or max_chars >= chars:
+        return inflater.decompress(body).decode("utf-8")
+
+    # Each character is 1-4 bytes: inflate in chunks until enough have decoded
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pieces = []
+    have = 0
+    pending = body
+    while have < max_chars:
+        out = inflater.decompress(pending, max(INFLATE_CHUNK, max_chars - have))
+        pending = inflater.unconsumed_tail
+        piece = decoder.decode(out, final=inflater.eof)
+        pieces.append(piece)
+        have += len(piece)
+        if inflater.eof or not out:
+            break
+    return "".join(pieces)[:max_chars]
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICTIONARY_BYTES, min_documents: int = 2,
+                     sample_chars: int = 64 * 1024) -> bytes:
+    """A preset dictionary of the phrases most worth having in the deflate window.
+
+    Counts runs of 1-6 words in the first sample_chars of each document by
+    the number of documents they appear in, keeps those found in at least
+    min_documents, and fills `size` bytes with the highest-scoring
+    (documents x length) ones that are not already part of a chosen phrase.
+    The best go last, where deflate reaches them with the shortest distances.
+    """
+    documents = 0
+    seen: Counter = Counter()
+    for text in samples:
+        documents += 1
+        words = text[:sample_chars].split()
+        grams = set()
+        for n in range(1, 7):
+            for i in range(len(words) - n + 1):
+                gram = " ".join(words[i:i + n])
+                if 4 <= len(gram) <= 96:
+                    grams.add(gram)
+        seen.update(grams)
+    scored = sorted(
+        ((count * len(gram), gram) for gram, count in seen.items() if count >= min(min_documents, documents)),
+        reverse=True,
+    )
+    chosen = []
+    joined = ""
+    used = 0
+    for _, gram in scored:
+        encoded = (gram + " ").encode("utf-8")
+        if used + len(encoded) > size or gram in joined:
+            continue
+        chosen.append(gram)
+        joined += gram + "\n"
+        used += len(encoded)
+        if used >= size - 4:
+            break
+    return "".join(gram + " " for gram in reversed(chosen)).encode("utf-8")
@@ -0,0 +1,175 @@
+"""Token counts for budgeting the chat context by model tokens instead of characters.
+
+Counts come from tiktoken when it is installed and from a conservative estimate
+otherwise (TOKENIZER says which). Extracted texts are counted once, when they are
+stored: chunk_counts() keeps the running token total after every CHUNK_CHARS
+characters, so a chat route can tell how many tokens a file costs, or how much of
+it fits in what is left, without tokenizing it on the request path. A file is cut
+at a chunk boundary, so the count of what was sent is exact for that tokenizer.
+"""
+from __future__ import annotations
+import bisect
+import math
+from typing import Dict, List, Optional, Tuple
+
+CHUNK_CHARS = 4096
+DEFAULT_ENCODING = "o200k_base"  # gpt-4o family, the default chat model
+ESTIMATE = "estimate"
+# Stored counts from another encoding are scaled up by this much before budgeting
+MISMATCH_MARGIN = 1.1
+# Per-message framing the API adds around each chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Context window by model name prefix; the longest matching prefix wins
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16_385,
+    "gpt-4": 8_192,
+    "gpt-4-turbo": 128_000,
+    "gpt-4o": 128_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-5": 400_000,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4-mini": 200_000,
+}
+DEFAULT_CONTEXT_WINDOW = 128_000
+
+_encodings: Dict[str, object] = {}
+
+
+def _encoding(name: str):
+    """The tiktoken encoding, or None if tiktoken (or its data files) is unavailable."""
+    if name not in _encodings:
+        try:
+            import tiktoken
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception:
+            _encodings[name] = None
+    return _encodings[name]
+
+
+def tokenizer() -> str:
+    """What stored counts are measured in: the default encoding, or ESTIMATE without tiktoken."""
+    return DEFAULT_ENCODING if _encoding(DEFAULT_ENCODING) is not None else ESTIMATE
+
+
+def encoding_name(model: Optional[str]) -> str:
+    if model:
+        try:
+            import tiktoken
+            return tiktoken.encoding_for_model(model).name
+        except Exception:
+            pass
+    return DEFAULT_ENCODING
+
+
+def context_window(model: Optional[str]) -> int:
+    matches = [prefix for prefix in CONTEXT_WINDOWS if (model or "").startswith(prefix)]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+def estimate(text: str) -> int:
+    """Tokens without a tokenizer: 4 ASCII characters per token, one per other character.
+
+    High for most non-English text, which is the safe side for a budget.
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def count(text: str, model: Optional[str] = None) -> int:
+    """Tokens in a short string (prompt, header, summary) for the model's encoding."""
+    encoding = _encoding(encoding_name(model))
+    if encoding is None:
+        return estimate(text)
+    return len(encoding.encode_ordinary(text))
+
+
+def chunk_counts(text: str) -> List[int]:
+    """Running token totals after each CHUNK_CHARS characters of text; the last one is the whole text's.
+
+    CPU bound on long texts: run it off the event loop.
+    """
+    chunks = [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+    encoding = _encoding(DEFAULT_ENCODING)
+    if encoding is None:
+        sizes = [estimate(chunk) for chunk in chunks]
+    else:
+        sizes = [len(tokens) for tokens in encoding.encode_ordinary_batch(chunks)]
+    totals, running = [], 0
+    for size in sizes:
+        running += size
+        totals.append(running)
+    return totals
+
+
+def for_model(totals: List[int], measured_in: Optional[str], model: Optional[str]) -> List[int]:
+    """Stored running totals as a budget for the model, with a margin if they were measured in another encoding."""
+    if measured_in == encoding_name(model):
+        return totals
+    return [math.ceil(total * MISMATCH_MARGIN) for total in totals]
+
+
+def total(totals: List[int]) -> int:
+    return totals[-1] if totals else 0
+
+
+def prefix_chars(totals: List[int], budget: int) -> int:
+    """Characters in the longest run of whole chunks costing at most budget tokens."""
+    return bisect.bisect_right(totals, budget) * CHUNK_CHARS
+
+
+def prefix_tokens(totals: List[int], chars: int) -> int:
+    """Tokens in the first chars characters, counted up to the end of the chunk they stop in."""
+    if not totals or chars <= 0:
+        return 0
+    return totals[min(len(totals), math.ceil(chars / CHUNK_CHARS)) - 1]
+
+
+def context_budget(model: Optional[str], prompt_tokens: int, output_tokens: int, cap: Optional[int] = None) -> int:
+    """Tokens left for context in the model's window after the prompt, framing and the reply."""
+    budget = context_window(model) - prompt_tokens - output_tokens - 3 * MESSAGE_OVERHEAD_TOKENS
+    if cap:
+        budget = min(budget, cap)
+    return max(0, budget)
+
+
+def build_context(big_chunks: List[Tuple[str, str, List[int]]], max_chars: int, max_tokens: int,
+                  include_filenames: bool, model: Optional[str]) -> Tuple[str, List[str], int, int]:
+    """Concatenate whole files while both budgets last; the file that does not fit is cut.
+
+    big_chunks are (name, text, running totals for the model). Token costs come from
+    the running totals, so only the headers are tokenized here. Returns the context,
+    the included names and the characters and tokens used.
+    """
+    included: List[str] = []
+    pieces: List[str] = []
+    remaining = max_chars
+    remaining_tokens = max_tokens
+    for fname, text, totals in big_chunks:
+        if not text:
+            continue
+        header = f"\n\n===== FILE: {fname} =====\n" if include_filenames else "\n\n"
+        header_tokens = count(header, model)
+        need = len(header) + len(text)
+        need_tokens = header_tokens + total(totals)
+        if need > remaining or need_tokens > remaining_tokens:
+            # Truncate text to fit; at a chunk boundary when tokens run out first
+            take = min(remaining - len(header), prefix_chars(totals, remaining_tokens - header_tokens))
+            if take <= 0:
+                break
+            pieces.append(header)
+            pieces.append(text[:take])
+            included.append(fname + " (truncated)")
+            remaining -= len(header) + len(text[:take])
+            remaining_tokens -= header_tokens + prefix_tokens(totals, take)
+            break
+        pieces.append(header)
+        pieces.append(text)
+        included.append(fname)
+        remaining -= need
+        remaining_tokens -= need_tokens
+        if remaining <= 0 or remaining_tokens <= 0:
+            break
+    combined = "".join(pieces).strip()
+    return combined, included, max_chars - remaining, max_tokens - remaining_tokens
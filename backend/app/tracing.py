@@ -0,0 +1,169 @@
+"""Opt-in per-request traces of where time goes inside a request.
+
+A request is traced when an ADMIN_USER_IDS caller sends `X-Trace: 1` or it is
+picked by TRACE_SAMPLE_RATE. While it runs, every metrics.stage()/@timed block,
+every httpx call made with HTTPX_EVENT_HOOKS and anything wrapped in span() is
+recorded against it through a context variable. The whole trace is kept in a
+per-worker ring buffer for /debug/traces; admin-requested traces also come back
+in a Server-Timing header (visible in browser devtools), with upstream URLs
+left out. Untraced requests pay one context-variable lookup per stage.
+"""
+from __future__ import annotations
+import contextvars
+import os
+import random
+import time
+import uuid
+from collections import deque
+from typing import Deque, List, Optional
+
+TRACE_HEADER = b"x-trace"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+SERVER_TIMING_MAX_SPANS = 40  # keep the header well under proxy limits on requests that touch many files
+
+
+class Trace:
+    __slots__ = ("id", "method", "path", "status", "started", "started_at", "duration_ms", "spans")
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.status: Optional[int] = None
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[tuple] = []
+
+    def add(self, name: str, started: float, ended: float, error: bool = False, public: Optional[str] = None) -> None:
+        """Record a span; `public` replaces `name` in the Server-Timing header when name holds a URL."""
+        self.spans.append((name, (started - self.started) * 1000, (ended - started) * 1000, error, public))
+
+    def finish(self) -> None:
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "spans": [
+                {"name": name, "start_ms": round(start, 3), "duration_ms": round(duration, 3), "error": error}
+                for name, start, duration, error, _ in self.spans
+            ],
+        }
+
+    def server_timing(self) -> str:
+        parts = []
+        for i, (name, _, duration, _, public) in enumerate(self.spans[:SERVER_TIMING_MAX_SPANS]):
+            desc = (public or name).replace("\\", "\\\\").replace('"', '\\"')
+            parts.append(f's{i};desc="{desc}";dur={duration:.1f}')
+        if len(self.spans) > SERVER_TIMING_MAX_SPANS:
+            parts.append(f'truncated;desc="{len(self.spans) - SERVER_TIMING_MAX_SPANS} more spans"')
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+recent: Deque[Trace] = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+class span:
+    """Record a block on the current trace, if any: `with span("render"): ...`."""
+
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "span":
+        self.trace = _current.get()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.trace is not None:
+            self.trace.add(self.name, self.started, time.perf_counter(), exc_type is not None)
+
+
+async def _on_request(request) -> None:
+    if _current.get() is not None:
+        request.extensions["trace_started"] = time.perf_counter()
+
+
+async def _on_response(response) -> None:
+    trace = _current.get()
+    started = response.request.extensions.get("trace_started")
+    if trace is not None and started is not None:
+        # Time to response headers; the enclosing stage covers reading the body
+        method, url, status = response.request.method, response.request.url, response.status_code
+        trace.add(f"{method} {url.host}{url.path} {status}", started, time.perf_counter(), status >= 500,
+                  public=f"upstream {method} {status}")
+
+
+HTTPX_EVENT_HOOKS = {"request": [_on_request], "response": [_on_response]}
+
+
+def _requested_by_admin(headers) -> bool:
+    """True for `X-Trace: 1` sent with the bearer token of an ADMIN_USER_IDS user."""
+    if not any(k == TRACE_HEADER and v not in (b"", b"0") for k, v in headers):
+        return False
+    authorization = next((v.decode("latin-1") for k, v in headers if k == b"authorization"), "")
+    if not authorization.lower().startswith("bearer "):
+        return False
+    # Imported here: auth_jwt -> metrics -> tracing
+    from .auth_jwt import admin_user_ids, verify_supabase_jwt
+    admins = admin_user_ids()
+    if not admins:
+        return False
+    try:
+        claims = verify_supabase_jwt(authorization.split(" ", 1)[1])
+    except Exception:
+        return False
+    return claims.get("sub") in admins
+
+
+class TraceMiddleware:
+    """ASGI middleware that starts a trace for admin-requested or sampled requests.
+
+    Only admin-requested traces are echoed back in response headers; sampled
+    ones go to the ring buffer alone.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        requested = _requested_by_admin(scope["headers"])
+        if not requested and not (TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE):
+            return await self.app(scope, receive, send)
+
+        trace = Trace(scope["method"], scope["path"])
+        token = _current.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+            if message["type"] == "http.response.start" and requested:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1", "replace")))
+                headers.append((b"x-trace-id", trace.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            trace.finish()
+            recent.append(trace)
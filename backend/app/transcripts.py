@@ -0,0 +1,168 @@
+from __future__ import annotations
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import httpx
+
+TRANSCRIPT_BATCH_SIZE = 50
+TRANSCRIPT_FLUSH_SECONDS = 5.0
+TRANSCRIPT_MAX_PENDING = 1_000
+TRANSCRIPT_MESSAGE_TYPE = "voice_transcript"
+# Speech heard in a voice room. The room is one mixed stream with no speaker, so
+# these rows are stored under the agent's user, never under a member's
+ROOM_TRANSCRIPT_MESSAGE_TYPE = "voice_room_transcript"
+# Client errors that are worth retrying; any other 4xx means the rows themselves are bad
+RETRYABLE_STATUSES = (408, 429)
+
+
+class TranscriptSink:
+    """Buffered, bulk writes of voice transcripts to the messages table.
+
+    Utterances are buffered in memory and written as one multi-row insert
+    when a batch fills, on an interval, or when a session ends. Rows carry a
+    client-generated id so retrying a batch whose response was lost cannot
+    duplicate messages. Server and network errors keep the batch for the next
+    flush. A batch the database rejects (4xx) is retried row by row, so only the
+    bad rows are dropped. At most max_pending rows are held; past that, add()
+    drops the utterance instead of holding up the caller.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = TRANSCRIPT_BATCH_SIZE,
+        interval: float = TRANSCRIPT_FLUSH_SECONDS,
+        max_pending: int = TRANSCRIPT_MAX_PENDING,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._client: Optional[httpx.AsyncClient] = None
+        self.utterances = 0
+        self.requests = 0
+        self.rows_written = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def _config(self) -> Optional[Tuple[str, str]]:
+        supabase_url = os.getenv("SUPABASE_URL")
+        service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not supabase_url or not service_key:
+            return None
+        return supabase_url.rstrip("/"), service_key
+
+    def add(self, channel_id: str, user_id: str, content: str, message_type: str = TRANSCRIPT_MESSAGE_TYPE) -> bool:
+        """Buffer one utterance. Never waits; False if the buffer is full and it was dropped."""
+        content = content.strip()
+        if not content:
+            return True
+        self.start()
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            self._wakeup.set()
+            return False
+        self.utterances += 1
+        self._pending.append({
+            "id": str(uuid.uuid4()),
+            "channel_id": channel_id,
+            "user_id": user_id,
+            "content": content,
+            "message_type": message_type,
+            # Set here, not by the insert, so rows in one batch keep utterance order
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        if not self._closing and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        # Stop the loop between flushes rather than cancelling it mid-write
+        self._closing = True
+        self._wakeup.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Transcript flush failed on shutdown, {len(self._pending)} rows lost: {e}")
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "utterances": self.utterances,
+            "requests": self.requests,
+            "rows_written": self.rows_written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+        }
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                return
+            try:
+                await self.flush()
+            except Exception as e:
+                # Rows stay buffered and are retried on the next tick
+                print(f"Transcript flush failed: {e}")
+
+    async def flush(self) -> None:
+        """Write everything buffered, one batch_size insert at a time."""
+        async with self._lock:
+            config = self._config()
+            if config is None:
+                self._pending.clear()
+                return
+            supabase_url, service_key = config
+            if self._client is None:
+                self._client = httpx.AsyncClient(timeout=10)
+            headers = {
+                "Authorization": f"Bearer {service_key}",
+                "apikey": service_key,
+                "Content-Type": "application/json",
+                "Prefer": "resolution=ignore-duplicates,return=minimal",
+            }
+            url = f"{supabase_url}/rest/v1/messages"
+            while self._pending:
+                batch = self._pending[: self.batch_size]
+                if not await self._insert(url, headers, batch) and len(batch) > 1:
+                    # One bad row fails the whole insert; write the rest without it
+                    for row in batch:
+                        await self._insert(url, headers, [row])
+                del self._pending[: len(batch)]
+
+    async def _insert(self, url: str, headers: dict, rows: List[dict]) -> bool:
+        """Insert rows. False if the database rejected them; raises on errors worth retrying."""
+        r = await self._client.post(url, headers=headers, params={"on_conflict": "id"}, json=rows)
+        self.requests += 1
+        if r.is_client_error and r.status_code not in RETRYABLE_STATUSES:
+            if len(rows) == 1:
+                self.rejected += 1
+                print(f"Transcript row rejected for user {rows[0]['user_id']}: HTTP {r.status_code} {r.text[:200]}")
+            return False
+        r.raise_for_status()
+        self.rows_written += len(rows)
+        return True
+
+
+transcripts = TranscriptSink()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+from collections import deque
+
+import numpy as np
+
+VAD_FRAME_MS = 10
+VAD_OPEN_DB = -45.0    # gate opens when a frame is louder than this (dBFS)...
+VAD_CLOSE_DB = -50.0   # ...and only starts closing once frames drop below this
+VAD_HANGOVER_MS = 500  # quiet time kept open after speech so upstream VAD sees the pause
+VAD_PREROLL_MS = 300
+
+
+class EnergyGate:
+    """Energy-based voice-activity gate for mono PCM16 audio.
+
+    Frame energies for a whole batch are computed in one vectorized pass; the
+    open/close decision uses hysteresis (separate open and close thresholds) plus
+    a hangover, so brief dips inside speech are not cut. While closed, the last
+    preroll_ms of audio is held back and sent ahead of the first voiced frame,
+    like the realtime API's prefix_padding_ms.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        open_db: float = VAD_OPEN_DB,
+        close_db: float = VAD_CLOSE_DB,
+        hangover_ms: int = VAD_HANGOVER_MS,
+        preroll_ms: int = VAD_PREROLL_MS,
+        frame_ms: int = VAD_FRAME_MS,
+    ):
+        if close_db > open_db:
+            raise ValueError("close_db must not be above open_db")
+        self.frame = sample_rate * frame_ms // 1000
+        self.open_db = open_db
+        self.close_db = close_db
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self._preroll: deque = deque(maxlen=max(0, preroll_ms // frame_ms))
+        self._remainder = np.zeros(0, dtype=np.int16)
+        self._open = False
+        self._quiet_frames = 0
+        self.samples_in = 0
+        self.samples_out = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    @property
+    def suppressed_fraction(self) -> float:
+        if not self.samples_in:
+            return 0.0
+        return max(0.0, 1.0 - self.samples_out / self.samples_in)
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        """Return the audio to forward upstream for this batch (possibly empty)."""
+        self.samples_in += len(pcm)
+        samples = np.concatenate((self._remainder, pcm)) if len(self._remainder) else pcm
+        n_frames = len(samples) // self.frame
+        self._remainder = samples[n_frames * self.frame:].copy()
+        if not n_frames:
+            return samples[:0]
+
+        frames = samples[:n_frames * self.frame].reshape(n_frames, self.frame)
+        x = frames.astype(np.float32) * (1.0 / 32768.0)
+        rms = np.sqrt(np.mean(x * x, axis=1) + 1e-12)
+        levels = 20.0 * np.log10(rms)
+
+        out = []
+        for frame, level in zip(frames, levels):
+            if self._open:
+                if level < self.close_db:
+                    self._quiet_frames += 1
+                    if self._quiet_frames > self.hangover_frames:
+                        self._open = False
+                else:
+                    self._quiet_frames = 0
+            elif level >= self.open_db:
+                self._open = True
+                self._quiet_frames = 0
+                out.extend(self._preroll)
+                self._preroll.clear()
+
+            if self._open:
+                out.append(frame)
+            else:
+                # copy: frame may be a view of the caller's reusable buffer
+                self._preroll.append(frame.copy())
+
+        if not out:
+            return samples[:0]
+        forwarded = np.concatenate(out)
+        self.samples_out += len(forwarded)
+        return forwarded
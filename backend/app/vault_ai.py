@@ -1,40 +1,46 @@
 from __future__ import annotations
 import os
-import io
-from typing import List, Optional
+import asyncio
+import hashlib
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional
 
 import httpx
 from fastapi import APIRouter, HTTPException, Header
 from pydantic import BaseModel
 
 from .auth_jwt import verify_supabase_jwt
+from .openai_client import openai_client
+from .postgrest import iter_keyset
+from . import text_store, tokens
+from .tracing import HTTPX_EVENT_HOOKS
+from .metrics import stage, timed, count_response, context_chars, context_tokens, downloaded_bytes
 
-try:
-    from openai import OpenAI  # type: ignore
-except Exception:  # pragma: no cover
-    OpenAI = None  # type: ignore
 
-try:
-    import PyPDF2
-    from docx import Document
-except Exception:
-    PyPDF2 = None
-    Document = None
+router = APIRouter(prefix="/vaults", tags=["vault-ai"])
 
 
-router = APIRouter(prefix="/vaults", tags=["vault-ai"])
+DEFAULT_MAX_CHARS = 200_000
+OUTPUT_RESERVE_TOKENS = 4_096  # room left in the model window for the answer
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. You are given a knowledge context composed of the user's vault files. "
+    "Use only this context when relevant. If the context lacks information, say so clearly."
+)
 
 
 class ChatRequest(BaseModel):
     message: str
     model: Optional[str] = None  # override default if provided
-    max_chars: Optional[int] = 200_000
+    max_chars: Optional[int] = DEFAULT_MAX_CHARS
+    max_tokens: Optional[int] = None  # context token cap; default: what the model's window leaves
     include_filenames: Optional[bool] = True
 
 
 class ChatResponse(BaseModel):
     answer: str
     used_chars: int
+    used_tokens: int  # context tokens, in the model's encoding
     included_files: List[str]
 
 
@@ -45,102 +51,77 @@ def _require_env(var: str) -> str:
     return val
 
 
-async def _fetch_vault_files(supabase_url: str, user_token: str, vault_id: str) -> List[dict]:
+def _backend_write_headers(user_token: str) -> dict:
+    """Headers for caches the backend stores on the caller's behalf (summaries).
+
+    With the service role key they are stored for read-only members too, so their
+    chats don't regenerate them every time; without it they go through RLS as the caller.
+    """
+    service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if service_key:
+        return {"Authorization": f"Bearer {service_key}", "apikey": service_key}
+    return {"Authorization": f"Bearer {user_token}", "apikey": _require_env("SUPABASE_ANON_KEY")}
+
+
+async def _iter_vault_files(supabase_url: str, user_token: str, vault_id: str) -> AsyncIterator[dict]:
+    """Every file in the vault, newest first, fetched a page at a time."""
     headers = {
         "Authorization": f"Bearer {user_token}",
         "apikey": _require_env("SUPABASE_ANON_KEY"),
     }
-    # Include extracted_text and text_extracted_at for caching
+    # content_hash points at deduplicated text. The older per-row extracted_text is
+    # left out of the listing and read per file (text_extracted_at set) when a row has no hash yet
     url = f"{supabase_url.rstrip('/')}/rest/v1/files"
     params = {
-        "select": "id,name,file_path,file_type,file_size,uploaded_at,extracted_text,text_extracted_at",
+        "select": "id,name,file_path,file_type,file_size,uploaded_at,content_hash,text_extracted_at,summary,summary_source_hash,"
+                  "extracted_texts(token_chunks,tokenizer)",
         "vault_id": f"eq.{vault_id}",
-        "order": "uploaded_at.desc",
-        "limit": "50",
     }
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(url, headers=headers, params=params)
-        if r.status_code != 200:
-            raise HTTPException(status_code=r.status_code, detail=f"Failed to list files: {r.text}")
-        return r.json() or []
-
+    async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+        async for row in iter_keyset(client, url, headers, params, "uploaded_at", module="vault_ai", what="files"):
+            yield row
 
-TEXT_MIME_PREFIXES = (
-    "text/",
-)
-TEXT_MIME_ALLOWLIST = {
-    "application/json",
-    "application/xml", 
-    "application/yaml",
-    "application/pdf",
-    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    "application/msword",
-}
-
-
-def _extract_text_from_content(data: bytes, content_type: str, filename: str) -> Optional[str]:
-    """Extract text from file content based on MIME type and filename"""
-    try:
-        # PDF files
-        if content_type == "application/pdf" or filename.lower().endswith('.pdf'):
-            if PyPDF2 is None:
-                return None
-            try:
-                reader = PyPDF2.PdfReader(io.BytesIO(data))
-                text_parts = []
-                for page in reader.pages:
-                    text_parts.append(page.extract_text())
-                return "\n".join(text_parts)
-            except Exception:
-                return None
-        
-        # Word documents (.docx)
-        elif (content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" 
-              or filename.lower().endswith('.docx')):
-            if Document is None:
-                return None
-            try:
-                doc = Document(io.BytesIO(data))
-                text_parts = []
-                for paragraph in doc.paragraphs:
-                    text_parts.append(paragraph.text)
-                return "\n".join(text_parts)
-            except Exception:
-                return None
-        
-        # Plain text and other text formats
-        elif (any(content_type.startswith(p) for p in TEXT_MIME_PREFIXES)
-              or content_type.split(";")[0] in TEXT_MIME_ALLOWLIST):
-            return data.decode("utf-8", errors="ignore")
-        
-        # Try UTF-8 decode as fallback
-        else:
-            try:
-                return data.decode("utf-8", errors="ignore")
-            except Exception:
-                return None
-                
-    except Exception:
-        return None
 
+@timed("vault_ai")
+async def _fetch_file_text(supabase_url: str, user_token: str, bucket: str, path: str, expected_mime: Optional[str], filename: str, known_text: Optional[str] = None) -> tuple[Optional[str], Optional[str]]:
+    """Download a file and get its text, extracting it only if no copy of the content has been seen; (content_hash, text).
 
-async def _fetch_file_text(supabase_url: str, user_token: str, bucket: str, path: str, expected_mime: Optional[str], filename: str) -> Optional[str]:
+    known_text (the row's legacy extracted_text) is stored for the content instead of extracting it again.
+    """
     headers = {
         "Authorization": f"Bearer {user_token}",
         "apikey": _require_env("SUPABASE_ANON_KEY"),
     }
     # Direct object download endpoint
     url = f"{supabase_url.rstrip('/')}/storage/v1/object/{bucket}/{path}"
-    async with httpx.AsyncClient(timeout=30) as client:
+    async with httpx.AsyncClient(timeout=30, event_hooks=HTTPX_EVENT_HOOKS) as client:
         r = await client.get(url, headers=headers)
+        count_response("storage", r.status_code)
         if r.status_code != 200:
             # Skip unreadable files silently
-            return None
+            return None, None
         
+        downloaded_bytes.inc("vault_ai", amount=len(r.content))
         content_type = expected_mime or r.headers.get("content-type", "")
-        return _extract_text_from_content(r.content, content_type, filename)
+        return await text_store.extract_once(r.content, content_type, filename, "vault_ai", known_text)
 
 
+@timed("vault_ai")
+async def _fetch_extracted_text(supabase_url: str, user_token: str, file_id: str) -> Optional[str]:
+    """The per-row extracted_text of a file from before the text store, or None"""
+    headers = {
+        "Authorization": f"Bearer {user_token}",
+        "apikey": _require_env("SUPABASE_ANON_KEY"),
+    }
+    url = f"{supabase_url.rstrip('/')}/rest/v1/files"
+    async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+        r = await client.get(url, headers=headers, params={"select": "extracted_text", "id": f"eq.{file_id}"})
+        count_response("postgrest", r.status_code)
+    rows = r.json() if r.status_code == 200 else []
+    return rows[0].get("extracted_text") if rows else None
+
+
+@timed("vault_ai")
 async def _update_extracted_text(supabase_url: str, user_token: str, file_id: str, extracted_text: str) -> None:
     """Update the extracted text in the database for caching"""
     headers = {
@@ -153,121 +134,408 @@ async def _update_extracted_text(supabase_url: str, user_token: str, file_id: st
         "extracted_text": extracted_text,
         "text_extracted_at": "now()"
     }
-    async with httpx.AsyncClient(timeout=20) as client:
+    async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
         # Update the specific file record
-        await client.patch(
+        r = await client.patch(
             url,
             headers=headers,
             params={"id": f"eq.{file_id}"},
             json=payload
         )
+        count_response("postgrest", r.status_code)
 
 
-def _build_context(big_chunks: List[tuple[str, str]], max_chars: int, include_filenames: bool) -> tuple[str, List[str], int]:
-    included: List[str] = []
+def _user_prompt(message: str, context: str) -> str:
+    return (
+        f"User question:\n{message}\n\n"
+        f"Context from vault files (may be truncated):\n{context}\n"
+    )
+
+
+def _chat_model(model: Optional[str]) -> str:
+    return model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+
+def _context_tokens(model: str, message: str, cap: Optional[int]) -> int:
+    """Tokens the context may use: the model's window less the prompts and the answer."""
+    prompt_tokens = tokens.count(SYSTEM_PROMPT, model) + tokens.count(_user_prompt(message, ""), model)
+    return tokens.context_budget(model, prompt_tokens, OUTPUT_RESERVE_TOKENS, cap)
+
+
+_build_context = timed("vault_ai", "build_context")(tokens.build_context)
+
+
+# Summary tier: used when a vault's text does not fit in max_chars
+SUMMARY_INPUT_CHARS = 24_000
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_ESTIMATE_CHARS = SUMMARY_MAX_TOKENS * 4  # budget held for a file whose summary is not written yet
+ROLLUP_MAX_TOKENS = 600
+SUMMARY_CONCURRENCY = 4
+
+FILE_SUMMARY_PROMPT = (
+    "Summarize the following document for a knowledge index. Capture its purpose, key topics, "
+    "named entities, figures and conclusions in at most 150 words. Plain prose, no preamble."
+)
+VAULT_ROLLUP_PROMPT = (
+    "You are given summaries of every file in a knowledge vault. Write an overview of the vault "
+    "in at most 300 words: main themes, how the files relate, and which file covers what."
+)
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+@timed("vault_ai")
+async def _summarize(client, model: str, instructions: str, content: str, max_tokens: int) -> Optional[str]:
+    """Run a summary completion off the event loop. Returns None on failure."""
+    try:
+        resp = await asyncio.to_thread(
+            client.chat.completions.create,
+            model=model,
+            messages=[
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": content},
+            ],
+            temperature=0.2,
+            max_tokens=max_tokens,
+        )
+        return (resp.choices[0].message.content or "").strip() or None
+    except Exception as e:
+        count_response("openai", getattr(e, "status_code", None) or 0)
+        return None
+
+
+@timed("vault_ai")
+async def _update_file_summary(supabase_url: str, user_token: str, file_id: str, summary: str, source_hash: str) -> None:
+    """Store a file summary beside its extracted text"""
+    headers = {**_backend_write_headers(user_token), "Content-Type": "application/json"}
+    url = f"{supabase_url.rstrip('/')}/rest/v1/files"
+    payload = {
+        "summary": summary,
+        "summary_source_hash": source_hash,
+        "summarized_at": "now()",
+    }
+    async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as client:
+        r = await client.patch(url, headers=headers, params={"id": f"eq.{file_id}"}, json=payload)
+        count_response("postgrest", r.status_code)
+
+
+@timed("vault_ai")
+async def _ensure_file_summaries(supabase_url: str, user_token: str, client, model: str, entries: List[dict]) -> None:
+    """Fill entry["summary"] for every entry, regenerating only those whose text changed.
+
+    Each entry carries id, name, text, summary, summary_source_hash, source_hash and
+    text_hash. Fresh summaries are written back to the files table so they are
+    generated once per file version. Summaries stored under the hash of the full
+    text (before source_hash) still count while the whole text was read.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+    async def refresh(entry: dict) -> None:
+        source_hash = entry["source_hash"]
+        if entry.get("summary") and entry.get("summary_source_hash") in (source_hash, entry.get("text_hash")):
+            return
+        async with semaphore:
+            summary = await _summarize(
+                client, model, FILE_SUMMARY_PROMPT,
+                f"File: {entry['name']}\n\n{entry['text'][:SUMMARY_INPUT_CHARS]}",
+                SUMMARY_MAX_TOKENS,
+            )
+        if not summary:
+            # Fall back to the head of the document so the file still gets coverage
+            entry["summary"] = entry["text"][:800]
+            return
+        entry["summary"] = summary
+        entry["summary_source_hash"] = source_hash
+        try:
+            await _update_file_summary(supabase_url, user_token, entry["id"], summary, source_hash)
+        except Exception:
+            # Don't fail if caching fails
+            pass
+
+    await asyncio.gather(*(refresh(e) for e in entries))
+
+
+def _rollup_source_hash(entries: List[dict]) -> str:
+    digest = hashlib.sha256()
+    for entry in sorted(entries, key=lambda e: e["id"]):
+        digest.update(f"{entry['id']}:{_text_hash(entry.get('summary') or '')}\n".encode())
+    return digest.hexdigest()
+
+
+@timed("vault_ai")
+async def _ensure_vault_summary(supabase_url: str, user_token: str, vault_id: str, client, model: str, entries: List[dict]) -> Optional[str]:
+    """Return the vault rollup, rebuilding it only when a file summary changed."""
+    headers = {
+        "Authorization": f"Bearer {user_token}",
+        "apikey": _require_env("SUPABASE_ANON_KEY"),
+    }
+    url = f"{supabase_url.rstrip('/')}/rest/v1/vault_summaries"
+    source_hash = _rollup_source_hash(entries)
+    async with httpx.AsyncClient(timeout=20, event_hooks=HTTPX_EVENT_HOOKS) as http:
+        r = await http.get(url, headers=headers, params={
+            "select": "summary,source_hash",
+            "vault_id": f"eq.{vault_id}",
+        })
+        count_response("postgrest", r.status_code)
+        rows = r.json() if r.status_code == 200 else []
+        if rows and rows[0].get("source_hash") == source_hash:
+            return rows[0].get("summary")
+
+        listing = "\n\n".join(f"- {e['name']}: {e.get('summary') or ''}" for e in entries)
+        summary = await _summarize(client, model, VAULT_ROLLUP_PROMPT, listing, ROLLUP_MAX_TOKENS)
+        if not summary:
+            return rows[0].get("summary") if rows else None
+        # Only vault writers may store a rollup through RLS
+        headers = _backend_write_headers(user_token)
+        try:
+            r = await http.post(
+                url,
+                headers={**headers, "Content-Type": "application/json", "Prefer": "resolution=merge-duplicates"},
+                json={
+                    "vault_id": vault_id,
+                    "summary": summary,
+                    "source_hash": source_hash,
+                    "file_count": len(entries),
+                },
+            )
+            count_response("postgrest", r.status_code)
+        except Exception:
+            pass
+        return summary
+
+
+@timed("vault_ai")
+def _build_tiered_context(overview: Optional[str], entries: List[dict], max_chars: int, max_tokens: int, include_filenames: bool, model: str) -> tuple[str, List[str], int, int]:
+    """Build a context that covers every file when the full texts do not fit.
+
+    The vault overview goes first, then each file (newest first) as full text if it
+    fits in both budgets left after reserving room for the summaries of the files
+    still to come, otherwise as its summary. Summaries are short and tokenized here;
+    full texts are costed from their stored running totals.
+    """
+    def header(name: str, kind: str = "") -> str:
+        if not include_filenames:
+            return "\n\n"
+        return f"\n\n===== FILE: {name}{kind} =====\n"
+
     pieces: List[str] = []
+    included: List[str] = []
     remaining = max_chars
-    for fname, text in big_chunks:
-        if not text:
+    remaining_tokens = max_tokens
+    if overview:
+        block = f"===== VAULT OVERVIEW =====\n{overview}"[:remaining]
+        block_tokens = tokens.count(block, model)
+        if block_tokens <= remaining_tokens:
+            pieces.append(block)
+            remaining -= len(block)
+            remaining_tokens -= block_tokens
+
+    summary_blocks = [header(e["name"], " (summary)") + (e.get("summary") or "") for e in entries]
+    summary_sizes = [len(block) for block in summary_blocks]
+    summary_costs = [tokens.count(block, model) for block in summary_blocks]
+    reserved, reserved_tokens = sum(summary_sizes), sum(summary_costs)
+    for entry, summary_size, summary_cost in zip(entries, summary_sizes, summary_costs):
+        reserved -= summary_size
+        reserved_tokens -= summary_cost
+        full_header = header(entry["name"])
+        full_size = len(full_header) + len(entry["text"])
+        full_tokens = tokens.count(full_header, model) + tokens.total(entry["tokens"])
+        if full_size <= remaining - reserved and full_tokens <= remaining_tokens - reserved_tokens:
+            pieces.append(full_header + entry["text"])
+            included.append(entry["name"])
+            remaining -= full_size
+            remaining_tokens -= full_tokens
             continue
-        header = f"\n\n===== FILE: {fname} =====\n" if include_filenames else "\n\n"
-        need = len(header) + len(text)
-        if need > remaining:
-            # Truncate text to fit
-            take = max(0, remaining - len(header))
-            if take <= 0:
-                break
-            pieces.append(header)
-            pieces.append(text[:take])
-            included.append(fname + " (truncated)")
-            remaining = 0
+        summary = entry.get("summary") or ""
+        if not summary:
+            continue
+        if summary_cost > remaining_tokens:
+            break
+        block = (header(entry["name"], " (summary)") + summary)[:remaining]
+        if not block.strip():
             break
-        pieces.append(header)
-        pieces.append(text)
-        included.append(fname)
-        remaining -= need
-        if remaining <= 0:
+        pieces.append(block)
+        included.append(entry["name"] + " (summary)")
+        remaining -= len(block)
+        remaining_tokens -= summary_cost
+        if remaining <= 0 or remaining_tokens <= 0:
             break
     combined = "".join(pieces).strip()
-    return combined, included, max_chars - remaining
-
-
-@router.post("/{vault_id}/chat", response_model=ChatResponse)
-async def chat_with_vault(vault_id: str, body: ChatRequest, authorization: str = Header(default=None)):
-    if not authorization or not authorization.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Missing bearer token")
-    token = authorization.split(" ", 1)[1]
-    claims = verify_supabase_jwt(token)
-    if not claims.get("sub"):
-        raise HTTPException(status_code=401, detail="Invalid token")
+    return combined, included, max_chars - remaining, max_tokens - remaining_tokens
 
-    supabase_url = _require_env("SUPABASE_URL")
 
-    # 1) List files for the vault (RLS ensures access via has_vault_perm)
-    files = await _fetch_vault_files(supabase_url, token, vault_id)
+@timed("vault_ai")
+async def _collect_vault_texts(supabase_url: str, user_token: str, files: AsyncIterator[dict], max_chars: int, max_tokens: int, model: str) -> List[dict]:
+    """Get text contents and token totals from cache or extract them from storage, newest file first.
 
-    # 2) Get text contents from cache or extract from files
-    text_chunks: List[tuple[str, str]] = []
-    for f in files:
+    Stops pulling files once more could not show up in the context: while the
+    full texts fit both budgets, every file is kept; past that the chat uses the
+    summary tier, so files are pulled until their summaries alone fill it.
+    """
+    entries: List[dict] = []
+    text_chars = summary_chars = 0
+    text_tokens = summary_tokens = 0
+    async for f in files:
         path = f.get("file_path") or ""
         name = f.get("name") or path.split("/")[-1]
         mime = f.get("file_type") or ""
         file_id = f.get("id")
-        cached_text = f.get("extracted_text")
+        content_hash = f.get("content_hash")
         
         if not path or not file_id:
             continue
             
-        text = None
+        text = legacy_text = None
+        stored = f.get("extracted_texts") if content_hash else None
+        # Inflate no more than the full-text tier could use, but enough to summarize;
+        # one character over the limit marks the file as not fitting
+        limit = max_chars - text_chars
+        if stored and stored.get("token_chunks"):
+            known = tokens.for_model(stored["token_chunks"], stored.get("tokenizer"), model)
+            limit = min(limit, tokens.prefix_chars(known, max_tokens - text_tokens))
+        limit = max(limit, SUMMARY_INPUT_CHARS) + 1
+        complete = True
         
-        # Use cached text if available
-        if cached_text:
-            text = cached_text
-        else:
-            # Extract text from file and cache it
-            text = await _fetch_file_text(supabase_url, token, "vault-files", path, mime, name)
-            if text:
-                # Cache the extracted text in the database
-                try:
-                    await _update_extracted_text(supabase_url, token, file_id, text)
-                except Exception:
-                    # Don't fail if caching fails
-                    pass
+        # Use the deduplicated text, or the per-row copy for files from before it
+        if content_hash:
+            text = await text_store.get_text(content_hash, "vault_ai", limit)
+            complete = text is None or len(text) < limit
+        elif f.get("text_extracted_at"):
+            legacy_text = await _fetch_extracted_text(supabase_url, user_token, file_id)
+            if not text_store.enabled():
+                text = legacy_text
+        if text is None:
+            # Download the file; it is only parsed if the same content has not been seen before.
+            # A legacy row's text is stored for the content, then the row is linked and its copy dropped
+            content_hash, text = await _fetch_file_text(supabase_url, user_token, "vault-files", path, mime, name, legacy_text)
+            if text and content_hash != f.get("content_hash"):
+                # Point the row (just listed under RLS) at the shared text; keep a per-row copy without the store
+                linked = await text_store.link("files", file_id, content_hash, "vault_ai", extracted_text=None)
+                if not linked and legacy_text is None:
+                    try:
+                        await _update_extracted_text(supabase_url, user_token, file_id, text)
+                    except Exception:
+                        # Don't fail if caching fails
+                        pass
+            if text is None:
+                text = legacy_text
         
         if text and text.strip():
-            text_chunks.append((name, text.strip()))
+            # Stored with the text; texts without stored counts are tokenized here once
+            totals, tokenizer = await text_store.token_totals(
+                content_hash, text, "vault_ai", stored if content_hash == f.get("content_hash") else None, complete)
+            entries.append({
+                "id": file_id,
+                "name": name,
+                "text": text.strip(),
+                "tokens": tokens.for_model(totals, tokenizer, model),
+                "summary": f.get("summary"),
+                "summary_source_hash": f.get("summary_source_hash"),
+                # What a summary is checked against: the content hash, since a long text is only read in part
+                "source_hash": content_hash or _text_hash(text.strip()),
+                "text_hash": _text_hash(text.strip()) if complete else None,
+            })
+            text_chars += len(entries[-1]["text"])
+            text_tokens += tokens.total(entries[-1]["tokens"])
+            summary_chars += len(f.get("summary") or "") or SUMMARY_ESTIMATE_CHARS
+            summary_tokens += tokens.estimate(f.get("summary") or "") or SUMMARY_MAX_TOKENS
+            over_budget = text_chars > max_chars or text_tokens > max_tokens
+            if over_budget and (summary_chars >= max_chars or summary_tokens >= max_tokens):
+                break
+    return entries
+
+
+def _summary_model() -> str:
+    return os.getenv("OPENAI_SUMMARY_MODEL") or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+
+class SummariesResponse(BaseModel):
+    files_summarized: int
+    vault_summary: Optional[str] = None
+
+
+@router.post("/{vault_id}/summaries", response_model=SummariesResponse)
+async def refresh_vault_summaries(vault_id: str, authorization: str = Header(default=None)):
+    """Precompute file summaries and the vault rollup (call after uploads)."""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    token = authorization.split(" ", 1)[1]
+    with stage("vault_ai", "auth"):
+        claims = verify_supabase_jwt(token)
+    if not claims.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    supabase_url = _require_env("SUPABASE_URL")
+    # The files a default-sized chat would use, so its rollup hash matches the chat's
+    chat_model = _chat_model(None)
+    async with aclosing(_iter_vault_files(supabase_url, token, vault_id)) as files:
+        entries = await _collect_vault_texts(supabase_url, token, files, DEFAULT_MAX_CHARS,
+                                             _context_tokens(chat_model, "", None), chat_model)
+
+    client = openai_client()
+    model = _summary_model()
+    await _ensure_file_summaries(supabase_url, token, client, model, entries)
+    overview = await _ensure_vault_summary(supabase_url, token, vault_id, client, model, entries)
+    return SummariesResponse(files_summarized=len(entries), vault_summary=overview)
+
+
+@router.post("/{vault_id}/chat", response_model=ChatResponse)
+async def chat_with_vault(vault_id: str, body: ChatRequest, authorization: str = Header(default=None)):
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    token = authorization.split(" ", 1)[1]
+    with stage("vault_ai", "auth"):
+        claims = verify_supabase_jwt(token)
+    if not claims.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-    max_chars = int(body.max_chars or 200_000)
-    context, included_files, used_chars = _build_context(text_chunks, max_chars, bool(body.include_filenames))
+    supabase_url = _require_env("SUPABASE_URL")
+
+    max_chars = int(body.max_chars or DEFAULT_MAX_CHARS)
+    model = _chat_model(body.model)
+    max_tokens = _context_tokens(model, body.message, body.max_tokens)
+
+    # 1) List files for the vault page by page (RLS ensures access via has_vault_perm)
+    # 2) and get their text from cache or storage until the budget is covered
+    async with aclosing(_iter_vault_files(supabase_url, token, vault_id)) as files:
+        entries = await _collect_vault_texts(supabase_url, token, files, max_chars, max_tokens, model)
+    client = openai_client()
+
+    total_chars = sum(len(e["text"]) for e in entries)
+    total_tokens = sum(tokens.total(e["tokens"]) for e in entries)
+    if total_chars <= max_chars and total_tokens <= max_tokens:
+        text_chunks = [(e["name"], e["text"], e["tokens"]) for e in entries]
+        context, included_files, used_chars, used_tokens = _build_context(
+            text_chunks, max_chars, max_tokens, bool(body.include_filenames), model)
+    else:
+        # Over budget: cover the whole vault with the summary tier instead of truncating
+        summary_model = _summary_model()
+        await _ensure_file_summaries(supabase_url, token, client, summary_model, entries)
+        overview = await _ensure_vault_summary(supabase_url, token, vault_id, client, summary_model, entries)
+        context, included_files, used_chars, used_tokens = _build_tiered_context(
+            overview, entries, max_chars, max_tokens, bool(body.include_filenames), model)
 
     # 3) Build prompt and call OpenAI
-    if OpenAI is None:
-        raise HTTPException(status_code=500, detail="OpenAI SDK not installed on server")
-    api_key = _require_env("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-
-    model = body.model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    system = (
-        "You are a helpful assistant. You are given a knowledge context composed of the user's vault files. "
-        "Use only this context when relevant. If the context lacks information, say so clearly."
-    )
-    user_prompt = (
-        f"User question:\n{body.message}\n\n"
-        f"Context from vault files (may be truncated):\n{context}\n"
-    )
+    user_prompt = _user_prompt(body.message, context)
+    context_chars.observe(used_chars, "vault_ai")
+    context_tokens.observe(used_tokens, "vault_ai")
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.3,
-        )
+        with stage("vault_ai", "llm"):
+            resp = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt},
+                ],
+                temperature=0.3,
+            )
         answer = resp.choices[0].message.content or ""
     except Exception as e:
+        count_response("openai", getattr(e, "status_code", None) or 0)
         raise HTTPException(status_code=500, detail=f"OpenAI error: {e}")
 
-    return ChatResponse(answer=answer.strip(), used_chars=used_chars, included_files=included_files)
+    return ChatResponse(answer=answer.strip(), used_chars=used_chars, used_tokens=used_tokens, included_files=included_files)
 
 
@@ -1,8 +1,10 @@
 import os
+import asyncio
 from fastapi import APIRouter, HTTPException, Header
 from pydantic import BaseModel
-import httpx
 from .auth_jwt import verify_supabase_jwt
+from .daily import get_or_create_room, create_meeting_token
+from .metrics import stage, timed
 
 router = APIRouter()
 
@@ -16,35 +18,18 @@ class JoinResponse(BaseModel):
     room_url: str
     token: str
 
+ROOM_PROPERTIES = {
+    "enable_chat": False,
+    "start_audio_off": True,
+}
+
+
+@timed("voice")
 async def _get_or_create_room(channel_id: str, api_key: str) -> tuple[str, str]:
     """Create a Daily room named by channel_id if it doesn't exist.
-    Returns (room_name, room_url).
+    Returns (room_name, room_url). Cached per channel until the room's exp.
     """
-    headers = {"Authorization": f"Bearer {api_key}"}
-    async with httpx.AsyncClient(timeout=30) as client:
-        # Try fetching by name first
-        r = await client.get(f"https://api.daily.co/v1/rooms/{channel_id}", headers=headers)
-        if r.status_code == 200:
-            data = r.json()
-            return data["name"], data["url"]
-
-        # Create the room
-        payload = {
-            "name": channel_id,
-            "privacy": "private",
-            "properties": {
-                # Daily expects an absolute UNIX timestamp for expiration
-                # Set to now + 24 hours
-                "exp": int(__import__('time').time()) + 60 * 60 * 24,
-                "enable_chat": False,
-                "start_audio_off": True,
-            },
-        }
-        r = await client.post("https://api.daily.co/v1/rooms", headers=headers, json=payload)
-        if r.status_code not in (200, 201):
-            raise HTTPException(status_code=502, detail=f"Failed to create room: {r.text}")
-        data = r.json()
-        return data["name"], data["url"]
+    return await get_or_create_room(channel_id, api_key, ROOM_PROPERTIES)
 
 
 # Debug endpoint to test token validation
@@ -75,22 +60,15 @@ async def join_voice(body: JoinRequest, authorization: str = Header(default=None
             raise HTTPException(status_code=401, detail="Missing bearer token")
         token = authorization.split(' ', 1)[1]
         try:
-            claims = verify_supabase_jwt(token)
+            with stage("voice", "auth"):
+                claims = verify_supabase_jwt(token)
         except Exception as e:
             raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
 
-    # Create or fetch Daily room for this channel
-    room_name, room_url = await _get_or_create_room(body.channel_id, api_key)
-
-    # Create meeting token
-    headers = {"Authorization": f"Bearer {api_key}"}
-    payload = {"properties": {"room_name": room_name, "user_name": body.user_name}}
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post("https://api.daily.co/v1/meeting-tokens", headers=headers, json=payload)
-        if r.status_code not in (200, 201):
-            raise HTTPException(status_code=502, detail=f"Failed to create meeting token: {r.text}")
-        data = r.json()
-
-    return JoinResponse(room_url=room_url, token=data.get("token", ""))
-
+    # Rooms are named by channel_id, so the token can be minted while the room resolves
+    (room_name, room_url), token = await asyncio.gather(
+        _get_or_create_room(body.channel_id, api_key),
+        create_meeting_token(body.channel_id, api_key, body.user_name),
+    )
 
+    return JoinResponse(room_url=room_url, token=token)
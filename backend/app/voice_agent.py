@@ -1,12 +1,26 @@
 import os
 import asyncio
+import base64
 import json
-import websockets
+import time
+import uuid
 import httpx
+import numpy as np
+import websockets
 from fastapi import APIRouter, HTTPException, Header
 from pydantic import BaseModel
 from typing import Optional
 from .auth_jwt import verify_supabase_jwt
+from .daily import get_or_create_room, create_meeting_token
+from .audio import PCM16RingBuffer
+from .audio_convert import ROOM_SAMPLE_RATE, room_to_realtime, realtime_to_room
+from .agent_pool import RealtimeSessionPool
+from .agent_registry import AgentRegistry
+from .presence import presence
+from .transcripts import ROOM_TRANSCRIPT_MESSAGE_TYPE, transcripts
+from .metrics import Histogram, HistogramVec, count_response, register_collector, stage, timed
+from .tracing import HTTPX_EVENT_HOOKS
+from .vad import EnergyGate, VAD_OPEN_DB, VAD_CLOSE_DB, VAD_HANGOVER_MS
 
 router = APIRouter()
 
@@ -20,8 +34,14 @@ class VoiceAgentJoinResponse(BaseModel):
     message: str
     agent_id: Optional[str] = None
 
-# Store active voice agents
-active_agents = {}
+# Voice agents running in this worker; the registry is the cross-worker view
+active_agents: dict[str, "VoiceAgent"] = {}
+registry = AgentRegistry()
+REGISTRY_POLL_SECONDS = 1.0
+
+AGENT_USER_ID = os.getenv("VOICE_AGENT_USER_ID", "voice-agent-bot")
+AGENT_USER_NAME = "Voice Agent 🤖"
+_registry_task: Optional[asyncio.Task] = None
 
 def _require_env(var: str) -> str:
     """Get required environment variable."""
@@ -30,100 +50,274 @@ def _require_env(var: str) -> str:
         raise HTTPException(status_code=500, detail=f"{var} environment variable not set")
     return value
 
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+# The agent's transcripts and presence rows reference user_profiles, so they are
+# only written for a real profile; check_agent_user() confirms it at startup
+agent_user_ok = _is_uuid(AGENT_USER_ID)
+
+async def check_agent_user() -> None:
+    """Warm-up step: make sure VOICE_AGENT_USER_ID names a user_profiles row."""
+    global agent_user_ok
+    if not agent_user_ok:
+        raise ValueError(f"VOICE_AGENT_USER_ID {AGENT_USER_ID!r} is not a uuid; agent transcripts and presence are off")
+    supabase_url = os.getenv("SUPABASE_URL", "").rstrip("/")
+    service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+    async with httpx.AsyncClient(timeout=10, event_hooks=HTTPX_EVENT_HOOKS) as client:
+        r = await client.get(
+            f"{supabase_url}/rest/v1/user_profiles",
+            headers={"Authorization": f"Bearer {service_key}", "apikey": service_key},
+            params={"select": "id", "id": f"eq.{AGENT_USER_ID}"},
+        )
+    count_response("postgrest", r.status_code)
+    # A failed lookup leaves writes on; rows the database rejects are dropped by the sink
+    r.raise_for_status()
+    if not r.json():
+        agent_user_ok = False
+        raise ValueError(f"VOICE_AGENT_USER_ID {AGENT_USER_ID} has no user_profiles row; agent transcripts and presence are off")
+
+AGENT_ROOM_PROPERTIES = {
+    "enable_chat": False,
+    "start_audio_off": False,  # Agent starts with audio on
+    "enable_recording": False,
+}
+
+@timed("voice_agent")
 async def _create_daily_room_for_agent(channel_id: str, api_key: str) -> tuple[str, str]:
     """Create or get Daily room for the voice agent."""
-    headers = {"Authorization": f"Bearer {api_key}"}
-    room_name = f"{channel_id}-agent"
-    
-    async with httpx.AsyncClient(timeout=30) as client:
-        # Try fetching by name first
-        r = await client.get(f"https://api.daily.co/v1/rooms/{room_name}", headers=headers)
-        if r.status_code == 200:
-            data = r.json()
-            return data["name"], data["url"]
-
-        # Create the room
-        payload = {
-            "name": room_name,
-            "privacy": "private",
-            "properties": {
-                "exp": int(__import__('time').time()) + 60 * 60 * 24,  # 24 hours
-                "enable_chat": False,
-                "start_audio_off": False,  # Agent starts with audio on
-                "enable_recording": False,
-            },
-        }
-        r = await client.post("https://api.daily.co/v1/rooms", headers=headers, json=payload)
-        if r.status_code not in (200, 201):
-            raise HTTPException(status_code=502, detail=f"Failed to create agent room: {r.text}")
-        data = r.json()
-        return data["name"], data["url"]
+    return await get_or_create_room(f"{channel_id}-agent", api_key, AGENT_ROOM_PROPERTIES)
 
+@timed("voice_agent")
 async def _create_agent_token(room_name: str, api_key: str) -> str:
     """Create a Daily meeting token for the voice agent."""
-    headers = {"Authorization": f"Bearer {api_key}"}
-    payload = {
-        "properties": {
-            "room_name": room_name,
-            "user_name": "Voice Agent",
-            "is_owner": True,
-            "enable_screenshare": False,
-        }
+    return await create_meeting_token(
+        room_name, api_key, "Voice Agent", is_owner=True, enable_screenshare=False
+    )
+
+REALTIME_URL = os.getenv(
+    "OPENAI_REALTIME_URL",
+    "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01",
+)
+
+SESSION_CONFIG = {
+    "modalities": ["text", "audio"],
+    "instructions": "You are a helpful voice assistant in a team voice channel. Keep your responses conversational and helpful. You can hear and respond to voice messages from team members.",
+    "voice": "alloy",
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16",
+    "input_audio_transcription": {
+        "model": "whisper-1"
+    },
+    "turn_detection": {
+        "type": "server_vad",
+        "threshold": 0.5,
+        "prefix_padding_ms": 300,
+        "silence_duration_ms": 200
     }
-    
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post("https://api.daily.co/v1/meeting-tokens", headers=headers, json=payload)
-        if r.status_code not in (200, 201):
-            raise HTTPException(status_code=502, detail=f"Failed to create agent token: {r.text}")
-        data = r.json()
-        return data.get("token", "")
+}
+
+# Bounded queues between the websocket and the agent. A full inbound queue stops
+# the reader (so the socket applies TCP backpressure upstream); a full outbound
+# queue makes send_audio() wait instead of buffering without limit.
+INBOUND_QUEUE_SIZE = 256
+OUTBOUND_QUEUE_SIZE = 256
+
+# Input audio is aggregated in a ring buffer and sent as one append per flush.
+# The realtime API takes 24kHz mono PCM16.
+AUDIO_SAMPLE_RATE = 24_000
+AUDIO_BYTES_PER_MS = AUDIO_SAMPLE_RATE * 2 // 1000
+AUDIO_FLUSH_MS = 100       # flush once this much audio is buffered...
+AUDIO_MAX_WAIT = 0.1       # ...or the oldest buffered byte has waited this long
+AUDIO_RING_MS = 2_000
+
+# Converted reply audio waiting to be played into the room (~20ms per delta)
+PLAYBACK_QUEUE_SIZE = 500
+
+# Stop an agent after this long with no room audio in or reply audio played out,
+# so one without a live room transport doesn't hold a paid realtime session open
+AGENT_IDLE_SECONDS = float(os.getenv("VOICE_AGENT_IDLE_SECONDS", "120"))
+
+
+SESSION_ACK_TIMEOUT = 10.0
+
+
+@timed("voice_agent")
+async def _open_realtime_session():
+    """Connect to the OpenAI Realtime API and wait until the session is configured."""
+    openai_api_key = _require_env("OPENAI_API_KEY")
+    headers = {
+        "Authorization": f"Bearer {openai_api_key}",
+        "OpenAI-Beta": "realtime=v1"
+    }
+    ws = await websockets.connect(REALTIME_URL, additional_headers=headers)
+    try:
+        await ws.send(json.dumps({"type": "session.update", "session": SESSION_CONFIG}))
+        await asyncio.wait_for(_await_session_ack(ws), timeout=SESSION_ACK_TIMEOUT)
+        return ws
+    except BaseException:
+        await ws.close()
+        raise
+
+
+async def _await_session_ack(ws):
+    async for message in ws:
+        data = json.loads(message)
+        if data.get("type") == "session.updated":
+            return
+        if data.get("type") == "error":
+            raise RuntimeError(f"Realtime session rejected: {data.get('error')}")
+    raise RuntimeError("Realtime connection closed before session was configured")
+
+
+# Warm sessions so /voice/agent/join does not pay connect + session.update latency
+session_pool = RealtimeSessionPool(
+    _open_realtime_session,
+    size=int(os.getenv("VOICE_AGENT_POOL_SIZE", "2")),
+    max_age=float(os.getenv("VOICE_AGENT_POOL_MAX_AGE", "600")),
+)
+
+
+# Per-turn spans. speech_stopped is the server VAD's end of user speech, and
+# upstream timestamps are taken when a message is read off the socket, so
+# speech_to_first_audio is upstream time while audio_to_playout is ours.
+TURN_SPANS = (
+    "speech_to_transcript_ms",
+    "speech_to_first_audio_ms",
+    "first_to_last_audio_ms",
+    "last_audio_to_playout_ms",
+    "speech_to_playout_ms",
+)
+
+
+class TurnLatency:
+    """Latency histograms for one agent; turn_seconds keeps the spans once it stops."""
+
+    def __init__(self):
+        self.spans = {name: Histogram() for name in TURN_SPANS}
+        self.turns = 0
+        self.interrupted = 0
+
+    def observe(self, span: str, start: Optional[float], end: Optional[float]) -> None:
+        if start is not None and end is not None:
+            self.spans[span].observe((end - start) * 1000)
+            turn_seconds.observe(end - start, span[: -len("_ms")])
+
+    def snapshot(self) -> dict:
+        return {
+            "turns": self.turns,
+            "interrupted": self.interrupted,
+            "spans": {name: h.snapshot() for name, h in self.spans.items()},
+        }
+
+
+# channel_id -> latency histograms for the agents running on this worker
+turn_latency: dict[str, TurnLatency] = {}
+# The same spans across all channels, for /metrics
+turn_seconds = HistogramVec("voice_turn_seconds", "Voice agent per-turn latency spans", ("span",))
+
+
+class PumpStats:
+    """Per-direction message counts and time spent queued inside the agent."""
+
+    def __init__(self):
+        self.messages = {"in": 0, "out": 0}
+        self.total_delay = {"in": 0.0, "out": 0.0}
+        self.max_delay = {"in": 0.0, "out": 0.0}
+
+    def record(self, direction: str, delay: float) -> None:
+        self.messages[direction] += 1
+        self.total_delay[direction] += delay
+        if delay > self.max_delay[direction]:
+            self.max_delay[direction] = delay
+
+    def snapshot(self) -> dict:
+        return {
+            direction: {
+                "messages": count,
+                "avg_added_latency_ms": (self.total_delay[direction] / count * 1000) if count else 0.0,
+                "max_added_latency_ms": self.max_delay[direction] * 1000,
+            }
+            for direction, count in self.messages.items()
+        }
+
 
 class VoiceAgent:
-    def __init__(self, channel_id: str, room_url: str, token: str):
+    def __init__(
+        self,
+        channel_id: str,
+        room_url: str,
+        token: str,
+        audio_flush_ms: int = AUDIO_FLUSH_MS,
+        audio_max_wait: float = AUDIO_MAX_WAIT,
+        room_channels: int = 1,
+        local_vad: bool = True,
+        vad_open_db: float = VAD_OPEN_DB,
+        vad_close_db: float = VAD_CLOSE_DB,
+        user_id: Optional[str] = None,
+        idle_timeout: float = AGENT_IDLE_SECONDS,
+    ):
         self.channel_id = channel_id
+        # The member who summoned the agent
+        self.user_id = user_id
         self.room_url = room_url
         self.token = token
         self.openai_ws = None
         self.daily_ws = None
         self.is_active = False
+        self.stats = PumpStats()
+        self.latency = turn_latency[channel_id] = TurnLatency()
+        # Timestamps for the turn in progress, keyed by event name
+        self._turn: dict[str, float] = {}
+        self._received_at = 0.0
+        self._inbound: asyncio.Queue = asyncio.Queue(maxsize=INBOUND_QUEUE_SIZE)
+        # (priority, seq, queued_at, payload): control messages overtake queued audio
+        self._outbound: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=OUTBOUND_QUEUE_SIZE)
+        self._outbound_seq = 0
+        self._tasks: list[asyncio.Task] = []
+        self._stopped = False
+        self._audio = PCM16RingBuffer(AUDIO_RING_MS * AUDIO_BYTES_PER_MS)
+        self._audio_flush_bytes = audio_flush_ms * AUDIO_BYTES_PER_MS
+        self._audio_max_wait = audio_max_wait
+        self._audio_pending = asyncio.Event()
+        self._audio_first_at = 0.0
+        self._audio_appends = 0
+        self._started_at = time.monotonic()
+        self.idle_timeout = idle_timeout
+        self._last_activity = self._started_at
+        # Room audio is 48kHz; the realtime session is 24kHz mono PCM16
+        self._room_in = room_to_realtime(channels=room_channels)
+        self._room_out = realtime_to_room()
+        # (item_id, frame) pairs of 48kHz reply audio waiting for playout
+        self.playback: asyncio.Queue = asyncio.Queue(maxsize=PLAYBACK_QUEUE_SIZE)
+        # Barge-in state: the reply being spoken and how much of it was played out
+        self._response_active = False
+        self._current_item: Optional[tuple[str, int]] = None
+        self._played_samples: dict[str, int] = {}
+        self._truncated_items: set[str] = set()
+        self.barge_ins = 0
+        self._interrupt_total = 0.0
+        self._interrupt_max = 0.0
+        # Local gate so room silence is never encoded or shipped upstream. Its
+        # pre-roll matches the server VAD's prefix padding, and its hangover is
+        # longer than the server's silence window so turn ends are still detected.
+        turn_detection = SESSION_CONFIG["turn_detection"]
+        self._vad = EnergyGate(
+            AUDIO_SAMPLE_RATE,
+            open_db=vad_open_db,
+            close_db=vad_close_db,
+            hangover_ms=max(VAD_HANGOVER_MS, turn_detection["silence_duration_ms"] + 300),
+            preroll_ms=turn_detection["prefix_padding_ms"],
+        ) if local_vad else None
         
-    async def start(self):
-        """Start the voice agent."""
+    async def start(self, openai_ws=None):
+        """Start the voice agent, optionally on an already configured realtime session."""
         try:
-            # Initialize OpenAI Realtime API connection
-            openai_api_key = _require_env("OPENAI_API_KEY")
-            
-            # Connect to OpenAI Realtime API
-            openai_url = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01"
-            headers = {
-                "Authorization": f"Bearer {openai_api_key}",
-                "OpenAI-Beta": "realtime=v1"
-            }
-            
-            self.openai_ws = await websockets.connect(openai_url, extra_headers=headers)
-            
-            # Configure the session
-            session_config = {
-                "type": "session.update",
-                "session": {
-                    "modalities": ["text", "audio"],
-                    "instructions": "You are a helpful voice assistant in a team voice channel. Keep your responses conversational and helpful. You can hear and respond to voice messages from team members.",
-                    "voice": "alloy",
-                    "input_audio_format": "pcm16",
-                    "output_audio_format": "pcm16",
-                    "input_audio_transcription": {
-                        "model": "whisper-1"
-                    },
-                    "turn_detection": {
-                        "type": "server_vad",
-                        "threshold": 0.5,
-                        "prefix_padding_ms": 300,
-                        "silence_duration_ms": 200
-                    }
-                }
-            }
-            
-            await self.openai_ws.send(json.dumps(session_config))
+            self.openai_ws = openai_ws or await _open_realtime_session()
             
             self.is_active = True
             
@@ -136,61 +330,260 @@ class VoiceAgent:
             raise
     
     async def _handle_realtime_communication(self):
-        """Handle bidirectional communication between Daily.co and OpenAI."""
+        """Run the reader, dispatcher and writer tasks until one of them exits."""
+        self._tasks = [
+            asyncio.create_task(self._reader()),
+            asyncio.create_task(self._dispatcher()),
+            asyncio.create_task(self._writer()),
+            asyncio.create_task(self._audio_flusher()),
+            asyncio.create_task(self._idle_watchdog()),
+        ]
         try:
-            while self.is_active:
-                # Listen for messages from OpenAI
-                if self.openai_ws:
-                    try:
-                        message = await asyncio.wait_for(self.openai_ws.recv(), timeout=0.1)
-                        data = json.loads(message)
-                        await self._handle_openai_message(data)
-                    except asyncio.TimeoutError:
-                        continue
-                    except websockets.exceptions.ConnectionClosed:
-                        print("OpenAI WebSocket connection closed")
-                        break
-                
-                await asyncio.sleep(0.01)  # Small delay to prevent busy loop
-                
-        except Exception as e:
-            print(f"Error in realtime communication: {e}")
+            done, _pending = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception():
+                    print(f"Error in realtime communication: {task.exception()}")
         finally:
             await self.stop()
     
+    async def _reader(self):
+        """Move messages from the OpenAI socket onto the inbound queue."""
+        try:
+            async for message in self.openai_ws:
+                await self._inbound.put((time.perf_counter(), message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        print("OpenAI WebSocket connection closed")
+    
+    async def _dispatcher(self):
+        """Handle inbound messages as soon as they are queued."""
+        while True:
+            queued_at, message = await self._inbound.get()
+            self.stats.record("in", time.perf_counter() - queued_at)
+            self._received_at = queued_at
+            await self._handle_openai_message(json.loads(message))
+    
+    async def _writer(self):
+        """Send queued outbound messages to OpenAI in order."""
+        while True:
+            _priority, _seq, queued_at, payload = await self._outbound.get()
+            await self.openai_ws.send(payload)
+            self.stats.record("out", time.perf_counter() - queued_at)
+    
+    async def _send(self, message: dict, urgent: bool = False):
+        """Queue a message for the writer; waits while the outbound queue is full."""
+        await self._send_raw(json.dumps(message), urgent)
+    
+    async def _send_raw(self, payload: str, urgent: bool = False):
+        self._outbound_seq += 1
+        await self._outbound.put((0 if urgent else 1, self._outbound_seq, time.perf_counter(), payload))
+    
+    async def _idle_watchdog(self):
+        """Return, which stops the agent, once the room has been idle for idle_timeout."""
+        while True:
+            remaining = self._last_activity + self.idle_timeout - time.monotonic()
+            if remaining <= 0:
+                print(f"Voice agent for channel {self.channel_id} idle for {self.idle_timeout:.0f}s, stopping")
+                return
+            await asyncio.sleep(remaining)
+    
+    async def _audio_flusher(self):
+        """Flush buffered input audio once its oldest byte reaches the wait target."""
+        while True:
+            await self._audio_pending.wait()
+            delay = self._audio_first_at + self._audio_max_wait - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._flush_audio()
+    
+    async def _flush_audio(self):
+        """Send everything in the ring buffer as a single input_audio_buffer.append."""
+        self._audio_pending.clear()
+        audio_b64 = self._audio.drain_base64()
+        if not audio_b64:
+            return
+        self._audio_appends += 1
+        # base64 needs no JSON escaping, so skip json.dumps on the large payload
+        await self._send_raw('{"type":"input_audio_buffer.append","audio":"' + audio_b64 + '"}')
+    
     async def _handle_openai_message(self, data: dict):
         """Handle messages from OpenAI Realtime API."""
         message_type = data.get("type")
         
         if message_type == "response.audio.delta":
-            # Stream audio back to Daily.co
-            audio_data = data.get("delta", "")
-            # TODO: Send audio to Daily.co room
-            # This would require Daily.co bot integration
-            pass
+            item_id = data.get("item_id", "")
+            if item_id in self._truncated_items:
+                # Audio for a reply we already interrupted; still in flight upstream
+                return
+            self._current_item = (item_id, data.get("content_index", 0))
+            if "speech_end" in self._turn:
+                self._turn.setdefault("first_audio", self._received_at)
+                self._turn["last_audio"] = self._received_at
+            # Convert reply audio to the room format and queue it for playout
+            pcm = np.frombuffer(base64.b64decode(data.get("delta", "")), dtype=np.int16)
+            self._queue_playback(item_id, self._room_out.convert(pcm))
+        elif message_type == "response.created":
+            self._response_active = True
+        elif message_type == "input_audio_buffer.speech_started":
+            if self._turn:
+                # The previous reply never finished playing out
+                self.latency.interrupted += 1
+                self._turn = {}
+            await self._barge_in()
+        elif message_type == "input_audio_buffer.speech_stopped":
+            self._turn = {"speech_end": self._received_at}
+            self.latency.turns += 1
+        elif message_type == "conversation.item.input_audio_transcription.completed":
+            if "speech_end" in self._turn and "transcript" not in self._turn:
+                self._turn["transcript"] = self._received_at
+                self.latency.observe("speech_to_transcript_ms", self._turn["speech_end"], self._received_at)
+            # Room audio is mixed, so there is no speaker to attribute this to
+            if agent_user_ok:
+                transcripts.add(self.channel_id, AGENT_USER_ID, data.get("transcript", ""), ROOM_TRANSCRIPT_MESSAGE_TYPE)
+        elif message_type == "response.audio_transcript.done":
+            # Interrupted replies were truncated upstream; only keep what was heard in full
+            if agent_user_ok and data.get("item_id") not in self._truncated_items:
+                transcripts.add(self.channel_id, AGENT_USER_ID, data.get("transcript", ""))
         elif message_type == "response.done":
-            # Response completed
-            print("Voice agent response completed")
+            # Response completed; no more deltas will arrive for interrupted items
+            self._response_active = False
+            self._truncated_items.clear()
+            self._finish_response()
+            if self._current_item is not None:
+                item_id = self._current_item[0]
+                if self.playback.empty() or not self._played_samples.get(item_id):
+                    # Played out already, or not being played out at all: nothing to interrupt
+                    self._current_item = None
+                    self._played_samples.pop(item_id, None)
         elif message_type == "error":
             print(f"OpenAI error: {data}")
     
-    async def send_audio(self, audio_data: bytes):
-        """Send audio data to OpenAI."""
+    def _finish_response(self):
+        """Record the upstream spans of this turn; playout spans follow once it drains."""
+        turn = self._turn
+        if "speech_end" not in turn:
+            return
+        self.latency.observe("speech_to_first_audio_ms", turn["speech_end"], turn.get("first_audio"))
+        self.latency.observe("first_to_last_audio_ms", turn.get("first_audio"), turn.get("last_audio"))
+        if "first_audio" not in turn or self.playback.empty():
+            # Text-only reply, or every frame was already handed to the room
+            self._finish_playout()
+    
+    def _finish_playout(self):
+        turn, self._turn = self._turn, {}
+        if "speech_end" not in turn or "first_audio" not in turn:
+            return
+        done = time.perf_counter()
+        self.latency.observe("last_audio_to_playout_ms", turn["last_audio"], done)
+        self.latency.observe("speech_to_playout_ms", turn["speech_end"], done)
+    
+    async def _barge_in(self):
+        """User started talking: silence local playout, cancel and truncate the reply."""
+        started = time.perf_counter()
+        dropped = 0
+        while not self.playback.empty():
+            self.playback.get_nowait()
+            dropped += 1
+        if dropped:
+            elapsed = time.perf_counter() - started
+            self.barge_ins += 1
+            self._interrupt_total += elapsed
+            self._interrupt_max = max(self._interrupt_max, elapsed)
+        
+        if self._response_active:
+            self._response_active = False
+            await self._send({"type": "response.cancel"}, urgent=True)
+        if self._current_item is not None:
+            item_id, content_index = self._current_item
+            self._current_item = None
+            played = self._played_samples.pop(item_id, 0)
+            # Only a reply that is mid-playout (some frames played, more were queued)
+            # is truncated; one that was never played out keeps its full text
+            if not (played and dropped):
+                return
+            self._truncated_items.add(item_id)
+            # Tell the model how much of its reply the room actually heard
+            played_ms = played * 1000 // ROOM_SAMPLE_RATE
+            await self._send({
+                "type": "conversation.item.truncate",
+                "item_id": item_id,
+                "content_index": content_index,
+                "audio_end_ms": played_ms,
+            }, urgent=True)
+    
+    def barge_in_stats(self) -> dict:
+        return {
+            "barge_ins": self.barge_ins,
+            "avg_interrupt_to_silence_ms": (self._interrupt_total / self.barge_ins * 1000) if self.barge_ins else 0.0,
+            "max_interrupt_to_silence_ms": self._interrupt_max * 1000,
+        }
+    
+    async def send_audio(self, audio_data):
+        """Buffer PCM16 audio for OpenAI; appends are sent per flush, not per frame."""
         if self.openai_ws and self.is_active:
-            # Convert audio to base64 and send to OpenAI
-            import base64
-            audio_b64 = base64.b64encode(audio_data).decode()
-            
-            message = {
-                "type": "input_audio_buffer.append",
-                "audio": audio_b64
-            }
-            
-            await self.openai_ws.send(json.dumps(message))
+            # Silence still counts: it means the room is connected
+            self._last_activity = time.monotonic()
+            if self._vad is not None:
+                audio_data = self._vad.process(np.frombuffer(audio_data, dtype=np.int16))
+                if not len(audio_data):
+                    return
+            if not len(self._audio):
+                self._audio_first_at = time.perf_counter()
+                self._audio_pending.set()
+            self._audio.write(audio_data)
+            if len(self._audio) >= self._audio_flush_bytes:
+                await self._flush_audio()
+    
+    async def send_room_audio(self, samples: np.ndarray):
+        """Send a batch of room audio (48kHz, int16 or float32, room_channels wide)."""
+        pcm = self._room_in.convert(samples)
+        await self.send_audio(memoryview(pcm).cast("B"))
+    
+    def _queue_playback(self, item_id: str, frame: np.ndarray):
+        """Queue converted reply audio, dropping the oldest frame if playout is behind."""
+        if self.playback.full():
+            self.playback.get_nowait()
+        self.playback.put_nowait((item_id, frame))
+    
+    async def next_playback_frame(self) -> np.ndarray:
+        """Next 48kHz reply frame for the room; counts it as played for truncation."""
+        item_id, frame = await self.playback.get()
+        self._last_activity = time.monotonic()
+        self._played_samples[item_id] = self._played_samples.get(item_id, 0) + len(frame)
+        if self.playback.empty() and not self._response_active:
+            # Reply fully played out; nothing left to interrupt
+            self._current_item = None
+            self._played_samples.pop(item_id, None)
+            self._finish_playout()
+        return frame
+    
+    def audio_stats(self) -> dict:
+        """Input audio throughput since the agent was created."""
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        return {
+            "bytes_in": self._audio.bytes_written,
+            "bytes_copied": self._audio.bytes_copied,
+            "bytes_dropped": self._audio.bytes_dropped,
+            "appends_sent": self._audio_appends,
+            "bytes_copied_per_sec": self._audio.bytes_copied / elapsed,
+            "messages_per_sec": self._audio_appends / elapsed,
+            "vad_suppressed_fraction": self._vad.suppressed_fraction if self._vad else 0.0,
+        }
     
     async def stop(self):
         """Stop the voice agent."""
+        if self._stopped:
+            return
+        self._stopped = True
         self.is_active = False
+        if turn_latency.get(self.channel_id) is self.latency:
+            del turn_latency[self.channel_id]
+        
+        current = asyncio.current_task()
+        tasks = [t for t in self._tasks if t is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
         
         if self.openai_ws:
             await self.openai_ws.close()
@@ -213,40 +606,40 @@ async def join_voice_agent(
     
     token = authorization.split(' ', 1)[1]
     try:
-        claims = verify_supabase_jwt(token)
+        with stage("voice_agent", "auth"):
+            claims = verify_supabase_jwt(token)
         user_id = claims.get('sub')
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
     
     # Get required environment variables
-    daily_api_key = _require_env("DAILY_API_KEY")
-    openai_api_key = _require_env("OPENAI_API_KEY")
+    _require_env("DAILY_API_KEY")
+    _require_env("OPENAI_API_KEY")
     
     try:
-        # Check if agent is already active for this channel
-        if body.channel_id in active_agents:
+        # Reserve the channel on the least-loaded worker (may be another process)
+        placement, worker_id = await asyncio.to_thread(registry.place, body.channel_id, user_id)
+        if placement == "exists":
             return VoiceAgentJoinResponse(
                 success=False,
                 message="Voice agent is already active in this channel"
             )
+        if placement == "full":
+            return VoiceAgentJoinResponse(
+                success=False,
+                message="No voice agent capacity available, try again shortly"
+            )
         
-        # For now, we'll simulate the voice agent joining
-        # In a full implementation, this would integrate with Daily.co's bot framework
-        
-        # Store agent as "active" (simulated)
-        active_agents[body.channel_id] = {
-            "channel_id": body.channel_id,
-            "user_id": user_id,
-            "started_at": __import__('time').time(),
-            "status": "active"
-        }
-        
-        # Start background task to simulate agent responses
-        asyncio.create_task(_simulate_voice_agent(body.channel_id, openai_api_key))
+        if worker_id == registry.worker_id:
+            await _launch_agent(body.channel_id, user_id)
+            message = "Voice agent joined successfully"
+        else:
+            # The owning worker picks it up on its next registry poll
+            message = "Voice agent is joining"
         
         return VoiceAgentJoinResponse(
             success=True,
-            message="Voice agent joined successfully",
+            message=message,
             agent_id=body.channel_id
         )
         
@@ -257,57 +650,157 @@ async def join_voice_agent(
             message=f"Failed to join voice agent: {str(e)}"
         )
 
-async def _simulate_voice_agent(channel_id: str, openai_api_key: str):
-    """Simulate voice agent presence (placeholder for full implementation)."""
+@timed("voice_agent")
+async def _launch_agent(channel_id: str, user_id: Optional[str]):
+    """Start an agent this worker owns in the registry. Releases the slot on failure."""
+    daily_api_key = _require_env("DAILY_API_KEY")
     try:
-        print(f"Voice agent simulation started for channel {channel_id}")
+        # Room, token and a warm realtime session are independent; resolve them together
+        room_name = f"{channel_id}-agent"
+        room, agent_token, openai_ws = await asyncio.gather(
+            _create_daily_room_for_agent(channel_id, daily_api_key),
+            _create_agent_token(room_name, daily_api_key),
+            session_pool.checkout(),
+            return_exceptions=True,
+        )
+        failure = next((r for r in (room, agent_token, openai_ws) if isinstance(r, BaseException)), None)
+        if failure is not None:
+            if not isinstance(openai_ws, BaseException):
+                await openai_ws.close()
+            raise failure
         
-        # Add voice agent to presence tracking
-        from supabase import create_client
-        import os
+        agent = VoiceAgent(channel_id, room[1], agent_token, user_id=user_id)
+        active_agents[channel_id] = agent
+        await asyncio.to_thread(registry.mark_running, channel_id)
+        asyncio.create_task(_run_voice_agent(agent, openai_ws))
+    except BaseException:
+        await asyncio.to_thread(registry.release, channel_id)
+        raise
+
+async def _launch_claimed_agent(channel_id: str, user_id: Optional[str]):
+    try:
+        await _launch_agent(channel_id, user_id)
+    except Exception as e:
+        print(f"Failed to start voice agent for channel {channel_id}: {e}")
+
+async def _registry_loop():
+    """Heartbeat this worker, reap dead ones, and act on agents placed or stopped elsewhere."""
+    while True:
+        try:
+            await asyncio.to_thread(registry.heartbeat)
+            await asyncio.to_thread(registry.reap)
+            for channel_id, user_id in await asyncio.to_thread(registry.claim_pending):
+                asyncio.create_task(_launch_claimed_agent(channel_id, user_id))
+            owned = await asyncio.to_thread(registry.owned)
+            for row in owned:
+                channel_id = row["channel_id"]
+                agent = active_agents.get(channel_id)
+                if row["stop_requested"] and agent is not None:
+                    active_agents.pop(channel_id, None)
+                    await agent.stop()
+                    await asyncio.to_thread(registry.release, channel_id)
+                elif row["state"] == "running" and agent is None:
+                    # Agent ended without releasing its slot
+                    await asyncio.to_thread(registry.release, channel_id)
+                elif agent is not None:
+                    # Lets whichever worker gets /voice/agent/latency answer it
+                    await asyncio.to_thread(registry.publish_stats, channel_id, json.dumps(agent.latency.snapshot()))
+            # Agents whose row was reaped are no longer ours to run. Re-read: joins
+            # placed during the awaits above are running but missing from owned.
+            # Nothing awaits between this read and the snapshot of active_agents.
+            owned_ids = {row["channel_id"] for row in await asyncio.to_thread(registry.owned)}
+            for channel_id, agent in list(active_agents.items()):
+                if channel_id not in owned_ids:
+                    active_agents.pop(channel_id, None)
+                    await agent.stop()
+        except Exception as e:
+            print(f"Voice agent registry error: {e}")
+        await asyncio.sleep(REGISTRY_POLL_SECONDS)
+
+async def _run_voice_agent(agent: VoiceAgent, openai_ws):
+    """Run a voice agent on a checked-out realtime session until it stops."""
+    channel_id = agent.channel_id
+    try:
+        print(f"Voice agent started for channel {channel_id}")
         
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        # Add voice agent to presence tracking (written asynchronously in batches)
+        if agent_user_ok:
+            presence.set_present(channel_id, AGENT_USER_ID, AGENT_USER_NAME)
         
-        if supabase_url and supabase_key:
-            supabase = create_client(supabase_url, supabase_key)
+        # Runs until /voice/agent/leave stops it, the realtime session closes, or no
+        # room audio flows through send_room_audio() / next_playback_frame() for
+        # idle_timeout (always the case while no Daily transport drives them)
+        await agent.start(openai_ws)
             
-            # Add voice agent presence
-            try:
-                supabase.table('voice_presence').insert({
-                    'channel_id': channel_id,
-                    'user_id': 'voice-agent-bot',
-                    'user_name': 'Voice Agent 🤖'
-                }).execute()
-                print(f"Added voice agent presence for channel {channel_id}")
-            except Exception as e:
-                print(f"Failed to add voice presence: {e}")
-        
-        # This is where we would:
-        # 1. Connect to Daily.co room as a bot participant
-        # 2. Stream audio to/from OpenAI Realtime API
-        # 3. Handle voice interactions
-        
-        # For now, just keep the agent "active" for demonstration
-        await asyncio.sleep(300)  # 5 minutes
+    except Exception as e:
+        print(f"Voice agent error: {e}")
+    finally:
+        # Clean up presence; if this process dies instead, the row's TTL expires it
+        if agent_user_ok:
+            presence.set_absent(channel_id, AGENT_USER_ID)
         
-        # Clean up presence
-        if supabase_url and supabase_key:
-            try:
-                supabase.table('voice_presence').delete().eq('channel_id', channel_id).eq('user_id', 'voice-agent-bot').execute()
-                print(f"Removed voice agent presence for channel {channel_id}")
-            except Exception as e:
-                print(f"Failed to remove voice presence: {e}")
+        # Write out this session's transcripts now rather than on the next interval
+        try:
+            await transcripts.flush()
+        except Exception as e:
+            print(f"Transcript flush failed for channel {channel_id}: {e}")
         
         # Clean up
-        if channel_id in active_agents:
+        if active_agents.get(channel_id) is agent:
             del active_agents[channel_id]
-            print(f"Voice agent simulation ended for channel {channel_id}")
-            
+            await asyncio.to_thread(registry.release, channel_id)
+            print(f"Voice agent ended for channel {channel_id}")
+
+def _collect_voice_metrics() -> list:
+    pool = session_pool.stats()
+    sink = transcripts.stats()
+    writes = presence.stats()
+    return [
+        ("voice_agents_active", "gauge", "Running voice agents", (), {(): len(active_agents)}),
+        ("voice_pool_idle_sessions", "gauge", "Warm realtime sessions ready for checkout", (), {(): pool["idle"]}),
+        ("voice_pool_checkouts_total", "counter", "Realtime session checkouts by result", ("result",),
+         {("hit",): pool["hits"], ("miss",): pool["misses"]}),
+        ("voice_pool_connect_failures_total", "counter", "Failed warm session connects", (), {(): pool["connect_failures"]}),
+        ("voice_transcript_rows_total", "counter", "Transcript rows by outcome", ("outcome",),
+         {("written",): sink["rows_written"], ("dropped",): sink["dropped"], ("rejected",): sink["rejected"]}),
+        ("voice_presence_requests_total", "counter", "Batched presence write requests", (), {(): writes["requests"]}),
+    ]
+
+
+register_collector(_collect_voice_metrics)
+
+async def start_voice_agents():
+    """Called from the app lifespan."""
+    global _registry_task
+    _registry_task = asyncio.create_task(_registry_loop())
+    if os.getenv("OPENAI_API_KEY"):
+        session_pool.start()
+
+async def stop_voice_agents():
+    if _registry_task:
+        _registry_task.cancel()
+    for channel_id, agent in list(active_agents.items()):
+        await agent.stop()
+    await asyncio.to_thread(registry.unregister)
+    await session_pool.close()
+    await presence.close()
+    await transcripts.close()
+
+@router.get("/voice/agent/pool")
+async def get_voice_agent_pool(authorization: str = Header(default=None)):
+    """Warm realtime session pool size and hit rate."""
+    
+    # Validate JWT
+    if not authorization or not authorization.lower().startswith('bearer '):
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    
+    token = authorization.split(' ', 1)[1]
+    try:
+        verify_supabase_jwt(token)
     except Exception as e:
-        print(f"Voice agent simulation error: {e}")
-        if channel_id in active_agents:
-            del active_agents[channel_id]
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    
+    return session_pool.stats()
 
 @router.post("/voice/agent/leave/{channel_id}")
 async def leave_voice_agent(
@@ -326,12 +819,16 @@ async def leave_voice_agent(
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
     
-    if channel_id in active_agents:
-        agent = active_agents[channel_id]
+    agent = active_agents.pop(channel_id, None)
+    if agent is not None:
         await agent.stop()
-        del active_agents[channel_id]
+        await asyncio.to_thread(registry.release, channel_id)
         return {"success": True, "message": "Voice agent left successfully"}
     
+    # Owned by another worker: it stops the agent on its next registry poll
+    if await asyncio.to_thread(registry.request_stop, channel_id):
+        return {"success": True, "message": "Voice agent is leaving"}
+    
     return {"success": False, "message": "No active voice agent in this channel"}
 
 @router.get("/voice/agent/status/{channel_id}")
@@ -351,10 +848,40 @@ async def get_voice_agent_status(
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
     
-    is_active = channel_id in active_agents and active_agents[channel_id].is_active
+    entry = await asyncio.to_thread(registry.get, channel_id)
     
     return {
         "channel_id": channel_id,
-        "is_active": is_active,
-        "agent_count": len(active_agents)
+        "is_active": bool(entry) and entry["state"] == "running" and not entry["stop_requested"],
+        "state": entry["state"] if entry else None,
+        "worker_id": entry["worker_id"] if entry else None,
+        "agent_count": await asyncio.to_thread(registry.count)
     }
+
+@router.get("/voice/agent/latency/{channel_id}")
+async def get_voice_agent_latency(
+    channel_id: str,
+    authorization: str = Header(default=None)
+):
+    """Per-turn latency percentiles for the voice agent in the specified channel."""
+    
+    # Validate JWT
+    if not authorization or not authorization.lower().startswith('bearer '):
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    
+    token = authorization.split(' ', 1)[1]
+    try:
+        verify_supabase_jwt(token)
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    
+    latency = turn_latency.get(channel_id)
+    if latency is not None:
+        return {"channel_id": channel_id, "worker_id": registry.worker_id, **latency.snapshot()}
+    
+    # Agent runs on another worker; serve the snapshot it last published
+    entry = await asyncio.to_thread(registry.get, channel_id)
+    if entry and entry.get("stats"):
+        return {"channel_id": channel_id, "worker_id": entry["worker_id"], **json.loads(entry["stats"])}
+    
+    raise HTTPException(status_code=404, detail="No voice agent latency recorded for this channel")
@@ -0,0 +1,55 @@
+"""Real-time factor of the voice agent audio conversion path on one core.
+
+Runs both directions over 20ms frame batches:
+  room -> realtime: 48kHz stereo float32 -> 24kHz mono int16
+  realtime -> room: 24kHz mono int16 -> 48kHz mono int16
+
+Usage (from backend/):
+    python -m benchmarks.bench_audio [--seconds 60] [--frame-ms 20]
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.audio_convert import ROOM_SAMPLE_RATE, REALTIME_SAMPLE_RATE, room_to_realtime, realtime_to_room
+
+
+def _rtf(convert, frames, audio_seconds: float) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        convert(frame)
+    return audio_seconds / (time.perf_counter() - start)
+
+
+def run(seconds: float, frame_ms: int) -> dict:
+    rng = np.random.default_rng(0)
+    room_frame = ROOM_SAMPLE_RATE * frame_ms // 1000
+    rt_frame = REALTIME_SAMPLE_RATE * frame_ms // 1000
+    n_frames = int(seconds * 1000 // frame_ms)
+
+    room_audio = (rng.standard_normal((n_frames * room_frame, 2)) * 0.1).astype(np.float32)
+    rt_audio = (rng.standard_normal(n_frames * rt_frame) * 3000).astype(np.int16)
+    room_frames = [room_audio[i * room_frame:(i + 1) * room_frame] for i in range(n_frames)]
+    rt_frames = [rt_audio[i * rt_frame:(i + 1) * rt_frame] for i in range(n_frames)]
+
+    return {
+        "audio_seconds": seconds,
+        "frame_ms": frame_ms,
+        "room_to_realtime_rtf": _rtf(room_to_realtime(channels=2).convert, room_frames, seconds),
+        "realtime_to_room_rtf": _rtf(realtime_to_room().convert, rt_frames, seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--frame-ms", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.seconds, args.frame_ms), indent=2))
+
+
+if __name__ == "__main__":
+    main()
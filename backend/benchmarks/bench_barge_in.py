@@ -0,0 +1,93 @@
+"""Barge-in against the local fake realtime server.
+
+The server streams a reply as 20ms audio deltas while a consumer plays them
+out in real time; midway the server reports input_audio_buffer.speech_started.
+Reports the agent's interrupt-to-silence time, the time until the server
+receives response.cancel, and the audio_end_ms sent in the truncate event.
+
+Usage (from backend/):
+    python -m benchmarks.bench_barge_in [--interrupt-ms 500] [--rounds 20]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+
+from .fake_realtime import FakeRealtimeServer
+
+FRAME_MS = 20
+DELTA = base64.b64encode(bytes(24_000 * 2 * FRAME_MS // 1000)).decode()
+
+
+async def _play(agent, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(agent.next_playback_frame(), timeout=0.05)
+        except asyncio.TimeoutError:
+            continue
+        await asyncio.sleep(FRAME_MS / 1000)
+
+
+async def _round(server: FakeRealtimeServer, agent, item_id: str, interrupt_ms: int) -> dict:
+    server.received.clear()
+    await server.push({"type": "response.created"})
+    # The model generates faster than real time, so the whole reply is queued up front
+    for _ in range(100):
+        await server.push({"type": "response.audio.delta", "item_id": item_id, "content_index": 0, "delta": DELTA})
+    await asyncio.sleep(interrupt_ms / 1000)
+
+    sent_at = time.perf_counter()
+    await server.push({"type": "input_audio_buffer.speech_started"})
+    while not any(m.get("type") == "response.cancel" for m in server.received):
+        await asyncio.sleep(0.0005)
+    cancel_ms = (time.perf_counter() - sent_at) * 1000
+    await asyncio.sleep(0.05)
+    truncate = next((m for m in server.received if m.get("type") == "conversation.item.truncate"), {})
+    await server.push({"type": "response.done"})
+    return {"cancel_received_ms": cancel_ms, "audio_end_ms": truncate.get("audio_end_ms")}
+
+
+async def run(interrupt_ms: int, rounds: int) -> dict:
+    async with FakeRealtimeServer() as server:
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        from app import voice_agent
+
+        voice_agent.REALTIME_URL = server.url
+        agent = voice_agent.VoiceAgent("bench", "", "", local_vad=False)
+        runner = asyncio.create_task(agent.start())
+        while not agent.is_active:
+            await asyncio.sleep(0.01)
+        stop = asyncio.Event()
+        player = asyncio.create_task(_play(agent, stop))
+
+        results = [await _round(server, agent, f"item_{i}", interrupt_ms) for i in range(rounds)]
+
+        stop.set()
+        await player
+        await agent.stop()
+        await asyncio.gather(runner, return_exceptions=True)
+
+    cancel = sorted(r["cancel_received_ms"] for r in results)
+    return {
+        "rounds": rounds,
+        "interrupt_after_ms": interrupt_ms,
+        **agent.barge_in_stats(),
+        "cancel_received_p50_ms": cancel[len(cancel) // 2],
+        "cancel_received_max_ms": cancel[-1],
+        "audio_end_ms": [r["audio_end_ms"] for r in results[:5]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interrupt-ms", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.interrupt_ms, args.rounds)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
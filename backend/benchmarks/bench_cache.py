@@ -0,0 +1,72 @@
+"""Cache hit rate as the worker count grows, per-process vs shared tier.
+
+A fixed total of lookups over a fixed key set is split across the worker
+processes, which fill the cache on a miss (like JWKS, rooms or extracted
+text). With a per-process cache every worker pays its own misses, so the hit
+rate drops as workers are added. With the shared SQLite tier it stays flat.
+
+Usage (from backend/):
+    python -m benchmarks.bench_cache [--workers 1 2 4 8] [--keys 200] [--lookups 8000]
+"""
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+
+def _worker(path: str, shared: bool, keys: int, lookups: int, seed: int, value_bytes: int) -> dict:
+    from app.cache import Cache, SqliteTier
+
+    cache = Cache("bench", ttl=600, max_entries=keys, shared=SqliteTier(path) if shared else False)
+    rng = random.Random(seed)
+    value = "x" * value_bytes
+    started = time.perf_counter()
+    for _ in range(lookups):
+        key = f"k{rng.randrange(keys)}"
+        if cache.get(key) is None:
+            cache.set(key, value)
+    stats = cache.stats()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def run(workers: int, shared: bool, keys: int, lookups: int, value_bytes: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.starmap(
+                _worker, [(path, shared, keys, lookups // workers, seed, value_bytes) for seed in range(workers)]
+            )
+    hits = sum(r["local_hits"] + r["shared_hits"] for r in results)
+    total = hits + sum(r["misses"] for r in results)
+    return {
+        "workers": workers,
+        "backend": "sqlite" if shared else "memory",
+        "hit_rate": hits / total,
+        "misses": total - hits,
+        "shared_hits": sum(r["shared_hits"] for r in results),
+        "lookups_per_sec": lookups / max(r["seconds"] for r in results),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=8000, help="total across workers")
+    parser.add_argument("--value-bytes", type=int, default=4096)
+    args = parser.parse_args()
+    results = [
+        run(n, shared, args.keys, args.lookups, args.value_bytes)
+        for shared in (False, True)
+        for n in args.workers
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Size, transfer and decode cost of packed extracted text against plain text.
+
+Compares the old plain text column with textpack (deflate, without and with a
+preset dictionary) over a set of extracted texts:
+  stored_bytes   bytes held by the column (plain: UTF-8; TOAST may shrink it,
+                 use --db-url to measure that)
+  wire_bytes     response body: JSON for plain text, hex bytea in JSON, and
+                 raw application/octet-stream as the backend now reads it
+  decode_ms      json.loads of the plain response vs. inflating the whole text
+                 or only its first --prefix-chars characters
+  pack_ms        compression cost, paid once per unique document
+
+The dictionary is trained on every other text and measured on the rest, so
+the figures are not flattered by texts it has already seen. Texts come from
+the generated corpus (benchmarks/corpus.py), a directory of documents, or a
+sample of the live database (SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY).
+
+With --db-url the texts are also loaded into a temporary table, and
+pg_column_size is reported for the plain text after TOAST compression and for
+the packed bytea.
+
+--write-dict saves the trained dictionary. --publish-dict stores it as the
+next text_dictionaries row, which workers use for new texts after restart.
+
+Usage (from backend/):
+    python -m benchmarks.bench_compression [--sizes small medium large] [--texts-dir DIR]
+        [--from-store 200] [--prefix-chars 4000] [--repeat 5] [--db-url postgresql://...]
+        [--write-dict dict.bin] [--publish-dict] [--output results.json]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app import textpack
+from app.extraction import extract_text
+
+from .corpus import SIZES, build_corpus
+
+
+def _best_ms(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def _corpus_texts(sizes: List[str]) -> List[Tuple[str, str]]:
+    return [(name, extract_text(data, mime, name) or "") for name, mime, data, _ in build_corpus(sizes)]
+
+
+def _dir_texts(texts_dir: str) -> List[Tuple[str, str]]:
+    texts = []
+    for name in sorted(os.listdir(texts_dir)):
+        path = os.path.join(texts_dir, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            texts.append((name, extract_text(data, mimetypes.guess_type(name)[0] or "", name) or ""))
+    return texts
+
+
+def _store_texts(limit: int) -> List[Tuple[str, str]]:
+    import httpx
+
+    supabase_url = os.environ["SUPABASE_URL"].rstrip("/")
+    service_key = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+    headers = {"Authorization": f"Bearer {service_key}", "apikey": service_key}
+    texts = []
+    with httpx.Client(timeout=60) as client:
+        for table, column in (("files", "extracted_text"), ("extracted_texts", "text")):
+            r = client.get(f"{supabase_url}/rest/v1/{table}", headers=headers,
+                           params={"select": f"id:{'id' if table == 'files' else 'content_hash'},{column}",
+                                   column: "not.is.null", "limit": str(limit)})
+            r.raise_for_status()
+            texts.extend((f"{table}/{row['id']}", row[column]) for row in r.json())
+    return texts[:limit]
+
+
+def _measure(texts: List[str], pack: Callable[[str], bytes], dictionaries: Dict[int, bytes],
+             prefix_chars: int, repeat: int) -> dict:
+    totals = {"stored_bytes": 0, "wire_bytes_json_hex": 0, "wire_bytes_binary": 0,
+              "pack_ms": 0.0, "decode_ms": 0.0, "decode_prefix_ms": 0.0}
+    for text in texts:
+        blob = pack(text)
+        assert textpack.unpack(blob, dictionaries) == text
+        totals["stored_bytes"] += len(blob)
+        totals["wire_bytes_json_hex"] += len(json.dumps([{"text_z": "\\x" + blob.hex()}]))
+        totals["wire_bytes_binary"] += len(blob)
+        totals["pack_ms"] += _best_ms(lambda: pack(text), repeat)
+        totals["decode_ms"] += _best_ms(lambda: textpack.unpack(blob, dictionaries), repeat)
+        totals["decode_prefix_ms"] += _best_ms(lambda: textpack.unpack(blob, dictionaries, prefix_chars), repeat)
+    return totals
+
+
+def _measure_plain(texts: List[str], repeat: int) -> dict:
+    totals = {"stored_bytes": 0, "wire_bytes_json": 0, "decode_ms": 0.0}
+    for text in texts:
+        body = json.dumps([{"text": text}])
+        totals["stored_bytes"] += len(text.encode("utf-8"))
+        totals["wire_bytes_json"] += len(body.encode("utf-8"))
+        totals["decode_ms"] += _best_ms(lambda: json.loads(body), repeat)
+    return totals
+
+
+async def _db_sizes(db_url: str, texts: List[str], blobs: List[bytes]) -> dict:
+    import asyncpg
+
+    conn = await asyncpg.connect(db_url)
+    try:
+        await conn.execute("CREATE TEMP TABLE bench_texts (text text, text_z bytea)")
+        await conn.execute("ALTER TABLE bench_texts ALTER COLUMN text_z SET STORAGE EXTERNAL")
+        await conn.executemany("INSERT INTO bench_texts VALUES ($1, NULL)", [(t,) for t in texts])
+        await conn.executemany("INSERT INTO bench_texts VALUES (NULL, $1)", [(b,) for b in blobs])
+        row = await conn.fetchrow(
+            "SELECT SUM(pg_column_size(text)) AS text_bytes, SUM(pg_column_size(text_z)) AS text_z_bytes FROM bench_texts"
+        )
+        return {"text_column_bytes": row["text_bytes"], "text_z_column_bytes": row["text_z_bytes"]}
+    finally:
+        await conn.close()
+
+
+def _publish_dictionary(dictionary: bytes, trained_on: int) -> int:
+    import httpx
+
+    supabase_url = os.environ["SUPABASE_URL"].rstrip("/")
+    service_key = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+    headers = {"Authorization": f"Bearer {service_key}", "apikey": service_key}
+    with httpx.Client(timeout=30) as client:
+        r = client.get(f"{supabase_url}/rest/v1/text_dictionaries", headers=headers,
+                       params={"select": "id", "order": "id.desc", "limit": "1"})
+        r.raise_for_status()
+        rows = r.json()
+        next_id = (rows[0]["id"] + 1) if rows else 1
+        r = client.post(f"{supabase_url}/rest/v1/text_dictionaries", headers=headers,
+                        json={"id": next_id, "dictionary": "\\x" + dictionary.hex(), "trained_on": trained_on})
+        r.raise_for_status()
+    return next_id
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--texts-dir", help="extract every document in this directory instead of the generated corpus")
+    parser.add_argument("--from-store", type=int, metavar="N", help="sample N texts from the database instead")
+    parser.add_argument("--prefix-chars", type=int, default=4_000, help="prefix length for decode_prefix_ms")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db-url", default=os.getenv("SUPABASE_DB_URL"), help="measure TOAST sizes in this Postgres")
+    parser.add_argument("--write-dict", metavar="PATH", help="save the trained dictionary")
+    parser.add_argument("--publish-dict", action="store_true", help="store the trained dictionary in text_dictionaries")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.from_store:
+        named = _store_texts(args.from_store)
+    elif args.texts_dir:
+        named = _dir_texts(args.texts_dir)
+    else:
+        named = _corpus_texts(args.sizes)
+    texts = [text for _, text in named if text]
+    if not texts:
+        print("No texts to measure", file=sys.stderr)
+        return 1
+    train = texts[::2]
+    test = texts[1::2] or texts
+
+    started = time.perf_counter()
+    dictionary = textpack.train_dictionary(train)
+    train_s = time.perf_counter() - started
+    dictionaries = {1: dictionary}
+
+    variants = {
+        "plain": _measure_plain(test, args.repeat),
+        "deflate": _measure(test, textpack.pack, dictionaries, args.prefix_chars, args.repeat),
+        "deflate_dict": _measure(test, lambda t: textpack.pack(t, 1, dictionary), dictionaries,
+                                 args.prefix_chars, args.repeat),
+    }
+    plain = variants["plain"]
+    for name in ("deflate", "deflate_dict"):
+        v = variants[name]
+        v["stored_ratio"] = round(plain["stored_bytes"] / v["stored_bytes"], 2)
+        v["wire_ratio"] = round(plain["wire_bytes_json"] / v["wire_bytes_binary"], 2)
+    for v in variants.values():
+        for key, value in v.items():
+            if key.endswith("_ms"):
+                v[key] = round(value, 3)
+
+    result: dict = {
+        "benchmark": "compression",
+        "texts": len(texts),
+        "measured": len(test),
+        "measured_chars": sum(len(t) for t in test),
+        "prefix_chars": args.prefix_chars,
+        "dictionary": {"bytes": len(dictionary), "trained_on": len(train), "train_s": round(train_s, 2)},
+        "variants": variants,
+    }
+    if args.db_url:
+        blobs = [textpack.pack(t, 1, dictionary) for t in test]
+        result["db"] = asyncio.run(_db_sizes(args.db_url, test, blobs))
+    if args.write_dict:
+        with open(args.write_dict, "wb") as f:
+            f.write(dictionary)
+    if args.publish_dict:
+        # Trained on everything for production; the split above is only for honest numbers
+        full = textpack.train_dictionary(texts)
+        result["published_dictionary_id"] = _publish_dictionary(full, len(texts))
+
+    out = json.dumps(result, indent=2)
+    print(out)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Text extraction and context building cost, with stored-baseline regression checks.
+
+Extracts a generated corpus (benchmarks/corpus.py: PDF, DOCX and plain text at
+small/medium/large sizes) with app.extraction.extract_text and counts each
+text's tokens as the store does (count_ms), then times the _build_context of
+vault_ai and server_ai over the extracted texts at 50k/200k/1M character
+budgets, with a token budget of a quarter of each. Reports MB/s, pages/s (PDF)
+or paragraphs/s (DOCX), peak traced memory and per-call context time.
+
+With a baseline file present, every metric is compared against it and the run
+exits 1 if any is worse by more than --max-regression (a fraction); timings of
+cases under a millisecond are reported but not gated. Baselines
+are machine-specific: regenerate them with --save-baseline on the machine
+that runs the check.
+
+Usage (from backend/):
+    python -m benchmarks.bench_extraction [--sizes small medium large] [--repeat 5]
+        [--baseline benchmarks/baselines/extraction.json] [--max-regression 0.25]
+        [--save-baseline] [--write-corpus DIR] [--output results.json]
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from .corpus import SIZES, build_corpus
+
+CHAT_MODEL = "gpt-4o-mini"
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "baselines", "extraction.json")
+BUDGETS = (50_000, 200_000, 1_000_000)
+MIN_ROUND_SECONDS = 0.05  # calls are repeated until a round lasts at least this long
+MIN_GATED_MS = 1.0  # timings of faster cases are reported but too noisy to fail a run on
+
+# metric -> True when a larger value is better
+METRICS = {
+    "mb_per_s": True,
+    "pages_per_s": True,
+    "paragraphs_per_s": True,
+    "peak_mb": False,
+    "ms_per_call": False,
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _seconds_per_call(fn: Callable[[], object], rounds: int) -> float:
+    """Best per-call CPU time over `rounds` rounds.
+
+    Both the parsers and _build_context are single-threaded and CPU bound, so
+    process time measures them without the noise of other load on the host,
+    and the minimum is the least noisy for regression checks.
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        calls = 0
+        started = time.process_time()
+        while True:
+            fn()
+            calls += 1
+            elapsed = time.process_time() - started
+            if elapsed >= MIN_ROUND_SECONDS:
+                break
+        best = min(best, elapsed / calls)
+    return best
+
+
+def _peak_mb(fn: Callable[[], object]) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def _builders() -> Dict[str, Callable]:
+    from app import server_ai, vault_ai
+
+    return {"vault_ai": vault_ai._build_context, "server_ai": server_ai._build_context}
+
+
+def run(args: argparse.Namespace) -> dict:
+    from app import tokens
+    from app.extraction import extract_text
+
+    corpus = build_corpus(args.sizes, seed=args.seed)
+    if args.write_corpus:
+        os.makedirs(args.write_corpus, exist_ok=True)
+        for name, _, data, _ in corpus:
+            with open(os.path.join(args.write_corpus, name), "wb") as f:
+                f.write(data)
+
+    cases: Dict[str, dict] = {}
+    texts: List[tuple] = []
+    for name, mime, data, units in corpus:
+        call = lambda: extract_text(data, mime, name)
+        text = call()
+        if not text:
+            raise RuntimeError(f"Extracted nothing from {name}")
+        seconds = _seconds_per_call(call, args.repeat)
+        case = {
+            "bytes": len(data),
+            "chars": len(text),
+            "seconds": seconds,
+            "mb_per_s": len(data) / (1024 * 1024) / seconds,
+            "peak_mb": _peak_mb(call),
+        }
+        if name.endswith(".pdf"):
+            case["pages_per_s"] = units / seconds
+        elif name.endswith(".docx"):
+            case["paragraphs_per_s"] = units / seconds
+        totals = tokens.chunk_counts(text)
+        case["tokens"] = tokens.total(totals)
+        case["count_ms"] = _seconds_per_call(lambda: tokens.chunk_counts(text), args.repeat) * 1000
+        cases[f"extract/{name}"] = case
+        texts.append((name, text, totals))
+
+    # Newest-first order in the routes is arbitrary here; large texts last so small budgets fill with several files
+    texts.sort(key=lambda item: len(item[1]))
+    for module, build in _builders().items():
+        for budget in BUDGETS:
+            call = lambda: build(texts, budget, budget // 4, True, CHAT_MODEL)
+            _, included, used, used_tokens = call()
+            cases[f"context/{module}/{budget}"] = {
+                "files": len(included),
+                "chars": used,
+                "tokens": used_tokens,
+                "ms_per_call": _seconds_per_call(call, args.repeat) * 1000,
+                "peak_mb": _peak_mb(call),
+            }
+
+    return {
+        "commit": _git_commit(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpu": platform.processor()},
+        "config": {"sizes": args.sizes, "repeat": args.repeat, "seed": args.seed},
+        "cases": cases,
+    }
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Human-readable lines for every metric worse than the baseline by more than max_regression."""
+    regressions = []
+    # Context cases are built from every extracted document, so they only compare across the same sizes
+    same_corpus = baseline.get("config", {}).get("sizes") == result["config"]["sizes"]
+    for key, case in result["cases"].items():
+        base = baseline.get("cases", {}).get(key)
+        if base is None or (key.startswith("context/") and not same_corpus):
+            continue
+        base_ms = base.get("ms_per_call", base.get("seconds", 0) * 1000)
+        for metric, higher_is_better in METRICS.items():
+            if metric not in case or not base.get(metric):
+                continue
+            if metric != "peak_mb" and base_ms < MIN_GATED_MS:
+                continue
+            now, before = case[metric], base[metric]
+            change = (before - now) / before if higher_is_better else (now - before) / before
+            if change > max_regression:
+                regressions.append(f"{key} {metric}: {before:.4g} -> {now:.4g} ({change:+.0%} worse)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds per case (the best is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="fail when a metric is worse than the baseline by more than this fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline instead of checking it")
+    parser.add_argument("--write-corpus", metavar="DIR", help="also write the generated documents here")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            f.write(json.dumps(result, indent=2, sort_keys=True) + "\n")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        result["baseline"] = {"commit": baseline.get("commit"), "max_regression": args.max_regression,
+                              "regressions": compare(result, baseline, args.max_regression)}
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if result.get("baseline", {}).get("regressions"):
+        print("\n".join(["Regressions against baseline:"] + result["baseline"]["regressions"]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
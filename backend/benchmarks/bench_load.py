@@ -0,0 +1,245 @@
+"""End-to-end load test of app.main:app against local fake upstreams.
+
+Boots the fake Supabase/OpenAI/Daily server and the fake realtime socket in
+this process, starts the API under uvicorn as a subprocess pointed at them,
+then drives concurrent load at /vaults/{id}/chat, /servers/{id}/chat and
+/voice/join. Prints one JSON document per run (RPS, p50/p95/p99, status
+codes and peak RSS of the API processes), keyed by commit so runs can be
+diffed across commits.
+
+Usage (from backend/):
+    python -m benchmarks.bench_load [--scenarios vault_chat server_chat voice_join]
+        [--concurrency 16] [--duration 10] [--workers 1] [--files 20] [--file-kb 20]
+        [--corpus-dir DIR] [--llm-latency-ms 200] [--cold] [--output results.json]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import httpx
+
+from .fake_realtime import FakeRealtimeServer
+from .fake_services import FakeServices, generate_corpus, load_corpus
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _descendants(pid: int) -> List[int]:
+    pids = [pid]
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                for child in f.read().split():
+                    pids.extend(_descendants(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def _peak_rss_kb(pid: int) -> Dict[str, int]:
+    """VmHWM (peak resident set) of the server and its worker processes."""
+    peaks = []
+    for p in _descendants(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peaks.append(int(line.split()[1]))
+        except OSError:
+            pass
+    return {"total": sum(peaks), "max_process": max(peaks, default=0), "processes": len(peaks)}
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _scenarios(token: Callable[[int], str]) -> Dict[str, Callable[[int], tuple]]:
+    """name -> (n -> (path, json body, headers))"""
+    return {
+        "vault_chat": lambda n: (
+            "/vaults/bench-vault/chat", {"message": "What do these files cover?"}, {"Authorization": f"Bearer {token(n)}"},
+        ),
+        "server_chat": lambda n: (
+            "/servers/bench-server/chat", {"message": "Summarize the shared files", "channel_id": "bench-channel"},
+            {"Authorization": f"Bearer {token(n)}"},
+        ),
+        "voice_join": lambda n: (
+            "/voice/join", {"channel_id": f"bench-channel-{n % 8}", "user_name": f"user-{n % 64}"},
+            {"Authorization": f"Bearer {token(n)}"},
+        ),
+    }
+
+
+async def _drive(client: httpx.AsyncClient, build: Callable[[int], tuple], concurrency: int, duration: float) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    counter = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal counter
+        while time.perf_counter() < deadline:
+            counter += 1
+            path, body, headers = build(counter)
+            started = time.perf_counter()
+            try:
+                r = await client.post(path, json=body, headers=headers)
+                status = str(r.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "status_codes": statuses,
+    }
+
+
+async def _wait_ready(client: httpx.AsyncClient, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API exited with code {proc.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API did not become ready")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    corpus = load_corpus(args.corpus_dir) if args.corpus_dir else generate_corpus(args.files, args.file_kb * 1024)
+    fakes = FakeServices(
+        corpus=corpus,
+        llm_latency=args.llm_latency_ms / 1000,
+        upstream_latency=args.upstream_latency_ms / 1000,
+        persist_extracted_text=not args.cold,
+    )
+    async with fakes, FakeRealtimeServer() as realtime:
+        # A handful of users so auth caching behaves as it would with real traffic
+        tokens = [fakes.sign_token(f"bench-user-{i}") for i in range(32)]
+        port = _free_port()
+        with tempfile.TemporaryDirectory() as state_dir:
+            env = {
+                **os.environ,
+                "SUPABASE_URL": fakes.url,
+                "SUPABASE_ANON_KEY": "bench-anon",
+                "SUPABASE_SERVICE_ROLE_KEY": "bench-service",
+                "OPENAI_API_KEY": "bench",
+                "OPENAI_BASE_URL": f"{fakes.url}/v1",
+                "OPENAI_REALTIME_URL": realtime.url,
+                "DAILY_API_KEY": "bench",
+                "DAILY_API_URL": f"{fakes.url}/daily",
+                "SHARED_STATE_DIR": state_dir,
+                "ENVIRONMENT": "benchmark",
+            }
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=BACKEND_DIR, env=env,
+            )
+            try:
+                limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+                    await _wait_ready(client, proc)
+                    rss_idle = _peak_rss_kb(proc.pid)
+                    scenarios = _scenarios(lambda n: tokens[n % len(tokens)])
+                    results = {}
+                    for name in args.scenarios:
+                        if args.warmup:
+                            await _drive(client, scenarios[name], args.concurrency, args.warmup)
+                        results[name] = await _drive(client, scenarios[name], args.concurrency, args.duration)
+                    rss = _peak_rss_kb(proc.pid)
+            finally:
+                proc.terminate()
+                try:
+                    # Off the loop: the fakes must keep answering while the API flushes on shutdown
+                    await asyncio.to_thread(proc.wait, 10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    return {
+        "commit": _git_commit(),
+        "config": {
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "files": len(corpus),
+            "corpus_bytes": sum(len(v) for v in corpus.values()),
+            "llm_latency_ms": args.llm_latency_ms,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "cold": args.cold,
+        },
+        "scenarios": results,
+        "peak_rss_mb": {
+            "idle_total": rss_idle["total"] / 1024,
+            "total": rss["total"] / 1024,
+            "max_process": rss["max_process"] / 1024,
+            "processes": rss["processes"],
+        },
+        "upstream_requests": dict(sorted(fakes.requests.items())),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=["vault_chat", "server_chat", "voice_join"],
+                        choices=["vault_chat", "server_chat", "voice_join"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--file-kb", type=int, default=20)
+    parser.add_argument("--corpus-dir", help="serve these files instead of generated text")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0, help="added to every Supabase/Daily call")
+    parser.add_argument("--cold", action="store_true", help="never persist extracted text or links in the fake database (the API host cache still dedups by content)")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
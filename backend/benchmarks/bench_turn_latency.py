@@ -0,0 +1,87 @@
+"""Per-turn latency spans against the local fake realtime server.
+
+Each turn the server reports input_audio_buffer.speech_stopped, then a
+transcript and a streamed reply after configurable upstream delays, while a
+consumer plays the reply out in real time. Prints the agent's per-channel
+latency histograms, which should show the injected upstream delay in
+speech_to_first_audio_ms and only playout time in last_audio_to_playout_ms.
+
+Usage (from backend/):
+    python -m benchmarks.bench_turn_latency [--first-audio-ms 300] [--turns 20]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import json
+import os
+
+from .fake_realtime import FakeRealtimeServer
+
+FRAME_MS = 20
+DELTA = base64.b64encode(bytes(24_000 * 2 * FRAME_MS // 1000)).decode()
+
+
+async def _play(agent, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(agent.next_playback_frame(), timeout=0.05)
+        except asyncio.TimeoutError:
+            continue
+        await asyncio.sleep(FRAME_MS / 1000)
+
+
+async def _turn(server: FakeRealtimeServer, agent, item_id: str, transcript_ms: int, first_audio_ms: int, frames: int):
+    await server.push({"type": "input_audio_buffer.speech_stopped"})
+    await asyncio.sleep(transcript_ms / 1000)
+    await server.push({"type": "conversation.item.input_audio_transcription.completed", "transcript": "hello"})
+    await asyncio.sleep(max(first_audio_ms - transcript_ms, 0) / 1000)
+    await server.push({"type": "response.created"})
+    for _ in range(frames):
+        await server.push({"type": "response.audio.delta", "item_id": item_id, "content_index": 0, "delta": DELTA})
+    await server.push({"type": "response.done"})
+    # Wait for the reply to finish playing before the user speaks again
+    while agent._turn:
+        await asyncio.sleep(0.005)
+
+
+async def run(transcript_ms: int, first_audio_ms: int, frames: int, turns: int) -> dict:
+    async with FakeRealtimeServer() as server:
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        from app import voice_agent
+
+        voice_agent.REALTIME_URL = server.url
+        agent = voice_agent.VoiceAgent("bench", "", "", local_vad=False)
+        runner = asyncio.create_task(agent.start())
+        while not agent.is_active:
+            await asyncio.sleep(0.01)
+        stop = asyncio.Event()
+        player = asyncio.create_task(_play(agent, stop))
+
+        for i in range(turns):
+            await _turn(server, agent, f"item_{i}", transcript_ms, first_audio_ms, frames)
+
+        stop.set()
+        await player
+        await agent.stop()
+        await asyncio.gather(runner, return_exceptions=True)
+
+    return {
+        "injected": {"transcript_ms": transcript_ms, "first_audio_ms": first_audio_ms, "reply_ms": frames * FRAME_MS},
+        **agent.latency.snapshot(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcript-ms", type=int, default=150)
+    parser.add_argument("--first-audio-ms", type=int, default=300)
+    parser.add_argument("--frames", type=int, default=25, help="20ms reply deltas per turn")
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.transcript_ms, args.first_audio_ms, args.frames, args.turns))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Measure latency added by the VoiceAgent pump, its idle CPU use and audio aggregation.
+
+Usage (from backend/):
+    python -m benchmarks.bench_voice_pump [--messages 2000]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from .fake_realtime import FakeRealtimeServer
+
+
+async def run(messages: int) -> dict:
+    async with FakeRealtimeServer() as server:
+        os.environ["OPENAI_REALTIME_URL"] = server.url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        from app import voice_agent
+
+        voice_agent.REALTIME_URL = server.url
+        agent = voice_agent.VoiceAgent("bench", "", "", local_vad=False)
+        runner = asyncio.create_task(agent.start())
+        while not agent.is_active:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+
+        # Idle: no traffic in either direction
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        await asyncio.sleep(1.0)
+        idle_cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+
+        # Inbound: server events paced at ~1ms
+        for i in range(messages):
+            await server.push({"type": "response.audio.delta", "delta": "", "seq": i})
+            await asyncio.sleep(0.001)
+
+        # Outbound: 20ms PCM16 frames at 24kHz, paced at ~1ms
+        frame = bytes(960)
+        for _ in range(messages):
+            await agent.send_audio(frame)
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.2)
+
+        result = {"idle_cpu_fraction": idle_cpu, **agent.stats.snapshot(), "audio": agent.audio_stats()}
+        await agent.stop()
+        await asyncio.gather(runner, return_exceptions=True)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.messages)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
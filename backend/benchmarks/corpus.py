@@ -0,0 +1,120 @@
+"""Reproducible PDF, DOCX and text documents for extraction benchmarks.
+
+Everything is generated from a seed, so the same arguments give byte-identical
+text content on every machine. PDFs are written directly (Helvetica text
+pages, no extra dependency); DOCX files use python-docx.
+"""
+from __future__ import annotations
+import io
+import random
+from typing import Dict, List, Tuple
+
+VOCABULARY = (
+    "the of and to in is for on that with as by this are be from at or an it was which "
+    "vault server channel file summary context budget latency throughput storage extraction "
+    "document paragraph section figure table revenue roadmap meeting agenda decision "
+    "customer product release engineering design review quarterly planning migration index"
+).split()
+
+LINES_PER_PAGE = 50
+WORDS_PER_LINE = 12
+
+# name -> (kind, units); units are pages for PDF, paragraphs for DOCX, bytes for text
+SIZES: Dict[str, Dict[str, int]] = {
+    "small": {"pdf": 5, "docx": 50, "txt": 100_000},
+    "medium": {"pdf": 50, "docx": 500, "txt": 1_000_000},
+    "large": {"pdf": 200, "docx": 2_000, "txt": 10_000_000},
+}
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def make_text(size: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    lines: List[str] = []
+    total = 0
+    while total < size:
+        line = _sentence(rng, WORDS_PER_LINE)
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines).encode()[:size]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """A minimal PDF with `pages` pages of Helvetica text lines."""
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # filled in once the page tree exists
+    page_tree = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for _ in range(pages):
+        lines = [_sentence(rng, WORDS_PER_LINE) for _ in range(LINES_PER_PAGE)]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        ops += [f"({_pdf_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (page_tree, font, content)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % page_tree
+    objects[page_tree - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+def make_docx(paragraphs: int, seed: int = 0) -> bytes:
+    from docx import Document
+
+    rng = random.Random(seed)
+    doc = Document()
+    for i in range(paragraphs):
+        if i % 25 == 0:
+            doc.add_heading(_sentence(rng, 4), level=2)
+        doc.add_paragraph(" ".join(_sentence(rng, WORDS_PER_LINE) for _ in range(4)))
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+
+
+def build_corpus(sizes: List[str], seed: int = 0) -> List[Tuple[str, str, bytes, int]]:
+    """[(filename, mime, data, units)] for every kind at each requested size."""
+    corpus = []
+    for size in sizes:
+        for kind, units in SIZES[size].items():
+            maker = {"pdf": make_pdf, "docx": make_docx, "txt": make_text}[kind]
+            corpus.append((f"{size}.{kind}", MIME_TYPES[kind], maker(units, seed), units))
+    return corpus
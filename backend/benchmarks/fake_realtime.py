@@ -0,0 +1,53 @@
+"""Local stand-in for the OpenAI Realtime websocket, for benchmarks.
+
+Acknowledges session.update with session.updated, records everything the
+client sends, and lets the benchmark push arbitrary server events.
+"""
+from __future__ import annotations
+import asyncio
+import json
+from typing import List
+
+from websockets.asyncio.server import serve
+
+
+class FakeRealtimeServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.received: List[dict] = []
+        self.connections: set = set()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/v1/realtime"
+
+    async def __aenter__(self) -> "FakeRealtimeServer":
+        self._server = await serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, ws) -> None:
+        self.connections.add(ws)
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                self.received.append(message)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if message.get("type") == "session.update":
+                    await ws.send(json.dumps({"type": "session.updated", "session": message.get("session", {})}))
+        finally:
+            self.connections.discard(ws)
+
+    async def push(self, message: dict) -> None:
+        """Send a server event to every connected client."""
+        payload = json.dumps(message)
+        for ws in list(self.connections):
+            await ws.send(payload)
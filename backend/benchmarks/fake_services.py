@@ -0,0 +1,303 @@
+"""Local stand-ins for Supabase, OpenAI chat completions and Daily, for benchmarks.
+
+One HTTP server answers:
+  /auth/v1/.well-known/jwks.json      JWKS for tokens from sign_token()
+  /rest/v1/files|server_files|channels|vault_summaries|extracted_texts|text_dictionaries
+                                      PostgREST subset
+  /storage/v1/object/{bucket}/{path}  the corpus
+  /v1/chat/completions                canned completion after llm_latency
+  /daily/rooms, /daily/meeting-tokens Daily REST subset
+
+The corpus is generated text unless corpus_dir is given, in which case every
+file in it is served (PDF and DOCX included) with a MIME type from its name.
+"""
+from __future__ import annotations
+import asyncio
+import mimetypes
+import os
+import random
+import re
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import uvicorn
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, Request, Response
+from jose import jwk, jwt
+
+KID = "bench-key"
+WORDS = (
+    "latency throughput vault server channel voice agent summary context storage token "
+    "budget worker cache request response stream buffer audio model prompt file text"
+).split()
+
+
+def generate_corpus(files: int, file_bytes: int, seed: int = 7) -> Dict[str, bytes]:
+    rng = random.Random(seed)
+    corpus = {}
+    for i in range(files):
+        words: List[str] = []
+        size = 0
+        while size < file_bytes:
+            word = rng.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+        corpus[f"doc_{i:03d}.txt"] = " ".join(words).encode()[:file_bytes]
+    return corpus
+
+
+def load_corpus(corpus_dir: str) -> Dict[str, bytes]:
+    corpus = {}
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+class FakeServices:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        corpus: Optional[Dict[str, bytes]] = None,
+        llm_latency: float = 0.0,
+        upstream_latency: float = 0.0,
+        persist_extracted_text: bool = True,  # False: PATCHes are dropped, every request re-extracts
+    ):
+        self.host = host
+        self.port = port
+        self.corpus = corpus if corpus is not None else generate_corpus(20, 20_000)
+        self.llm_latency = llm_latency
+        self.upstream_latency = upstream_latency
+        self.persist_extracted_text = persist_extracted_text
+        self.requests: Dict[str, int] = {}
+        self._patched: Dict[str, dict] = {}
+        self._vault_summaries: Dict[str, dict] = {}
+        self._texts: Dict[str, dict] = {}
+        self._dictionaries: Dict[int, dict] = {}
+        self._rooms: Dict[str, dict] = {}
+        self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._server: Optional[uvicorn.Server] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def sign_token(self, sub: str, ttl: int = 3600) -> str:
+        pem = self._key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        now = int(time.time())
+        return jwt.encode(
+            {"sub": sub, "role": "authenticated", "iat": now, "exp": now + ttl},
+            pem, algorithm="RS256", headers={"kid": KID},
+        )
+
+    def _jwks(self) -> dict:
+        pem = self._key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        key = jwk.construct(pem, "RS256").to_dict()
+        key.update({"kid": KID, "alg": "RS256", "use": "sig"})
+        return {"keys": [key]}
+
+    def _file_rows(self, prefix: str) -> List[dict]:
+        rows = []
+        for i, (name, data) in enumerate(self.corpus.items()):
+            row_id = f"{prefix}{i:04d}"
+            stamp = f"2025-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}+00:00"
+            patched = self._patched.get(row_id, {})
+            stored = self._texts.get(patched.get("content_hash"))
+            rows.append({
+                "id": row_id,
+                "name": name,
+                "file_path": f"bench/{name}",
+                "file_type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+                "file_size": len(data),
+                "size": str(len(data)),
+                "uploaded_at": stamp,
+                "created_at": stamp,
+                "updated_at": stamp,
+                "uploaded_by": "bench-user",
+                "content_hash": patched.get("content_hash"),
+                "extracted_text": patched.get("extracted_text"),
+                "text_extracted_at": stamp if "extracted_text" in patched else None,
+                "summary": patched.get("summary"),
+                "summary_source_hash": patched.get("summary_source_hash"),
+                # Embedded through the content_hash foreign key, as select=...,extracted_texts(...) returns it
+                "extracted_texts": {"token_chunks": stored.get("token_chunks"), "tokenizer": stored.get("tokenizer")} if stored else None,
+            })
+        return rows[::-1]
+
+    @staticmethod
+    def _page(rows: List[dict], request: Request, sort_column: str) -> List[dict]:
+        """Apply the keyset cursor and limit the backend sends (rows are already newest first)."""
+        cursor = re.search(r'\.lt\."([^"]+)",and\(\w+\.eq\."[^"]+",id\.lt\."([^"]+)"\)', request.query_params.get("or", ""))
+        if cursor:
+            ts, row_id = cursor.groups()
+            rows = [r for r in rows if (r[sort_column], r["id"]) < (ts, row_id)]
+        limit = request.query_params.get("limit")
+        return rows[:int(limit)] if limit else rows
+
+    def _app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def count(request: Request, call_next):
+            if self.upstream_latency and not request.url.path.startswith("/v1/"):
+                await asyncio.sleep(self.upstream_latency)
+            response = await call_next(request)
+            route = request.scope.get("route")
+            key = f"{request.method} {route.path if route else request.url.path}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+            return response
+
+        @app.get("/auth/v1/.well-known/jwks.json")
+        async def jwks():
+            return self._jwks()
+
+        @app.get("/rest/v1/files")
+        async def files(request: Request):
+            rows = self._file_rows("vf")
+            row_id = request.query_params.get("id", "").removeprefix("eq.")
+            if row_id:
+                return [r for r in rows if r["id"] == row_id]
+            return self._page(rows, request, "uploaded_at")
+
+        @app.patch("/rest/v1/files")
+        async def patch_files(request: Request):
+            body = await request.json()
+            row_id = request.query_params.get("id", "").removeprefix("eq.")
+            if self.persist_extracted_text:
+                self._patched.setdefault(row_id, {}).update(body)
+            return Response(status_code=204)
+
+        @app.get("/rest/v1/server_files")
+        async def server_files(request: Request):
+            return self._page(self._file_rows("sf"), request, "created_at")
+
+        @app.patch("/rest/v1/server_files")
+        async def patch_server_files(request: Request):
+            return await patch_files(request)
+
+        @app.get("/rest/v1/extracted_texts")
+        async def extracted_texts(request: Request):
+            row = self._texts.get(request.query_params.get("content_hash", "").removeprefix("eq."))
+            if request.headers.get("accept") == "application/octet-stream":
+                # Raw bytea, as PostgREST serves a single binary column
+                return Response(content=bytes.fromhex(row["text_z"][2:]) if row else b"", media_type="application/octet-stream")
+            return [row] if row else []
+
+        @app.patch("/rest/v1/extracted_texts")
+        async def patch_extracted_text(request: Request):
+            body = await request.json()
+            row = self._texts.get(request.query_params.get("content_hash", "").removeprefix("eq."))
+            if row is not None:
+                row.update(body)
+            return Response(status_code=204)
+
+        @app.get("/rest/v1/text_dictionaries")
+        async def text_dictionaries():
+            return list(self._dictionaries.values())
+
+        @app.post("/rest/v1/extracted_texts")
+        async def upsert_extracted_text(request: Request):
+            body = await request.json()
+            if self.persist_extracted_text:
+                self._texts[body["content_hash"]] = body
+            return Response(status_code=201)
+
+        @app.get("/rest/v1/channels")
+        async def channels(request: Request):
+            return [{"server_id": "bench-server"}]
+
+        @app.get("/rest/v1/vault_summaries")
+        async def vault_summaries(request: Request):
+            row = self._vault_summaries.get(request.query_params.get("vault_id", "").removeprefix("eq."))
+            return [row] if row else []
+
+        @app.post("/rest/v1/vault_summaries")
+        async def upsert_vault_summary(request: Request):
+            body = await request.json()
+            if self.persist_extracted_text:
+                self._vault_summaries[body["vault_id"]] = body
+            return Response(status_code=201)
+
+        @app.post("/rest/v1/{table}")
+        async def insert(table: str):
+            return Response(status_code=201)
+
+        @app.get("/storage/v1/object/{bucket}/{path:path}")
+        async def storage(bucket: str, path: str):
+            data = self.corpus.get(path.split("/")[-1])
+            if data is None:
+                return Response(status_code=404)
+            return Response(content=data, media_type=mimetypes.guess_type(path)[0] or "application/octet-stream")
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            if self.llm_latency:
+                await asyncio.sleep(self.llm_latency)
+            return {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "bench"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Benchmark answer."}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 2, "total_tokens": 2},
+            }
+
+        def room_body(name: str) -> dict:
+            room = self._rooms[name]
+            return {"name": name, "url": f"https://bench.daily.co/{name}", "config": {"exp": room["exp"]}}
+
+        @app.get("/daily/rooms/{name}")
+        async def get_room(name: str):
+            if name not in self._rooms:
+                return Response(status_code=404)
+            return room_body(name)
+
+        @app.post("/daily/rooms")
+        async def create_room(request: Request):
+            body = await request.json()
+            name = body["name"]
+            if name in self._rooms:
+                return Response(status_code=400, content=b'{"error":"invalid-request-error"}')
+            self._rooms[name] = {"exp": body.get("properties", {}).get("exp", int(time.time()) + 86400)}
+            return room_body(name)
+
+        @app.post("/daily/rooms/{name}")
+        async def update_room(name: str, request: Request):
+            body = await request.json()
+            if name not in self._rooms:
+                return Response(status_code=404)
+            self._rooms[name]["exp"] = body.get("properties", {}).get("exp", self._rooms[name]["exp"])
+            return room_body(name)
+
+        @app.post("/daily/meeting-tokens")
+        async def meeting_token():
+            return {"token": uuid.uuid4().hex}
+
+        return app
+
+    async def __aenter__(self) -> "FakeServices":
+        config = uvicorn.Config(self._app(), host=self.host, port=self.port, log_level="warning", lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()
+            await asyncio.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.should_exit = True
+        await self._task
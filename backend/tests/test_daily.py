@@ -0,0 +1,62 @@
+import time
+
+import pytest
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+from app.daily import sign_meeting_token, verify_meeting_token
+
+API_KEY = "test-daily-api-key"
+DOMAIN_ID = "test-domain-id"
+
+
+def _properties(**overrides) -> dict:
+    properties = {
+        "room_name": "vault-room",
+        "user_name": "alice",
+        "is_owner": True,
+        "enable_screenshare": False,
+        "exp": int(time.time()) + 3600,
+    }
+    properties.update(overrides)
+    return properties
+
+
+def test_round_trip():
+    properties = _properties()
+    token = sign_meeting_token(API_KEY, DOMAIN_ID, properties)
+    assert verify_meeting_token(token, API_KEY) == {**properties, "domain_id": DOMAIN_ID}
+
+
+def test_wrong_key_is_rejected():
+    token = sign_meeting_token(API_KEY, DOMAIN_ID, _properties())
+    with pytest.raises(JWTError):
+        verify_meeting_token(token, "another-api-key")
+
+
+def test_expired_token_is_rejected():
+    now = int(time.time())
+    token = sign_meeting_token(API_KEY, DOMAIN_ID, _properties(exp=now - 60), now=now - 3660)
+    with pytest.raises(ExpiredSignatureError):
+        verify_meeting_token(token, API_KEY)
+
+
+def test_claim_names():
+    properties = _properties()
+    token = sign_meeting_token(API_KEY, DOMAIN_ID, properties, now=1_700_000_000)
+    claims = jwt.get_unverified_claims(token)
+    assert claims == {
+        "r": properties["room_name"],
+        "u": properties["user_name"],
+        "o": properties["is_owner"],
+        "ss": properties["enable_screenshare"],
+        "exp": properties["exp"],
+        "d": DOMAIN_ID,
+        "iat": 1_700_000_000,
+    }
+    assert jwt.get_unverified_header(token)["alg"] == "HS256"
+
+
+def test_unset_properties_are_omitted():
+    token = sign_meeting_token(API_KEY, DOMAIN_ID, {"room_name": "vault-room", "exp": int(time.time()) + 60})
+    assert set(jwt.get_unverified_claims(token)) == {"r", "exp", "d", "iat"}
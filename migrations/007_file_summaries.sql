@@ -0,0 +1,45 @@
+-- Migration: Hierarchical File Summaries
+-- Date: 2025-09-20
+-- Description: Adds per-file summaries beside extracted_text and per-vault rollups
+-- so the vault assistant can cover large vaults inside a small context budget
+
+-- Extraction cache columns used by the backend (no-op if already present)
+ALTER TABLE files ADD COLUMN IF NOT EXISTS extracted_text text;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS text_extracted_at timestamptz;
+
+-- Per-file summary tier. summary_source_hash is the SHA-256 of the extracted text
+-- the summary was generated from, so a changed file is re-summarized on next use.
+ALTER TABLE files ADD COLUMN IF NOT EXISTS summary text;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS summary_source_hash text;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS summarized_at timestamptz;
+
+-- Per-vault rollup built from the file summaries. source_hash fingerprints the
+-- set of file summaries it was built from, so it is only rebuilt when one changes.
+CREATE TABLE IF NOT EXISTS vault_summaries (
+  vault_id uuid PRIMARY KEY REFERENCES vaults(id) ON DELETE CASCADE,
+  summary text NOT NULL,
+  source_hash text NOT NULL,
+  file_count integer NOT NULL DEFAULT 0,
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE vault_summaries ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view summaries of vaults they can read" ON vault_summaries
+  FOR SELECT USING (has_vault_perm(vault_id, auth.uid(), 'read'));
+
+-- Writing a rollup needs write access: readers get theirs stored by the backend
+-- with the service role key, so they can't replace it with arbitrary text
+CREATE POLICY "Users can store summaries of vaults they can write" ON vault_summaries
+  FOR INSERT WITH CHECK (has_vault_perm(vault_id, auth.uid(), 'write'));
+
+CREATE POLICY "Users can refresh summaries of vaults they can write" ON vault_summaries
+  FOR UPDATE USING (has_vault_perm(vault_id, auth.uid(), 'write'));
+
+CREATE TRIGGER update_vault_summaries_updated_at
+  BEFORE UPDATE ON vault_summaries
+  FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+COMMENT ON COLUMN files.summary IS 'Short LLM summary of extracted_text used when a vault exceeds the context budget';
+COMMENT ON TABLE vault_summaries IS 'Per-vault rollup summary built from file summaries';
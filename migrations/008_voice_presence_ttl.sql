@@ -0,0 +1,39 @@
+-- Migration: Voice Presence TTL
+-- Date: 2025-09-21
+-- Description: Lets presence rows expire on their own so a crashed writer needs no cleanup write
+
+-- voice_presence comes from 006, which run_migrations does not apply; on a
+-- database without it this migration is a no-op (re-run it after applying 006).
+do $$
+begin
+  if to_regclass('public.voice_presence') is null then
+    raise notice 'public.voice_presence does not exist (006 not applied); skipping';
+    return;
+  end if;
+
+  -- Rows with an expires_at are only visible until then; writers refresh it with a
+  -- heartbeat upsert. NULL keeps existing client-written rows visible as before.
+  alter table public.voice_presence add column if not exists expires_at timestamptz;
+
+  create index if not exists voice_presence_expires_idx on public.voice_presence(expires_at)
+    where expires_at is not null;
+
+  drop policy if exists voice_presence_select on public.voice_presence;
+  create policy voice_presence_select on public.voice_presence
+    for select
+    to authenticated
+    using (expires_at is null or expires_at > now());
+
+  -- Optional housekeeping for expired rows (they are already invisible to readers)
+  create or replace function public.purge_expired_voice_presence()
+  returns integer language sql security definer set search_path = public as $fn$
+    with purged as (
+      delete from public.voice_presence
+      where expires_at is not null and expires_at < now() - interval '1 hour'
+      returning 1
+    )
+    select count(*)::int from purged;
+  $fn$;
+
+  comment on column public.voice_presence.expires_at is 'Row is hidden after this time unless refreshed by its writer';
+end $$;
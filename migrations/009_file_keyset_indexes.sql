@@ -0,0 +1,16 @@
+-- Migration: File Keyset Indexes
+-- Date: 2025-09-28
+-- Description: Composite indexes for the backend's keyset-paginated file listings
+
+-- The chat routes page through files with
+--   order=<ts>.desc.nullslast,id.desc  and  (<ts>, id) < (last_ts, last_id)
+-- so each page is a range scan of one of these indexes instead of a sort of
+-- every file in the vault or server.
+create index if not exists files_vault_uploaded_at_id_idx
+  on public.files (vault_id, uploaded_at desc nulls last, id desc);
+
+create index if not exists server_files_server_created_at_id_idx
+  on public.server_files (server_id, created_at desc nulls last, id desc);
+
+-- Covered by the leading column of the composite index above
+drop index if exists public.idx_server_files_server_id;
@@ -0,0 +1,97 @@
+-- Migration: Content-Addressed Extracted Text
+-- Date: 2025-09-29
+-- Description: One extracted_texts row per unique document, keyed by the SHA-256
+-- of the object bytes, referenced from files and server_files. The same PDF in
+-- many vaults and servers is parsed and stored once.
+
+CREATE TABLE IF NOT EXISTS extracted_texts (
+  content_hash text PRIMARY KEY CHECK (content_hash ~ '^[0-9a-f]{64}$'),
+  text text NOT NULL,
+  byte_size bigint NOT NULL,           -- size of the source object
+  char_count integer NOT NULL,
+  extractor_version integer NOT NULL,  -- backend extraction.EXTRACTOR_VERSION that produced text
+  extract_cpu_ms integer,              -- CPU the one extraction took; what each extra reference saves
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE files ADD COLUMN IF NOT EXISTS content_hash text REFERENCES extracted_texts(content_hash);
+ALTER TABLE server_files ADD COLUMN IF NOT EXISTS content_hash text REFERENCES extracted_texts(content_hash);
+
+-- For the RLS check below, the footprint report and pruning
+CREATE INDEX IF NOT EXISTS files_content_hash_idx ON files(content_hash) WHERE content_hash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS server_files_content_hash_idx ON server_files(content_hash) WHERE content_hash IS NOT NULL;
+
+-- Only the backend (service role, which bypasses RLS) writes texts and links
+-- rows to them. Users may read a text when one of the files they can see
+-- references it; the subqueries are themselves filtered by the RLS of files
+-- and server_files.
+ALTER TABLE extracted_texts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read texts of files they can see" ON extracted_texts
+  FOR SELECT USING (
+    EXISTS (SELECT 1 FROM files f WHERE f.content_hash = extracted_texts.content_hash)
+    OR EXISTS (SELECT 1 FROM server_files sf WHERE sf.content_hash = extracted_texts.content_hash)
+  );
+
+CREATE TRIGGER update_extracted_texts_updated_at
+  BEFORE UPDATE ON extracted_texts
+  FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Storage and extraction CPU of the store against per-file copies. Served to
+-- admins by the backend's GET /debug/text-store.
+CREATE OR REPLACE FUNCTION extracted_text_footprint()
+RETURNS TABLE (
+  documents bigint,
+  references_count bigint,
+  stored_bytes bigint,
+  per_file_bytes bigint,
+  extract_cpu_ms bigint,
+  per_file_extract_cpu_ms bigint,
+  legacy_rows bigint,
+  legacy_bytes bigint
+) AS $$
+  WITH refs AS (
+    SELECT content_hash, COUNT(*) AS n FROM (
+      SELECT content_hash FROM files WHERE content_hash IS NOT NULL
+      UNION ALL
+      SELECT content_hash FROM server_files WHERE content_hash IS NOT NULL
+    ) r
+    GROUP BY content_hash
+  )
+  SELECT
+    COUNT(*),
+    COALESCE(SUM(refs.n), 0)::bigint,
+    COALESCE(SUM(octet_length(t.text)), 0)::bigint,
+    COALESCE(SUM(octet_length(t.text) * COALESCE(refs.n, 0)), 0)::bigint,
+    COALESCE(SUM(t.extract_cpu_ms), 0)::bigint,
+    COALESCE(SUM(t.extract_cpu_ms * COALESCE(refs.n, 0)), 0)::bigint,
+    (SELECT COUNT(*) FROM files WHERE extracted_text IS NOT NULL),
+    (SELECT COALESCE(SUM(octet_length(extracted_text)), 0) FROM files WHERE extracted_text IS NOT NULL)::bigint
+  FROM extracted_texts t
+  LEFT JOIN refs ON refs.content_hash = t.content_hash;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Texts no file references any more (deleted or re-uploaded files). Run from a
+-- scheduled job; the grace period keeps texts that are about to be linked.
+CREATE OR REPLACE FUNCTION prune_extracted_texts(_older_than interval DEFAULT interval '1 day')
+RETURNS integer AS $$
+DECLARE
+  pruned integer;
+BEGIN
+  DELETE FROM extracted_texts t
+  WHERE t.updated_at < now() - _older_than
+    AND NOT EXISTS (SELECT 1 FROM files f WHERE f.content_hash = t.content_hash)
+    AND NOT EXISTS (SELECT 1 FROM server_files sf WHERE sf.content_hash = t.content_hash);
+  GET DIAGNOSTICS pruned = ROW_COUNT;
+  RETURN pruned;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION extracted_text_footprint() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION prune_extracted_texts(interval) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION extracted_text_footprint() TO service_role;
+GRANT EXECUTE ON FUNCTION prune_extracted_texts(interval) TO service_role;
+
+COMMENT ON TABLE extracted_texts IS 'Extracted text per unique file content (SHA-256 of the bytes), shared by files and server_files';
+COMMENT ON COLUMN files.content_hash IS 'SHA-256 of the object bytes; its text is in extracted_texts. Replaces extracted_text';
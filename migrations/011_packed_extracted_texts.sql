@@ -0,0 +1,77 @@
+-- Migration: Packed Extracted Text
+-- Date: 2025-09-30
+-- Description: Stores extracted_texts compressed (deflate with a preset
+-- dictionary trained on our documents, see backend/app/textpack.py) and served
+-- as raw bytes, instead of plain text shipped inside JSON.
+
+ALTER TABLE extracted_texts ADD COLUMN IF NOT EXISTS text_z bytea;
+ALTER TABLE extracted_texts ADD COLUMN IF NOT EXISTS text_bytes bigint;  -- UTF-8 size of the unpacked text
+ALTER TABLE extracted_texts ALTER COLUMN text DROP NOT NULL;
+ALTER TABLE extracted_texts DROP CONSTRAINT IF EXISTS extracted_texts_has_text;
+ALTER TABLE extracted_texts ADD CONSTRAINT extracted_texts_has_text
+  CHECK (text IS NOT NULL OR text_z IS NOT NULL);
+
+-- text_z is already compressed; skip TOAST's pglz pass, which would only burn CPU
+ALTER TABLE extracted_texts ALTER COLUMN text_z SET STORAGE EXTERNAL;
+
+UPDATE extracted_texts SET text_bytes = octet_length(text) WHERE text IS NOT NULL AND text_bytes IS NULL;
+
+-- Preset dictionaries referenced by id from every packed text. Append only:
+-- a dictionary must outlive every text_z packed with it. Published with
+-- `python -m benchmarks.bench_compression --publish-dict`; the backend
+-- loads them at startup with the service role key.
+CREATE TABLE IF NOT EXISTS text_dictionaries (
+  id integer PRIMARY KEY CHECK (id BETWEEN 1 AND 65535),
+  dictionary bytea NOT NULL CHECK (octet_length(dictionary) <= 32768),
+  trained_on integer,  -- number of sample documents
+  created_at timestamptz DEFAULT now()
+);
+
+-- No policies: only the service role reads or writes dictionaries
+ALTER TABLE text_dictionaries ENABLE ROW LEVEL SECURITY;
+
+-- Report on-disk sizes (pg_column_size, after TOAST) next to the unpacked text
+-- size, so the saving against the plain text column is measured, not estimated.
+DROP FUNCTION IF EXISTS extracted_text_footprint();
+
+CREATE FUNCTION extracted_text_footprint()
+RETURNS TABLE (
+  documents bigint,
+  references_count bigint,
+  text_bytes bigint,
+  stored_bytes bigint,
+  packed_documents bigint,
+  per_file_bytes bigint,
+  extract_cpu_ms bigint,
+  per_file_extract_cpu_ms bigint,
+  legacy_rows bigint,
+  legacy_bytes bigint
+) AS $$
+  WITH refs AS (
+    SELECT content_hash, COUNT(*) AS n FROM (
+      SELECT content_hash FROM files WHERE content_hash IS NOT NULL
+      UNION ALL
+      SELECT content_hash FROM server_files WHERE content_hash IS NOT NULL
+    ) r
+    GROUP BY content_hash
+  )
+  SELECT
+    COUNT(*),
+    COALESCE(SUM(refs.n), 0)::bigint,
+    COALESCE(SUM(COALESCE(t.text_bytes, octet_length(t.text))), 0)::bigint,
+    COALESCE(SUM(COALESCE(pg_column_size(t.text), 0) + COALESCE(pg_column_size(t.text_z), 0)), 0)::bigint,
+    COUNT(t.text_z),
+    COALESCE(SUM(COALESCE(t.text_bytes, octet_length(t.text)) * COALESCE(refs.n, 0)), 0)::bigint,
+    COALESCE(SUM(t.extract_cpu_ms), 0)::bigint,
+    COALESCE(SUM(t.extract_cpu_ms * COALESCE(refs.n, 0)), 0)::bigint,
+    (SELECT COUNT(*) FROM files WHERE extracted_text IS NOT NULL),
+    (SELECT COALESCE(SUM(pg_column_size(extracted_text)), 0) FROM files WHERE extracted_text IS NOT NULL)::bigint
+  FROM extracted_texts t
+  LEFT JOIN refs ON refs.content_hash = t.content_hash;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION extracted_text_footprint() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION extracted_text_footprint() TO service_role;
+
+COMMENT ON COLUMN extracted_texts.text_z IS 'Packed text: 10-byte header (ZT, dictionary id, char count) + raw deflate; see backend/app/textpack.py';
+COMMENT ON TABLE text_dictionaries IS 'Preset deflate dictionaries for extracted_texts.text_z; never delete one that is in use';
@@ -0,0 +1,180 @@
+-- Migration: Trigger-Maintained Server Member Counts
+-- Date: 2025-10-01
+-- Description: Keeps one counter row per server, updated by statement-level
+-- triggers on server_members, so rpc_get_server_member_counts reads one row
+-- per requested server instead of counting every membership on each call.
+
+CREATE TABLE IF NOT EXISTS server_member_counts (
+  server_id uuid PRIMARY KEY REFERENCES servers(id) ON DELETE CASCADE,
+  member_count integer NOT NULL DEFAULT 0 CHECK (member_count >= 0),
+  updated_at timestamptz DEFAULT now()
+);
+
+-- Read only through the RPCs below; no policies
+ALTER TABLE server_member_counts ENABLE ROW LEVEL SECURITY;
+
+-- Statement-level triggers with transition tables: a bulk insert or a server
+-- delete cascading to thousands of memberships costs one counter write per
+-- server, not one per row. SECURITY DEFINER because memberships are inserted
+-- by clients under RLS, and the counter table has no policies; search_path is
+-- pinned so a caller's schemas can't shadow the tables they write.
+CREATE OR REPLACE FUNCTION server_member_counts_after_insert()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO server_member_counts AS c (server_id, member_count)
+  SELECT n.server_id, COUNT(*)::int FROM new_members n GROUP BY n.server_id
+  ON CONFLICT (server_id) DO UPDATE
+    SET member_count = c.member_count + EXCLUDED.member_count, updated_at = now();
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION server_member_counts_after_delete()
+RETURNS trigger AS $$
+BEGIN
+  -- Clamped: a counter that drifted low must not make the leave itself fail the CHECK;
+  -- check_server_member_counts finds and repairs it
+  UPDATE server_member_counts c
+  SET member_count = GREATEST(c.member_count - o.removed, 0), updated_at = now()
+  FROM (SELECT server_id, COUNT(*)::int AS removed FROM old_members GROUP BY server_id) o
+  WHERE c.server_id = o.server_id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Only moves between servers change counts; role updates net to zero and write nothing
+CREATE OR REPLACE FUNCTION server_member_counts_after_update()
+RETURNS trigger AS $$
+BEGIN
+  WITH moved AS (
+    SELECT server_id, SUM(delta)::int AS delta FROM (
+      SELECT server_id, 1 AS delta FROM new_members
+      UNION ALL
+      SELECT server_id, -1 AS delta FROM old_members
+    ) m
+    GROUP BY server_id
+    HAVING SUM(delta) <> 0
+  ),
+  updated AS (
+    UPDATE server_member_counts c
+    SET member_count = GREATEST(c.member_count + moved.delta, 0), updated_at = now()
+    FROM moved
+    WHERE c.server_id = moved.server_id
+    RETURNING c.server_id
+  )
+  INSERT INTO server_member_counts (server_id, member_count)
+  SELECT moved.server_id, moved.delta FROM moved
+  WHERE moved.delta > 0 AND moved.server_id NOT IN (SELECT server_id FROM updated);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION server_member_counts_after_truncate()
+RETURNS trigger AS $$
+BEGIN
+  UPDATE server_member_counts SET member_count = 0, updated_at = now() WHERE member_count <> 0;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Triggers and backfill in one transaction, with writers locked out, so no
+-- membership change lands between the count and the first trigger firing.
+LOCK TABLE server_members IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS server_member_counts_insert ON server_members;
+DROP TRIGGER IF EXISTS server_member_counts_delete ON server_members;
+DROP TRIGGER IF EXISTS server_member_counts_update ON server_members;
+DROP TRIGGER IF EXISTS server_member_counts_truncate ON server_members;
+
+CREATE TRIGGER server_member_counts_insert
+  AFTER INSERT ON server_members
+  REFERENCING NEW TABLE AS new_members
+  FOR EACH STATEMENT EXECUTE FUNCTION server_member_counts_after_insert();
+
+CREATE TRIGGER server_member_counts_delete
+  AFTER DELETE ON server_members
+  REFERENCING OLD TABLE AS old_members
+  FOR EACH STATEMENT EXECUTE FUNCTION server_member_counts_after_delete();
+
+CREATE TRIGGER server_member_counts_update
+  AFTER UPDATE ON server_members
+  REFERENCING OLD TABLE AS old_members NEW TABLE AS new_members
+  FOR EACH STATEMENT EXECUTE FUNCTION server_member_counts_after_update();
+
+CREATE TRIGGER server_member_counts_truncate
+  AFTER TRUNCATE ON server_members
+  FOR EACH STATEMENT EXECUTE FUNCTION server_member_counts_after_truncate();
+
+-- Backfill: every server gets a row, including ones with no members yet
+INSERT INTO server_member_counts (server_id, member_count)
+SELECT s.id, COUNT(sm.server_id)::int
+FROM servers s
+LEFT JOIN server_members sm ON sm.server_id = s.id
+GROUP BY s.id
+ON CONFLICT (server_id) DO UPDATE SET member_count = EXCLUDED.member_count, updated_at = now();
+
+-- The membership check below is one probe per requested server. Covers the
+-- single-column user_id index from 004.
+CREATE INDEX IF NOT EXISTS server_members_user_server_idx ON server_members(user_id, server_id);
+DROP INDEX IF EXISTS idx_server_members_user_id;
+
+-- Same contract as 005: counts only for servers the caller belongs to
+CREATE OR REPLACE FUNCTION rpc_get_server_member_counts(_server_ids uuid[])
+RETURNS TABLE (server_id uuid, member_count integer) AS $$
+DECLARE
+  current_user_id uuid := auth.uid();
+BEGIN
+  IF current_user_id IS NULL THEN
+    RAISE EXCEPTION 'User must be authenticated';
+  END IF;
+
+  RETURN QUERY
+  SELECT c.server_id, c.member_count
+  FROM server_member_counts c
+  WHERE c.server_id = ANY(_server_ids)
+    AND EXISTS (
+      SELECT 1 FROM server_members me
+      WHERE me.server_id = c.server_id
+        AND me.user_id = current_user_id
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Counters that disagree with server_members. Run from a scheduled job or
+-- after manual data fixes; _repair rewrites the wrong ones.
+CREATE OR REPLACE FUNCTION check_server_member_counts(_repair boolean DEFAULT false)
+RETURNS TABLE (server_id uuid, stored_count integer, actual_count integer) AS $$
+BEGIN
+  RETURN QUERY
+  WITH actual AS (
+    SELECT s.id AS server_id, COUNT(sm.server_id)::int AS actual_count
+    FROM servers s
+    LEFT JOIN server_members sm ON sm.server_id = s.id
+    GROUP BY s.id
+  )
+  SELECT a.server_id, c.member_count, a.actual_count
+  FROM actual a
+  LEFT JOIN server_member_counts c ON c.server_id = a.server_id
+  WHERE c.member_count IS DISTINCT FROM a.actual_count;
+
+  IF _repair THEN
+    LOCK TABLE server_members IN SHARE ROW EXCLUSIVE MODE;
+    INSERT INTO server_member_counts AS c (server_id, member_count)
+    SELECT s.id, COUNT(sm.server_id)::int
+    FROM servers s
+    LEFT JOIN server_members sm ON sm.server_id = s.id
+    GROUP BY s.id
+    -- by constraint: the server_id output column would make (server_id) ambiguous here
+    ON CONFLICT ON CONSTRAINT server_member_counts_pkey DO UPDATE
+      SET member_count = EXCLUDED.member_count, updated_at = now()
+      WHERE c.member_count IS DISTINCT FROM EXCLUDED.member_count;
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION check_server_member_counts(boolean) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION check_server_member_counts(boolean) TO service_role;
+
+COMMENT ON TABLE server_member_counts IS 'Members per server, maintained by triggers on server_members';
+COMMENT ON FUNCTION rpc_get_server_member_counts(uuid[]) IS 'Returns member counts for given servers if caller is a member (reads server_member_counts)';
+COMMENT ON FUNCTION check_server_member_counts(boolean) IS 'Lists servers whose counter disagrees with server_members; repairs them when _repair';
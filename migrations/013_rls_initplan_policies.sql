@@ -0,0 +1,145 @@
+-- Migration: RLS Policy Performance Pass
+-- Date: 2025-10-02
+-- Description: Rewrites the policies from 001, 004, 006 and 007 so per-statement
+-- values are computed once and membership checks are index-only lookups.
+-- Access rules are unchanged, except that storing a vault summary now needs 'write'.
+--
+-- Two rewrites, applied throughout:
+--   auth.uid()        -> (SELECT auth.uid())
+--       A scalar subquery with no outer references is planned as an InitPlan
+--       and evaluated once per statement, instead of a function call per row.
+--   EXISTS (SELECT 1 FROM server_members WHERE server_id = t.server_id AND user_id = auth.uid())
+--                     -> t.server_id IN (SELECT server_id FROM server_members WHERE user_id = (SELECT auth.uid()))
+--       The caller's memberships are read once (an index-only scan of
+--       (user_id, server_id)) and hashed, instead of one correlated probe per row.
+-- Policies are also limited TO authenticated, so anon requests skip them.
+-- Benchmark: python run_migrations.py --benchmark (local Postgres).
+
+-- Covering indexes for both directions of the membership lookup
+CREATE INDEX IF NOT EXISTS server_members_user_server_idx ON server_members(user_id, server_id);
+CREATE INDEX IF NOT EXISTS server_members_server_user_idx ON server_members(server_id, user_id);
+DROP INDEX IF EXISTS idx_server_members_server_id;
+
+-- server_members (004)
+DROP POLICY IF EXISTS "Users can view their own memberships" ON server_members;
+CREATE POLICY "Users can view their own memberships" ON server_members
+  FOR SELECT TO authenticated USING (user_id = (SELECT auth.uid()));
+
+DROP POLICY IF EXISTS "Users can be inserted by RPC" ON server_members;
+CREATE POLICY "Users can be inserted by RPC" ON server_members
+  FOR INSERT TO authenticated WITH CHECK (user_id = (SELECT auth.uid()));
+
+DROP POLICY IF EXISTS "Users can delete their own membership" ON server_members;
+CREATE POLICY "Users can delete their own membership" ON server_members
+  FOR DELETE TO authenticated USING (user_id = (SELECT auth.uid()));
+
+-- servers (004)
+DROP POLICY IF EXISTS "Members can select servers they belong to" ON servers;
+CREATE POLICY "Members can select servers they belong to" ON servers
+  FOR SELECT TO authenticated USING (
+    id IN (SELECT sm.server_id FROM server_members sm WHERE sm.user_id = (SELECT auth.uid()))
+    OR owner_id = (SELECT auth.uid())
+  );
+
+-- server_files (001)
+DROP POLICY IF EXISTS "Users can view files in servers they belong to" ON server_files;
+CREATE POLICY "Users can view files in servers they belong to" ON server_files
+  FOR SELECT TO authenticated USING (
+    server_id IN (SELECT sm.server_id FROM server_members sm WHERE sm.user_id = (SELECT auth.uid()))
+  );
+
+DROP POLICY IF EXISTS "Users can upload files to servers they belong to" ON server_files;
+CREATE POLICY "Users can upload files to servers they belong to" ON server_files
+  FOR INSERT TO authenticated WITH CHECK (
+    server_id IN (SELECT sm.server_id FROM server_members sm WHERE sm.user_id = (SELECT auth.uid()))
+    AND uploaded_by = (SELECT auth.uid())
+  );
+
+DROP POLICY IF EXISTS "Users can delete files they uploaded" ON server_files;
+CREATE POLICY "Users can delete files they uploaded" ON server_files
+  FOR DELETE TO authenticated USING (uploaded_by = (SELECT auth.uid()));
+
+-- shared_vaults (001)
+DROP POLICY IF EXISTS "Users can view shared vaults in servers they belong to" ON shared_vaults;
+CREATE POLICY "Users can view shared vaults in servers they belong to" ON shared_vaults
+  FOR SELECT TO authenticated USING (
+    server_id IN (SELECT sm.server_id FROM server_members sm WHERE sm.user_id = (SELECT auth.uid()))
+  );
+
+DROP POLICY IF EXISTS "Users can share vaults they own to servers they belong to" ON shared_vaults;
+CREATE POLICY "Users can share vaults they own to servers they belong to" ON shared_vaults
+  FOR INSERT TO authenticated WITH CHECK (
+    server_id IN (SELECT sm.server_id FROM server_members sm WHERE sm.user_id = (SELECT auth.uid()))
+    AND vault_id IN (SELECT v.id FROM vaults v WHERE v.user_id = (SELECT auth.uid()))
+    AND shared_by = (SELECT auth.uid())
+  );
+
+DROP POLICY IF EXISTS "Users can unshare vaults they shared" ON shared_vaults;
+CREATE POLICY "Users can unshare vaults they shared" ON shared_vaults
+  FOR DELETE TO authenticated USING (shared_by = (SELECT auth.uid()));
+
+-- user_presence (001): users who share a server with the caller
+DROP POLICY IF EXISTS "Users can view presence of users in their servers" ON user_presence;
+CREATE POLICY "Users can view presence of users in their servers" ON user_presence
+  FOR SELECT TO authenticated USING (
+    user_id IN (
+      SELECT sm2.user_id FROM server_members sm2
+      WHERE sm2.server_id IN (SELECT sm1.server_id FROM server_members sm1 WHERE sm1.user_id = (SELECT auth.uid()))
+    )
+  );
+
+DROP POLICY IF EXISTS "Users can update their own presence" ON user_presence;
+CREATE POLICY "Users can update their own presence" ON user_presence
+  FOR ALL TO authenticated USING (user_id = (SELECT auth.uid()));
+
+-- voice_presence (006, applied separately: run_migrations does not include it)
+DO $$
+BEGIN
+  IF to_regclass('public.voice_presence') IS NOT NULL THEN
+    DROP POLICY IF EXISTS voice_presence_insert ON public.voice_presence;
+    CREATE POLICY voice_presence_insert ON public.voice_presence
+      FOR INSERT TO authenticated
+      WITH CHECK ((SELECT auth.uid()) = user_id);
+
+    DROP POLICY IF EXISTS voice_presence_update ON public.voice_presence;
+    CREATE POLICY voice_presence_update ON public.voice_presence
+      FOR UPDATE TO authenticated
+      USING ((SELECT auth.uid()) = user_id)
+      WITH CHECK ((SELECT auth.uid()) = user_id);
+
+    DROP POLICY IF EXISTS voice_presence_delete ON public.voice_presence;
+    CREATE POLICY voice_presence_delete ON public.voice_presence
+      FOR DELETE TO authenticated
+      USING ((SELECT auth.uid()) = user_id);
+  END IF;
+END $$;
+
+-- vault_summaries (007): one row per vault, so has_vault_perm stays per row; the uid does not
+DROP POLICY IF EXISTS "Users can view summaries of vaults they can read" ON vault_summaries;
+CREATE POLICY "Users can view summaries of vaults they can read" ON vault_summaries
+  FOR SELECT TO authenticated USING (has_vault_perm(vault_id, (SELECT auth.uid()), 'read'));
+
+-- Writes need 'write'; databases that ran an earlier 007 still have the 'read' versions
+DROP POLICY IF EXISTS "Users can store summaries of vaults they can read" ON vault_summaries;
+DROP POLICY IF EXISTS "Users can store summaries of vaults they can write" ON vault_summaries;
+CREATE POLICY "Users can store summaries of vaults they can write" ON vault_summaries
+  FOR INSERT TO authenticated WITH CHECK (has_vault_perm(vault_id, (SELECT auth.uid()), 'write'));
+
+DROP POLICY IF EXISTS "Users can refresh summaries of vaults they can read" ON vault_summaries;
+DROP POLICY IF EXISTS "Users can refresh summaries of vaults they can write" ON vault_summaries;
+CREATE POLICY "Users can refresh summaries of vaults they can write" ON vault_summaries
+  FOR UPDATE TO authenticated USING (has_vault_perm(vault_id, (SELECT auth.uid()), 'write'));
+
+-- is_server_member (003), used by the RPCs: plain SQL and STABLE instead of
+-- volatile plpgsql, so calls share the statement's snapshot and skip the plpgsql
+-- executor. Still one lookup per call (SECURITY DEFINER functions are never
+-- inlined, and STABLE does not cache results); that lookup is an index-only
+-- probe of server_members_server_user_idx above. search_path is pinned so a
+-- caller's schemas can't shadow server_members.
+CREATE OR REPLACE FUNCTION is_server_member(_server_id uuid, _user_id uuid)
+RETURNS boolean AS $$
+  SELECT EXISTS (
+    SELECT 1 FROM server_members
+    WHERE server_id = _server_id AND user_id = _user_id
+  );
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
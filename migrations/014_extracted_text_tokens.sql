@@ -0,0 +1,22 @@
+-- Migration: Token Counts for Extracted Text
+-- Date: 2025-10-03
+-- Description: Stores each extracted text's token counts, computed once when the
+-- text is stored, so the chat routes budget context in model tokens without
+-- tokenizing the texts on every request (see backend/app/tokens.py).
+
+-- token_chunks[i] is the running token total after (i + 1) * 4096 characters;
+-- the last element is the whole text's count, also kept in token_count.
+ALTER TABLE extracted_texts ADD COLUMN IF NOT EXISTS token_count integer;
+ALTER TABLE extracted_texts ADD COLUMN IF NOT EXISTS token_chunks integer[];
+-- tiktoken encoding the counts are in, or 'estimate' when counted without it
+ALTER TABLE extracted_texts ADD COLUMN IF NOT EXISTS tokenizer text;
+
+ALTER TABLE extracted_texts DROP CONSTRAINT IF EXISTS extracted_texts_token_count_matches;
+ALTER TABLE extracted_texts ADD CONSTRAINT extracted_texts_token_count_matches
+  CHECK (token_chunks IS NULL OR token_count = COALESCE(token_chunks[array_upper(token_chunks, 1)], 0));
+
+-- Rows stored earlier are counted by the backend the first time a chat uses
+-- them and written back; no backfill here.
+
+COMMENT ON COLUMN extracted_texts.token_chunks IS 'Running token totals per 4096 characters of text; read through the files/server_files listings';
+COMMENT ON COLUMN extracted_texts.tokenizer IS 'Encoding of token_count and token_chunks (o200k_base, or estimate)';
@@ -0,0 +1,36 @@
+-- Migration: Backend-Only Content Hash Links
+-- Date: 2025-10-04
+-- Description: Rejects client writes to files.content_hash and
+-- server_files.content_hash. The extracted_texts select policy (010) and the
+-- backend's service-key reads trust that link; a user who could point a row they
+-- own at another document's hash could read that document's text.
+
+-- SECURITY INVOKER (the default) so current_user is the caller's role. Only the
+-- client roles are checked: the backend writes links as service_role, and
+-- migrations and maintenance run as the owner.
+CREATE OR REPLACE FUNCTION reject_client_content_hash()
+RETURNS trigger AS $$
+BEGIN
+  IF current_user IN ('anon', 'authenticated') THEN
+    IF TG_OP = 'INSERT' AND NEW.content_hash IS NOT NULL
+       OR TG_OP = 'UPDATE' AND NEW.content_hash IS DISTINCT FROM OLD.content_hash THEN
+      RAISE EXCEPTION 'content_hash is set by the backend only'
+        USING ERRCODE = 'insufficient_privilege';
+    END IF;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+DROP TRIGGER IF EXISTS files_content_hash_backend_only ON files;
+CREATE TRIGGER files_content_hash_backend_only
+  BEFORE INSERT OR UPDATE OF content_hash ON files
+  FOR EACH ROW EXECUTE FUNCTION reject_client_content_hash();
+
+DROP TRIGGER IF EXISTS server_files_content_hash_backend_only ON server_files;
+CREATE TRIGGER server_files_content_hash_backend_only
+  BEFORE INSERT OR UPDATE OF content_hash ON server_files
+  FOR EACH ROW EXECUTE FUNCTION reject_client_content_hash();
+
+-- Links written before this migration are kept. Setting a row's content_hash
+-- to NULL (as the owner) makes the backend download, hash and link it again.
@@ -7,6 +7,7 @@ It reads migration files from the migrations directory and applies them in order
 
 Usage:
     python run_migrations.py [--dry-run] [--migration-file <file>]
+    python run_migrations.py --benchmark [--database-url <local postgres>]
 """
 
 import os
@@ -59,7 +60,7 @@ class MigrationRunner:
         """Get all migration files in order."""
         migration_files = []
         for file_path in self.migrations_dir.glob("*.sql"):
-            if file_path.name.startswith(("001_", "002_", "003_", "004_", "005_")):
+            if file_path.name.startswith(("001_", "002_", "003_", "004_", "005_", "007_", "008_", "009_", "010_", "011_", "012_", "013_", "014_", "015_")):
                 migration_files.append(file_path)
         
         return sorted(migration_files)
@@ -150,9 +151,16 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="Show what would be done without executing")
     parser.add_argument("--migration-file", help="Run a specific migration file")
     parser.add_argument("--database-url", help="Database URL (overrides SUPABASE_DB_URL env var)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Time the RLS policies before and after 013 on a local Postgres (see bench_rls_policies.py)")
     
     args = parser.parse_args()
     
+    if args.benchmark:
+        # Seeds a scratch schema, so never falls back to SUPABASE_DB_URL
+        from bench_rls_policies import main as benchmark_main
+        sys.exit(benchmark_main(["--database-url", args.database_url] if args.database_url else []))
+    
     # Get database URL
     database_url = args.database_url or os.getenv("SUPABASE_DB_URL")
     if not database_url: